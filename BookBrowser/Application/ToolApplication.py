@@ -53,6 +53,24 @@ class ToolApplication(BasicApplication):
 
     _logger = _module_logger.getChild('BasicApplication')
 
+    # options which only work on a book
+    BOOK_OPTIONS = (
+        'dump',
+        'rename',
+        'orientation',
+        'duplicates',
+        'remove_page_number',
+    )
+
+    # options which work on a book or a library
+    BOOK_OR_LIBRARY_OPTIONS = (
+        'ocr',
+        'index_texts',
+        'search',
+        'thumbnails',
+        'thumbnail_pack',
+    )
+
     ##############################################
 
     def __init__(self):
@@ -114,6 +132,47 @@ class ToolApplication(BasicApplication):
             help='set negative delta for  orientation',
         )
 
+        self._parser.add_argument(
+            '--duplicates',
+            action='store_true',
+            default=False,
+            help='list the pages which look scanned twice',
+        )
+
+        self._parser.add_argument(
+            '--ocr',
+            action='store_true',
+            default=False,
+            help='OCR the pages of a book or a library which don\'t have a text',
+        )
+
+        self._parser.add_argument(
+            '--ocr-preprocess',
+            action='store_true',
+            default=False,
+            help='binarise and resize the pages before the OCR, require OpenCV',
+        )
+
+        self._parser.add_argument(
+            '--language',
+            default=None,
+            help='language of the pages, default to the language of the book metadata',
+        )
+
+        self._parser.add_argument(
+            '--index-texts',
+            action='store_true',
+            default=False,
+            help='index the OCR texts of a book or a library for the search',
+        )
+
+        self._parser.add_argument(
+            '--search',
+            metavar='QUERY',
+            default=None,
+            help='search the OCR texts of a library, see the SQLite FTS5 query syntax',
+        )
+
         self._parser.add_argument(
             '--remove-page-number',
             action='store_true',
@@ -135,13 +194,56 @@ class ToolApplication(BasicApplication):
             help='Scan library',
         )
 
+        self._parser.add_argument(
+            '--thumbnails',
+            action='store_true',
+            default=False,
+            help='pregenerate thumbnails of a book or a library',
+        )
+
+        self._parser.add_argument(
+            '--extra-thumbnails',
+            nargs='*',
+            choices=('x-large', 'xx-large'),
+            default=(),
+            help='make also these thumbnail flavours',
+        )
+
+        self._parser.add_argument(
+            '--thumbnail-pack',
+            action='store_true',
+            default=False,
+            help='write a thumbnail pack in each book directory, implies --thumbnails',
+        )
+
+        self._parser.add_argument(
+            '--jobs',
+            type=int,
+            default=None,
+            help='number of parallel jobs, default to the number of cores',
+        )
+
+    ##############################################
+
+    def _used_options(self, names):
+        return ['--' + name.replace('_', '-') for name in names if getattr(self._args, name)]
+
     ##############################################
 
     def run(self):
 
         super().run()
 
-        if self._args.dump_library:
+        is_library = BookLibrary.is_library(self._args.book_path)
+        if self._args.dump_library or is_library:
+            book_options = self._used_options(self.BOOK_OPTIONS)
+            if book_options:
+                self._parser.error('{} require a book path'.format(', '.join(book_options)))
+            if not is_library:
+                # the path is not a library, thus these options would require a book
+                book_options = self._used_options(self.BOOK_OR_LIBRARY_OPTIONS)
+                if book_options:
+                    self._parser.error('{} cannot be used with --dump-library on a book path'.format(', '.join(book_options)))
             self._book = None
         else:
             self._book = self.book_cls(self._args.book_path)
@@ -156,7 +258,34 @@ class ToolApplication(BasicApplication):
             self._book.renumerate_pages(self._args.dry_run)
 
         if self._args.orientation:
-            self._book.set_orientation(positive_delta=not self._args.negative_delta)
+            def progress_callback(number_of_processed_pages, number_of_pages):
+                print('\rOrientation {}/{}'.format(number_of_processed_pages, number_of_pages), end='', flush=True)
+            self._book.set_orientation(
+                positive_delta=not self._args.negative_delta,
+                number_of_workers=self._args.jobs,
+                progress_callback=progress_callback,
+            )
+            print()
+
+        if self._args.duplicates:
+            def progress_callback(number_of_processed_pages, number_of_pages):
+                print('\rSignatures {}/{}'.format(number_of_processed_pages, number_of_pages), end='', flush=True)
+            pairs = self._book.find_duplicates(
+                number_of_workers=self._args.jobs,
+                progress_callback=progress_callback,
+            )
+            print()
+            for pair in pairs:
+                print(pair)
+
+        if self._args.ocr:
+            self._make_texts(is_library)
+
+        if self._args.index_texts:
+            self._index_texts(is_library)
+
+        if self._args.search:
+            self._search_texts(is_library)
 
         if self._args.remove_page_number:
             self._book.remove_page_number()
@@ -168,6 +297,12 @@ class ToolApplication(BasicApplication):
             library = BookLibrary(self._args.book_path)
             library.dump()
 
+        if self._args.thumbnails or self._args.thumbnail_pack:
+            self._make_thumbnails(is_library)
+
+        if self._args.thumbnail_pack:
+            self._make_thumbnail_packs(is_library)
+
         if self._args.scan_library:
             import os
             from pathlib import Path
@@ -179,3 +314,106 @@ class ToolApplication(BasicApplication):
                         subprocess.call(('book-browser', path))
                         break
 
+        if self._book is not None:
+            self._book.close()
+
+    ##############################################
+
+    def _make_thumbnails(self, is_library):
+
+        from BookBrowser.Thumbnail.ThumbnailService import ThumbnailService
+
+        if is_library:
+            source = BookLibrary(self._args.book_path)
+        else:
+            source = self._book
+
+        def progress_callback(number_of_processed_images, number_of_images):
+            print('\rThumbnails {}/{}'.format(number_of_processed_images, number_of_images), end='', flush=True)
+
+        service = ThumbnailService(
+            number_of_workers=self._args.jobs,
+            extra_flavours=self._args.extra_thumbnails,
+        )
+        service.make_thumbnails(source, progress_callback)
+        print()
+
+    ##############################################
+
+    def _make_texts(self, is_library):
+
+        from BookBrowser.OCR import OcrEngine
+        from BookBrowser.OCR.OcrService import OcrService
+
+        # the engine is a singleton, it must be configured first
+        OcrEngine(preprocess=self._args.ocr_preprocess)
+
+        if is_library:
+            source = BookLibrary(self._args.book_path)
+        else:
+            source = self._book
+
+        def progress_callback(number_of_processed_pages, number_of_pages):
+            print('\rOCR {}/{}'.format(number_of_processed_pages, number_of_pages), end='', flush=True)
+
+        service = OcrService(
+            number_of_workers=self._args.jobs,
+            language=self._args.language,
+        )
+        service.make_texts(source, progress_callback)
+        print()
+
+    ##############################################
+
+    def _index_texts(self, is_library):
+
+        if is_library:
+            library = BookLibrary(self._args.book_path)
+            def callback(book, number_of_pages):
+                print('{} pages indexed for {}'.format(number_of_pages, book.path))
+            library.update_text_index(self._args.language, callback)
+        else:
+            text_index = self._book.text_index
+            if text_index is None:
+                print('{} is not in a library'.format(self._book.path))
+                return
+            number_of_pages = text_index.update_book(self._book, self._args.language)
+            print('{} pages indexed for {}'.format(number_of_pages, self._book.path))
+
+    ##############################################
+
+    def _search_texts(self, is_library):
+
+        try:
+            if is_library:
+                hits = BookLibrary(self._args.book_path).search_texts(self._args.search)
+            else:
+                text_index = self._book.text_index
+                if text_index is None:
+                    print('{} is not in a library'.format(self._book.path))
+                    return
+                hits = text_index.search(self._args.search)
+        except ValueError as exception:
+            print(exception)
+            return
+        for hit in hits:
+            print('{0.book_path} | page {0.page_number} | {0.filename}\n    {0.snippet}'.format(hit))
+
+    ##############################################
+
+    def _make_thumbnail_packs(self, is_library):
+
+        from BookBrowser.Thumbnail.ThumbnailPack import ThumbnailPack
+
+        if is_library:
+            library = BookLibrary(self._args.book_path)
+            library.scan()
+            books = (Book(book_cover.path) for book_cover in library)
+        else:
+            books = (self._book,)
+
+        for book in books:
+            number_of_entries = ThumbnailPack.build(book)
+            print('Thumbnail pack {} with {} pages'.format(ThumbnailPack.make_pack_path(book.path), number_of_entries))
+            if is_library:
+                book.close()
@@ -22,8 +22,10 @@ __all__ = ['Book']
 
 ####################################################################################################
 
+from array import array
 from operator import itemgetter
 from pathlib import Path
+import json
 import logging
 import math
 import os
@@ -31,6 +33,10 @@ import os
 from BookBrowser.Common.FileTools import file_watcher
 from .BookMetadata import BookMetadata
 from .BookPage import BookPage, EmptyBookPage
+from .BookPageTable import BookPageTable
+from .BookSidecar import BookSidecar
+from .BookTextIndex import BookTextIndex
+from .ImageCache import ImageCache
 
 ####################################################################################################
 
@@ -40,30 +46,52 @@ _module_logger = logging.getLogger(__name__)
 
 class Book:
 
+    """Class to implement a book, i.e. a directory of page images.
+
+    The pages are stored in a :class:`BookPageTable`, the :class:`BookPage` instances are views made
+    on demand, thus two iterations return different but equal instances.
+
+    """
+
     __book_page_cls__ = BookPage
 
     EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.tiff')
 
+    RENAME_JOURNAL_FILENAME = '.book-rename-journal.json'
+    # suffix of the temporary names used by a rename batch
+    RENAME_SUFFIX = '.rename'
+
     _logger = _module_logger.getChild('Book')
 
     ##############################################
 
-    def __init__(self, path, extension=None):
+    def __init__(self, path, extension=None, image_cache=None):
 
         # extension='.png'
 
         self._path = Path(str(path)).resolve()
 
+        # shared by the pages
+        self._image_cache = image_cache if image_cache is not None else ImageCache()
+        self._sidecar = None
+        # False if the book is not in a library
+        self._text_index = None
+
         # Fixme: will create a book even if it is a wrong path !
         self._load_metadta()
+        self._recover_rename_journal()
 
+        # the directory is listed once, the stat of the pages is done on demand
+        dir_entries = self._scan_directory()
         if extension is not None:
             self._extension = str(extension)
         else:
-            self._extension = self._guess_extension()
+            self._extension = self._guess_extension(dir_entries)
 
-        self._pages = None
-        self._get_pages()
+        self._page_table = BookPageTable(self._path)
+        # page index -> table row, -1 for a missing page
+        self._order = array('l')
+        self._get_pages(dir_entries)
         if self.number_of_pages:
             self._number_of_digits = int(math.log10(self.number_of_pages)) + 1
         else:
@@ -72,6 +100,84 @@ class Book:
 
     ##############################################
 
+    @property
+    def image_cache(self):
+        return self._image_cache
+
+    ##############################################
+
+    @property
+    def sidecar(self):
+        """Store of the page analysis results, it is opened on demand"""
+        if self._sidecar is None:
+            self._sidecar = BookSidecar(self._path)
+            self._sidecar.prune(page.filename for page in self if not page.is_empty)
+        return self._sidecar
+
+    def close(self):
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = None
+        if self._text_index is not None and self._text_index is not False:
+            self._text_index.close()
+        self._text_index = None
+        image_cache = self._image_cache
+        if image_cache.hits or image_cache.misses:
+            self._logger.info('%s %s', self._path, image_cache)
+
+    ##############################################
+
+    def find_library_path(self):
+        """Return the path of the library containing the book or None"""
+        from .BookLibrary import BookLibrary
+        for path in self._path.parents:
+            if BookLibrary.is_library(path):
+                return path
+        return None
+
+    @property
+    def text_index(self):
+        """Full-text index of the library containing the book, it is opened on demand, None if the book
+        is not in a library
+
+        """
+        if self._text_index is None:
+            library_path = self.find_library_path()
+            self._text_index = BookTextIndex(library_path) if library_path is not None else False
+        return self._text_index if self._text_index is not False else None
+
+    ##############################################
+
+    def texts(self, language=None, engine_version=None):
+
+        """Return a dict mapping the filename to the text stored in the sidecar for the pages which
+        have an up to date text.  If *language* is None, the language of the metadata is used.  If
+        *engine_version* is None, the version of the current OCR engine is used.
+
+        """
+
+        language = language or self._metadata.language or None
+        engine_version = engine_version or BookPage.ocr_engine_version()
+        sidecar = self.sidecar
+        pages = [page for page in self if not page.is_empty]
+        texts = {}
+        # the text of a verso depends on the flip
+        for orientation in {page.orientation for page in pages}:
+            result_name = BookPage.text_result_name(language, orientation, engine_version)
+            same_pages = [page for page in pages if page.orientation == orientation]
+            texts.update(sidecar.values(same_pages, result_name))
+        return texts
+
+    def store_text(self, page, language, engine_version, text):
+        """Store the text of *page* in the sidecar and index it if the book is in a library"""
+        result_name = BookPage.text_result_name(language, page.orientation, engine_version)
+        self.sidecar.set(page, result_name, text)
+        text_index = self.text_index
+        if text_index is not None:
+            text_index.set_page(self._path, page, text)
+
+    ##############################################
+
     @property
     def metadata_path(self):
         return self._path.joinpath(BookMetadata.JSON_FILENAME)
@@ -111,17 +217,18 @@ class Book:
 
     ##############################################
 
-    @property
-    def _list_dir(self):
-        return iter(os.listdir(self._path))
+    def _scan_directory(self):
+        """Return the list of :class:`os.DirEntry` of the files of the book directory"""
+        with os.scandir(str(self._path)) as entries:
+            return [entry for entry in entries if not entry.is_dir()]
 
     ##############################################
 
-    def _guess_extension(self):
+    def _guess_extension(self, dir_entries):
 
         extensions = {}
-        for filename in self._list_dir:
-            suffix = Path(filename).suffix
+        for entry in dir_entries:
+            suffix = os.path.splitext(entry.name)[1]
             extensions.setdefault(suffix, 0)
             extensions[suffix] += 1
 
@@ -153,32 +260,49 @@ class Book:
 
     ##############################################
 
+    @property
+    def page_table(self):
+        return self._page_table
+
+    ##############################################
+
+    def _page(self, index):
+        """Return a view on the page at *index* which can be negative"""
+        row = self._order[index]
+        if row == -1:
+            if index < 0:
+                index += len(self._order)
+            return EmptyBookPage(index + 1)
+        return self.__book_page_cls__(self, row)
+
+    ##############################################
+
     def __len__(self):
-        return len(self._pages)
+        return len(self._order)
 
     @property
     def number_of_pages(self):
-        return len(self._pages)
+        return len(self._order)
 
     def __iter__(self):
-        return iter(self._pages)
+        return (self._page(i) for i in range(len(self._order)))
 
     def __getitem__(self, page_number):
-        return self._pages[page_number -1]
+        return self._page(page_number -1)
 
     ##############################################
 
     @property
     def first_page(self):
         try:
-            return self._pages[0]
+            return self._page(0)
         except IndexError:
             return None
 
     @property
     def last_page(self):
         try:
-            return self._pages[-1]
+            return self._page(-1)
         except IndexError:
             return None
 
@@ -195,44 +319,48 @@ class Book:
     ##############################################
 
     def iter_by_page_number(self):
-        pages = list(self._pages)
+        pages = list(self)
         pages.sort(key=lambda page: int(page))
         return iter(pages)
 
     ##############################################
 
     def iter_by_mtime(self):
-        pages = list(self._pages)
-        pages.sort(key=lambda page: page.mtime)
+        pages = list(self)
+        pages.sort(key=lambda page: page.mtime_ns)
         return iter(pages)
 
     ##############################################
 
-    def _get_pages(self):
+    def _get_pages(self, dir_entries):
 
-        self._pages = []
-        for filename in self._list_dir:
+        table = self._page_table
+        for entry in dir_entries:
+            filename = entry.name
             # Fixme: fix _ suffix
             if filename.endswith('_'):
                 path = str(self.joinpath(filename))
                 if not file_watcher.rename_file(path, path[:-1]):
                     filename = filename[:-1]
+                    # the entry is outdated
+                    entry = None
                 else:
                     raise NameError('')
             if filename.endswith(self._extension):
                 try:
-                    self.add_page(filename)
+                    table.add(filename, entry)
                 except Exception as exception:
                     self._logger.warning('Error on {}\n{}'.format(filename, exception))
 
-        self._pages.sort() # by page number or index
+        # by page number or index
+        self._order = array('l', sorted(range(len(table)), key=table.sort_key))
 
     ##############################################
 
-    def add_page(self, filename):
-        page = self.__book_page_cls__(self, filename)
-        self._pages.append(page)
-        return page
+    def add_page(self, filename, dir_entry=None):
+        row = self._page_table.add(filename, dir_entry)
+        self._order.append(row)
+        return self.__book_page_cls__(self, row)
 
     ##############################################
 
@@ -244,7 +372,7 @@ class Book:
     def check(self):
 
         page_numbers = {}
-        for page in self._pages:
+        for page in self:
             page_number = page.page_number
             if page_number is not None:
                 if page_number not in page_numbers:
@@ -258,33 +386,128 @@ class Book:
 
     def fix_empty_pages(self):
 
-        pages = []
+        order = array('l')
         page_counter = 0
-        for page in self._pages:
+        for page in self:
             page_counter += 1
             page_number = int(page) # page.page_number
             if page_number is not None and page_counter < page_number:
                 for i in range(page_number - page_counter):
                     self._logger.warning('Missing page {}'.format(page_counter))
-                    pages.append(EmptyBookPage(page_counter))
+                    order.append(-1)
                     page_counter += 1
-            pages.append(page)
-        self._pages = pages
+            order.append(page.row if not page.is_empty else -1)
+        self._order = order
 
     ##############################################
 
-    def set_orientation(self, positive_delta=True):
+    def set_orientation(self, positive_delta=True, number_of_workers=None, progress_callback=None):
 
-        for page in self._pages:
-            if page.orientation == 'x':
-                self._logger.info(repr(page))
-                orientation = page.guess_orientation()
-                if not positive_delta:
-                    orientation = not orientation
-                orientation = 'r' if orientation else 'v'
-                if not page.rename(orientation=orientation):
-                    raise NameError('')
-                page.release_image()
+        """Guess the orientation of the pages which don't have one, the pages are analysed in a
+        process pool and then renamed in one batch.
+
+        """
+
+        from .OrientationDetector import OrientationDetector
+
+        pages = [page for page in self if page.orientation == 'x']
+        detector = OrientationDetector(number_of_workers)
+        renames = []
+        for page, orientation in zip(pages, detector.guess(pages, progress_callback, self.sidecar)):
+            if not positive_delta:
+                orientation = not orientation
+            orientation = 'r' if orientation else 'v'
+            renames.append((page, dict(orientation=orientation)))
+        self.rename_pages(renames)
+
+    ##############################################
+
+    def find_duplicates(self, number_of_workers=None, progress_callback=None, mp_context=None):
+
+        """Return the pairs of pages which look the same, see :class:`DuplicateDetector`.  The page
+        signatures are cached in the book directory.
+
+        """
+
+        from .DuplicateDetector import DuplicateDetector
+
+        detector = DuplicateDetector(self, number_of_workers, mp_context=mp_context)
+        return detector.find_duplicates(progress_callback)
+
+    ##############################################
+
+    @property
+    def rename_journal_path(self):
+        return self._path.joinpath(self.RENAME_JOURNAL_FILENAME)
+
+    ##############################################
+
+    def rename_pages(self, renames):
+
+        """Rename a batch of pages, *renames* is a list of (page, kwargs) where kwargs are the
+        arguments of :meth:`BookPage.make_name`.
+
+        The new names are computed first and a page is only updated once its file is renamed.  The
+        renames are written to a journal, thus an interrupted batch is completed the next time the
+        book is opened.  Raise :class:`FileExistsError` if a target file exists and is not renamed by
+        the batch, or if two pages have the same target.
+
+        If a target is also the source of another rename, the files are moved to temporary names
+        first, thus the order of the renames doesn't matter.
+
+        """
+
+        batch = []
+        for page, kwargs in renames:
+            old_filename = page.filename
+            new_filename = page.make_name(**kwargs)
+            if new_filename != old_filename:
+                batch.append((page, old_filename, new_filename))
+        if not batch:
+            return
+
+        old_filenames = set(old_filename for _, old_filename, _ in batch)
+        new_filenames = set()
+        for _, _, new_filename in batch:
+            if new_filename in new_filenames or (
+                    new_filename not in old_filenames and self.joinpath(new_filename).exists()):
+                raise FileExistsError(str(self.joinpath(new_filename)))
+            new_filenames.add(new_filename)
+
+        # a rename step is (page or None, old filename, new filename)
+        if new_filenames & old_filenames:
+            steps = [(None, old_filename, old_filename + self.RENAME_SUFFIX) for _, old_filename, _ in batch]
+            steps += [(page, old_filename + self.RENAME_SUFFIX, new_filename) for page, old_filename, new_filename in batch]
+        else:
+            steps = batch
+
+        self._logger.info('Rename {} pages'.format(len(batch)))
+        with open(str(self.rename_journal_path), 'w') as fh:
+            json.dump([(old_filename, new_filename) for _, old_filename, new_filename in steps], fh)
+        for page, old_filename, new_filename in steps:
+            if not file_watcher.rename_file(self.joinpath(old_filename), self.joinpath(new_filename)):
+                raise NameError('Cannot rename {}'.format(old_filename))
+            if page is not None:
+                page.set_filename(new_filename)
+        os.unlink(str(self.rename_journal_path))
+
+    ##############################################
+
+    def _recover_rename_journal(self):
+
+        journal_path = self.rename_journal_path
+        if not journal_path.exists():
+            return
+
+        self._logger.warning('Complete an interrupted rename batch')
+        with open(str(journal_path)) as fh:
+            journal = json.load(fh)
+        for old_filename, new_filename in journal:
+            old_path = self.joinpath(old_filename)
+            new_path = self.joinpath(new_filename)
+            if old_path.exists() and not new_path.exists():
+                file_watcher.rename_file(old_path, new_path)
+        os.unlink(str(journal_path))
 
     ##############################################
 
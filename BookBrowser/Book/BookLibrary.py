@@ -24,13 +24,16 @@ __all__ = ['BookLibrary']
 
 from operator import attrgetter
 from pathlib import Path
-import glob
 import json
 import logging
 import os
 
 from .Book import Book
+from .BookLibraryIndex import BookLibraryIndex, BookLibraryIndexEntry
+from .BookLibraryScanner import BookLibraryScanner
 from .BookMetadata import BookMetadata
+from .BookSidecar import BookSidecar
+from .BookTextIndex import BookTextIndex
 
 ####################################################################################################
 
@@ -40,20 +43,51 @@ _module_logger = logging.getLogger(__name__)
 
 class BookCover:
 
+    """Class to store a summary of a book, which is enough to sort and display the library.
+
+    The full book metadata are only loaded on demand, when the :attr:`metadata` property is
+    accessed.
+
+    """
+
     __json_keys__ = (
         ('path', str),
         ('cover_path', str),
+        ('title', str),
+        ('authors', list),
+        ('year', int),
+        ('mtime', float),
+        ('directory_mtime', float),
     )
 
     _logger = _module_logger.getChild('BookCover')
 
     ##############################################
 
-    def __init__(self, path, cover_path=None):
+    def __init__(self, path, cover_path=None, title='', authors=(), year=0, mtime=0, directory_mtime=0):
 
-        self._path = path
+        self._path = Path(str(path))
         self._metadata = None
         self._cover_path = cover_path
+        self._title = str(title)
+        self._authors = tuple(authors)
+        self._year = int(year)
+        # mtime of the metadata file
+        self._mtime = float(mtime)
+        # mtime of the book directory when the cover was found
+        self._directory_mtime = float(directory_mtime)
+
+    ##############################################
+
+    @classmethod
+    def from_metadata(cls, path, metadata, mtime):
+        return cls(
+            path,
+            title=metadata.title,
+            authors=metadata.authors,
+            year=metadata.year,
+            mtime=mtime,
+        )
 
     ##############################################
 
@@ -70,26 +104,82 @@ class BookCover:
 
     ##############################################
 
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def authors(self):
+        return iter(self._authors)
+
+    @property
+    def authors_str(self):
+        return ', '.join(self._authors)
+
+    @property
+    def year(self):
+        return self._year
+
+    @property
+    def mtime(self):
+        return self._mtime
+
+    ##############################################
+
+    @property
+    def directory_mtime(self):
+        return self._directory_mtime
+
+    ##############################################
+
+    @staticmethod
+    def find_cover_path(path):
+
+        """Return the first image of the book directory *path* in lexicographic order, or an empty
+        string if there is no image.
+
+        """
+
+        cover_filename = None
+        with os.scandir(str(path)) as entries:
+            for entry in entries:
+                name = entry.name
+                if os.path.splitext(name)[1] in Book.EXTENSIONS:
+                    if cover_filename is None or name < cover_filename:
+                        cover_filename = name
+        if cover_filename is not None:
+            return str(Path(str(path)).joinpath(cover_filename))
+        else:
+            return ''
+
+    ##############################################
+
+    def set_cover_path(self, cover_path, directory_mtime):
+        self._cover_path = cover_path
+        self._directory_mtime = float(directory_mtime)
+
+    ##############################################
+
     @property
     def cover_path(self):
         if self._cover_path is None:
-            # files = os.listdir(self._path)
-            images = []
-            for extension in Book.EXTENSIONS:
-                pattern = str(self._path.joinpath('*' + extension))
-                images += glob.glob(pattern)
-            images.sort()
-            if len(images) < 1:
-                self._logger.warning('Any cover for {}'.format(self._path))
-                return None
-            self._cover_path = images[0] # Fixme: full proof ???
-            self._logger.info('Cover set to {}'.format(self._cover_path))
+            directory_mtime = os.stat(str(self._path)).st_mtime
+            self.set_cover_path(self.find_cover_path(self._path), directory_mtime)
+            if self._cover_path:
+                self._logger.info('Cover set to {}'.format(self._cover_path))
+        if not self._cover_path:
+            self._logger.warning('Any cover for {}'.format(self._path))
+            return None
         return self._cover_path
 
     ##############################################
 
     def to_dict(self):
-        return {key:ctor(getattr(self, '_' + key)) for key, ctor in self.__json_keys__}
+        data = {}
+        for key, ctor in self.__json_keys__:
+            value = getattr(self, '_' + key)
+            data[key] = ctor(value) if value is not None else None
+        return data
 
     ##############################################
 
@@ -121,9 +211,10 @@ class BookLibrary:
 
     ##############################################
 
-    def __init__(self, path):
+    def __init__(self, path, number_of_workers=None):
 
         self._path = Path(str(path)).resolve()
+        self._number_of_workers = number_of_workers
 
         self._books = []
 
@@ -135,17 +226,46 @@ class BookLibrary:
 
     ##############################################
 
-    def scan(self):
+    def scan(self, callback=None, number_of_workers=None):
+
+        """Scan the library for books.
+
+        Only the metadata files which changed since the last scan are loaded, the others are
+        retrieved from the library index.  The directories are walked in a thread pool of
+        *number_of_workers* threads.
+
+        If *callback* is provided, it is called with each :class:`BookCover` as soon as it is
+        found.  Note it is called from the thread running the scan.
+
+        """
+
+        self._books = []
+
+        with BookLibraryIndex(self._path) as index:
+            # entries which are not popped are stale
+            entries = index.entries()
+            scanner = BookLibraryScanner(
+                BookCover,
+                self._path,
+                index_entries=entries,
+                number_of_workers=number_of_workers or self._number_of_workers,
+            )
+            updated_entries = []
+            for result in scanner:
+                entries.pop(str(result.book_cover.path), None)
+                if result.is_updated:
+                    is_leaf = not result.sub_directories
+                    updated_entries.append(BookLibraryIndexEntry.from_book_cover(result.book_cover, is_leaf))
+                book_cover = result.book_cover
+                self._books.append(book_cover)
+                if callback is not None:
+                    callback(book_cover)
+
+            self._logger.info('Scanned {} books, {} updated, {} removed'.format(
+                len(self._books), len(updated_entries), len(entries)))
+            index.update(updated_entries)
+            index.remove(entries.keys())
 
-        root_path = str(self._path)
-        for path, directories, files in os.walk(root_path):
-            for directory in directories:
-                book_path = Path(path).joinpath(directory)
-                json_path = BookMetadata.make_json_path(book_path)
-                if json_path.exists():
-                    # self._logger.info('Book {}'.format(book_path))
-                    book_cover = BookCover(book_path)
-                    self._books.append(book_cover)
         self.sort_by_title()
 
     ##############################################
@@ -162,7 +282,46 @@ class BookLibrary:
     ##############################################
 
     def sort_by_title(self):
-        self._books.sort(key=lambda book: book.metadata.title)
+        self._books.sort(key=attrgetter('title'))
+
+    ##############################################
+
+    def update_text_index(self, language=None, callback=None):
+
+        """Index the OCR texts stored in the sidecars of the books, the books which are not in the
+        library anymore are removed from the index.  If *callback* is provided, it is called with
+        each book and its number of indexed pages.
+
+        Return the number of indexed pages.
+
+        """
+
+        if not len(self):
+            self.scan()
+
+        counter = 0
+        with BookTextIndex(self._path) as index:
+            book_paths = set()
+            for book_cover in self:
+                # a book without sidecar has no text, don't create a sidecar
+                if not BookSidecar.make_sqlite_path(book_cover.path).exists():
+                    continue
+                book = Book(book_cover.path)
+                book_paths.add(str(book.path))
+                number_of_pages = index.update_book(book, language)
+                book.close()
+                counter += number_of_pages
+                if callback is not None:
+                    callback(book, number_of_pages)
+            index.remove_books(set(index.book_paths()) - book_paths)
+        return counter
+
+    ##############################################
+
+    def search_texts(self, query, limit=50):
+        """Return the pages matching *query*, see :meth:`BookTextIndex.search`"""
+        with BookTextIndex(self._path) as index:
+            return index.search(query, limit)
 
     ##############################################
 
@@ -172,7 +331,7 @@ class BookLibrary:
         for book in self:
             print('-'*80)
             print(book.path)
-            print(book.metadata.title)
+            print(book.title)
             print(book.cover_path)
         self.save_json()
 
@@ -186,6 +345,7 @@ class BookLibrary:
 
     def load_from_json(self):
 
+        self._books = []
         path = self.json_path
         with open(str(path), 'r') as fh:
             json_data = json.loads(fh.read())
@@ -209,6 +369,5 @@ class BookLibrary:
         else:
             path = self.json_path
             with open(str(path), 'w') as fh:
-                data_json = self.to_json()
-                self._logger.info(str(data_json))
-                fh.write(data_json)
+                fh.write(self.to_json())
+            self._logger.info('Saved {} books in {}'.format(len(self._books), path))
@@ -0,0 +1,203 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a persistent index of the books of a library.
+
+The index is a SQLite database stored at the root of the library, next to the library JSON file.
+It records for each book directory the mtime of its metadata file and a summary of the metadata, so
+a rescan only has to stat the metadata files and to reload the ones which changed.  It also records
+the cover and the mtime of the book directory, so the listing of a book directory is skipped as
+long as its mtime doesn't change.
+
+"""
+
+####################################################################################################
+
+__all__ = ['BookLibraryIndex', 'BookLibraryIndexEntry']
+
+####################################################################################################
+
+from collections import namedtuple
+from pathlib import Path
+import json
+import logging
+import sqlite3
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+_FIELDS = (
+    'path',
+    'mtime',
+    'title',
+    'authors',
+    'year',
+    'cover_path',
+    'directory_mtime',
+    'is_leaf',
+)
+
+class BookLibraryIndexEntry(namedtuple('BookLibraryIndexEntry', _FIELDS)):
+
+    """Class to store the summary of a book, see :class:`BookLibrary.BookCover`.
+
+    *is_leaf* is set if the book directory doesn't have sub-directories.
+
+    """
+
+    __slots__ = ()
+
+    ##############################################
+
+    @classmethod
+    def from_book_cover(cls, book_cover, is_leaf):
+        return cls(
+            str(book_cover.path),
+            book_cover.mtime,
+            book_cover.title,
+            tuple(book_cover.authors),
+            book_cover.year,
+            book_cover._cover_path,
+            book_cover.directory_mtime,
+            bool(is_leaf),
+        )
+
+    ##############################################
+
+    @classmethod
+    def _from_row(cls, row):
+        path, mtime, title, authors, year, cover_path, directory_mtime, is_leaf = row
+        return cls(path, mtime, title, tuple(json.loads(authors)), year, cover_path, directory_mtime, bool(is_leaf))
+
+    def _to_row(self):
+        return (
+            str(self.path),
+            self.mtime,
+            self.title,
+            json.dumps(list(self.authors)),
+            self.year,
+            self.cover_path,
+            self.directory_mtime,
+            int(self.is_leaf),
+        )
+
+####################################################################################################
+
+class BookLibraryIndex:
+
+    SQLITE_FILENAME = '.book-library-index.sqlite'
+
+    # Bump this number to drop an index written by a previous version
+    SCHEMA_VERSION = 3
+
+    _logger = _module_logger.getChild('BookLibraryIndex')
+
+    ##############################################
+
+    @classmethod
+    def make_sqlite_path(cls, library_path):
+        return Path(str(library_path)).joinpath(cls.SQLITE_FILENAME)
+
+    ##############################################
+
+    def __init__(self, library_path):
+
+        self._path = self.make_sqlite_path(library_path)
+        self._connection = sqlite3.connect(str(self._path))
+        self._create_schema()
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    ##############################################
+
+    def _create_schema(self):
+
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._logger.info('Create library index {}'.format(self._path))
+            with self._connection:
+                self._connection.execute('DROP TABLE IF EXISTS books')
+                self._connection.execute(
+                    'CREATE TABLE books ('
+                    ' path TEXT PRIMARY KEY,'
+                    ' mtime REAL NOT NULL,'
+                    ' title TEXT NOT NULL,'
+                    ' authors TEXT NOT NULL,'
+                    ' year INTEGER NOT NULL,'
+                    ' cover_path TEXT,'
+                    ' directory_mtime REAL NOT NULL,'
+                    ' is_leaf INTEGER NOT NULL'
+                    ')'
+                )
+                # PRAGMA doesn't support parameter binding
+                self._connection.execute('PRAGMA user_version = {:d}'.format(self.SCHEMA_VERSION))
+
+    ##############################################
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+
+    ##############################################
+
+    def entries(self):
+        """Return a dict mapping the book path to an index entry"""
+        cursor = self._connection.execute('SELECT {} FROM books'.format(', '.join(_FIELDS)))
+        return {row[0]:BookLibraryIndexEntry._from_row(row) for row in cursor}
+
+    ##############################################
+
+    def update(self, entries):
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO books ({}) VALUES ({})'.format(
+                    ', '.join(_FIELDS),
+                    ', '.join('?'*len(_FIELDS)),
+                ),
+                [entry._to_row() for entry in entries],
+            )
+
+    ##############################################
+
+    def remove(self, paths):
+        with self._connection:
+            self._connection.executemany(
+                'DELETE FROM books WHERE path = ?',
+                [(str(path),) for path in paths],
+            )
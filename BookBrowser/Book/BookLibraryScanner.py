@@ -0,0 +1,230 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a parallel directory walker to find the books of a library.
+
+On a network filesystem each directory listing and each stat cost a round trip.  The walker
+lists the directories using :func:`os.scandir` in a thread pool, thus several round trips are
+in flight at the same time.  The presence of the book metadata file and the cover of the book are
+deduced from the same listing of the book directory.  The listing of a book directory is skipped if
+its mtime matches the one recorded in the library index.
+
+The symlinks to directories are followed, a directory is identified by its device and inode numbers
+thus it is only scanned once and a loop is not walked forever.
+
+"""
+
+####################################################################################################
+
+__all__ = ['BookLibraryScanner']
+
+####################################################################################################
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import logging
+import os
+
+from .Book import Book
+from .BookMetadata import BookMetadata
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class BookLibraryScanResult:
+
+    ##############################################
+
+    def __init__(self, path, sub_directories, book_cover=None, is_updated=False):
+
+        self.path = path
+        self.sub_directories = sub_directories
+        self.book_cover = book_cover
+        self.is_updated = is_updated
+
+    ##############################################
+
+    @property
+    def is_book(self):
+        return self.book_cover is not None
+
+####################################################################################################
+
+class BookLibraryScanner:
+
+    """Class to walk a library tree in a thread pool.
+
+    *index_entries* is a dict mapping a book path to a
+    :class:`BookLibraryIndex.BookLibraryIndexEntry`, it is only read by the workers.
+
+    """
+
+    # The walk is I/O bound, thus we can run more threads than cores
+    NUMBER_OF_WORKERS = 8
+
+    _logger = _module_logger.getChild('BookLibraryScanner')
+
+    ##############################################
+
+    def __init__(self, book_cover_cls, root_path, index_entries=None, number_of_workers=None):
+
+        self._book_cover_cls = book_cover_cls
+        self._root_path = Path(str(root_path))
+        self._index_entries = index_entries or {}
+        self._number_of_workers = number_of_workers or self.NUMBER_OF_WORKERS
+
+    ##############################################
+
+    def _scan_directory(self, path, stat_result, is_root=False):
+
+        """Scan the directory *path*, *stat_result* is its stat which is done by the parent scan.  The
+        sub-directories of the result are (path, stat_result) tuples.
+
+        """
+
+        index_entry = None if is_root else self._index_entries.get(path, None)
+        directory_mtime = stat_result.st_mtime
+        if index_entry is not None and index_entry.is_leaf:
+            # A book directory without sub-directory, if its mtime didn't change then the
+            # directory content is the same and we can skip the listing
+            if directory_mtime == index_entry.directory_mtime:
+                return self._scan_known_book(path, index_entry)
+
+        sub_directories = []
+        metadata_entry = None
+        cover_path = None
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name == BookMetadata.JSON_FILENAME:
+                        metadata_entry = entry
+                    elif os.path.splitext(name)[1] in Book.EXTENSIONS:
+                        # the cover is the first image in lexicographic order
+                        if cover_path is None or name < cover_path:
+                            cover_path = name
+                    elif entry.is_dir():
+                        try:
+                            # follow the symlinks, the stat is required to detect the loops
+                            sub_directories.append((entry.path, entry.stat()))
+                        except OSError as exception:
+                            self._logger.warning('Cannot stat {}\n{}'.format(entry.path, exception))
+        except OSError as exception:
+            self._logger.warning('Cannot scan {}\n{}'.format(path, exception))
+            return BookLibraryScanResult(path, sub_directories)
+
+        if metadata_entry is None or is_root:
+            return BookLibraryScanResult(path, sub_directories)
+
+        book_path = Path(path)
+        mtime = metadata_entry.stat().st_mtime
+        if cover_path is not None:
+            cover_path = str(book_path.joinpath(cover_path))
+        else:
+            self._logger.warning('Any cover for {}'.format(path))
+            cover_path = ''
+
+        if index_entry is not None and index_entry.mtime == mtime:
+            book_cover = self._book_cover_from_index(index_entry)
+        else:
+            book_cover = self._load_book_cover(book_path, mtime)
+        book_cover.set_cover_path(cover_path, directory_mtime)
+
+        is_updated = (
+            index_entry is None
+            or index_entry.mtime != mtime
+            or index_entry.cover_path != cover_path
+            or index_entry.directory_mtime != directory_mtime
+            or index_entry.is_leaf != (not sub_directories)
+        )
+        return BookLibraryScanResult(path, sub_directories, book_cover, is_updated)
+
+    ##############################################
+
+    def _scan_known_book(self, path, index_entry):
+
+        json_path = BookMetadata.make_json_path(Path(path))
+        try:
+            mtime = json_path.stat().st_mtime
+        except FileNotFoundError:
+            return BookLibraryScanResult(path, [])
+
+        if index_entry.mtime == mtime:
+            book_cover = self._book_cover_from_index(index_entry)
+            is_updated = False
+        else:
+            book_cover = self._load_book_cover(Path(path), mtime)
+            book_cover.set_cover_path(index_entry.cover_path, index_entry.directory_mtime)
+            is_updated = True
+
+        return BookLibraryScanResult(path, [], book_cover, is_updated)
+
+    ##############################################
+
+    def _book_cover_from_index(self, index_entry):
+        return self._book_cover_cls(
+            Path(index_entry.path),
+            cover_path=index_entry.cover_path,
+            title=index_entry.title,
+            authors=index_entry.authors,
+            year=index_entry.year,
+            mtime=index_entry.mtime,
+            directory_mtime=index_entry.directory_mtime,
+        )
+
+    ##############################################
+
+    def _load_book_cover(self, book_path, mtime):
+        json_path = BookMetadata.make_json_path(book_path)
+        self._logger.info('Load book metadata {}'.format(json_path))
+        metadata = BookMetadata.load_json(json_path)
+        return self._book_cover_cls.from_metadata(book_path, metadata, mtime)
+
+    ##############################################
+
+    def __iter__(self):
+
+        """Walk the library and yield a :class:`BookLibraryScanResult` for each book as soon as it
+        is found.
+
+        """
+
+        root_path = str(self._root_path)
+        stat_result = os.stat(root_path)
+        # (device, inode) of the scanned directories, only used by this thread
+        visited = {(stat_result.st_dev, stat_result.st_ino)}
+        with ThreadPoolExecutor(max_workers=self._number_of_workers) as executor:
+            pending = {executor.submit(self._scan_directory, root_path, stat_result, True)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    for path, stat_result in result.sub_directories:
+                        key = (stat_result.st_dev, stat_result.st_ino)
+                        if key in visited:
+                            self._logger.info('Skip {}, the directory is already scanned'.format(path))
+                            continue
+                        visited.add(key)
+                        pending.add(executor.submit(self._scan_directory, path, stat_result))
+                    if result.is_book:
+                        yield result
@@ -25,9 +25,8 @@ __all__ = [
 
 ####################################################################################################
 
+import json
 import logging
-import os
-import stat
 
 import PIL
 from PIL import Image
@@ -46,8 +45,104 @@ VERSO = 'v'
 
 ####################################################################################################
 
+def draft_image(image, scale=1):
+
+    """Configure the decoder of the lazy PIL *image* to decode at a reduced scale if *scale* is greater
+    than 1, it is only supported by JPEG which can be decoded at 1/2, 1/4 and 1/8.
+
+    """
+
+    if scale > 1:
+        width, height = image.size
+        image.draft(None, (width // scale, height // scale))
+
+def open_image(path, scale=1):
+    """Return a lazy PIL image decoded at a reduced scale, see :func:`draft_image`.  The image must be
+    closed, e.g. using a with statement.
+    """
+    image = Image.open(str(path))
+    draft_image(image, scale)
+    return image
+
+####################################################################################################
+
+def crop_regions(image, boxes, scale=1):
+
+    """Decode the lazy PIL *image* once and return the regions *boxes* as Numpy arrays, the decoder
+    must not be configured by :func:`draft_image`.
+
+    A box is a tuple (left, upper, right, lower) in the coordinates of the source image, None means
+    the whole image.  A region is reduced by the factor *scale*.  Only JPEG is decoded at a reduced
+    scale, the other formats are decoded entirely.
+
+    """
+
+    width, height = image.size
+    # clip the boxes like a Numpy slice
+    boxes = [
+        (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3])) if box else (0, 0, width, height)
+        for box in boxes
+    ]
+
+    # draft can reduce the image
+    draft_image(image, scale)
+    draft_scale = width / image.size[0]
+
+    regions = []
+    for box in boxes:
+        if scale == 1:
+            region = image.crop(box)
+        else:
+            size = (max(1, (box[2] - box[0]) // scale), max(1, (box[3] - box[1]) // scale))
+            draft_box = [x / draft_scale for x in box]
+            region = image.resize(size, Image.BOX, box=draft_box)
+        regions.append(np.asarray(region))
+    return regions
+
+def load_regions(path, boxes, scale=1):
+    """Decode the image *path* once and return the regions *boxes*, see :func:`crop_regions`"""
+    with Image.open(str(path)) as image:
+        return crop_regions(image, boxes, scale)
+
+####################################################################################################
+
+def dual_sum(array):
+    """Return the sum of the dual of the 8-bit *array*, i.e. 255 - array"""
+    return 255 * array.size - int(np.sum(array, dtype=np.uint64))
+
+def dual_histogram(array):
+    """Return the 256 bins histogram of the dual of the 8-bit *array*"""
+    return np.bincount(array.ravel(), minlength=256)[::-1]
+
+####################################################################################################
+
+def orientation_delta_ratio(path, height=100, c_inf=0, c_sup=400, scale=1):
+
+    """Compare the ink in the top and bottom corner strips of the image *path*, return the relative
+    difference in percent.  This function can be run in a worker process.
+
+    """
+
+    with Image.open(str(path)) as image:
+        image_height = image.size[1]
+        top, bottom = crop_regions(
+            image,
+            ((c_inf, 0, c_sup, height), (c_inf, image_height - height, c_sup, image_height)),
+            scale,
+        )
+    top = dual_sum(top)
+    bottom = dual_sum(bottom)
+    if not top:
+        # blank top strip
+        return -100. if bottom else 0.
+    return 100 * (top - bottom)/top
+
+####################################################################################################
+
 class EmptyBookPage:
 
+    __slots__ = ('_page_number',)
+
     ##############################################
 
     def __init__(self, page_number):
@@ -78,19 +173,33 @@ class EmptyBookPage:
 
 class BookPage:
 
+    """Class to implement a page of a book.
+
+    A page is a light view on a row of the page table of the book, the views are made on demand
+    by the book.
+
+    The analysis routines declare the resolution they need as a reduction factor of the source
+    image, they decode only the regions they use, see :meth:`load_regions`.
+
+    """
+
+    # Reduction factors required by the analysis routines
+    ORIENTATION_SCALE = 1
+    HISTOGRAM_SCALE = 4
+
     _logger = _module_logger.getChild('BookPage')
 
-    ##############################################
+    __slots__ = ('_book', '_table', '_row', '_histogram', '_number_of_pixels')
 
-    def __init__(self, book, filename):
+    ##############################################
 
-        self._book = book
-        self._filename = str(filename)
+    def __init__(self, book, row):
 
-        self._parse_filename()
-        self.release_image()
+        """A page is a view on the *row* of the page table of *book*, see :class:`BookPageTable`."""
 
-        self._mtime = os.stat(self.path)[stat.ST_MTIME]
+        self._book = book
+        self._table = book.page_table
+        self._row = row
 
     ##############################################
 
@@ -101,167 +210,217 @@ class BookPage:
     ##############################################
 
     def __repr__(self):
-        template = 'Book Page\n  {0.path}\n  {0._title} {0._page_number}/{0._file_index} {0._extension}'
+        template = 'Book Page\n  {0.path}\n  {0.title} {0.page_number}/{0.file_index} {0.extension}'
         return template.format(self)
 
     def __str__(self):
         return str(self.path)
 
     def __int__(self):
-        return self._page_number or self._file_index
+        return self._table.sort_key(self._row)
 
     def __lt__(self, other):
         """Sort by page number or index"""
         return int(self) < int(other)
 
+    # the views are made on demand, two views of the same row are equal
+    def __eq__(self, other):
+        return isinstance(other, BookPage) and self._table is other._table and self._row == other._row
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
     ##############################################
 
     @property
     def book(self):
         return self._book
 
+    @property
+    def row(self):
+        return self._row
+
     ##############################################
 
     @property
     def filename(self):
-        return self._filename
+        return self._table.filename(self._row)
 
     @property
     def path(self):
-        return self._book.joinpath(self._filename)
-
-    # @path.setter
-    # def path(self, value):
-    #     self._path = value
+        return self._book.joinpath(self.filename)
 
     ##############################################
 
     @property
     def mtime(self):
-        return self._mtime
+        return self._table.mtime(self._row)
+
+    @property
+    def mtime_ns(self):
+        return self._table.mtime_ns(self._row)
+
+    @property
+    def file_size(self):
+        return self._table.file_size(self._row)
 
     ##############################################
 
     @property
     def file_index(self):
-        return self._file_index
-
-    # @file_index.setter
-    # def file_index(self, value):
-    #     self._file_index = int(value)
+        return self._table.file_index(self._row)
 
     ##############################################
 
     @property
     def title(self):
-        return self._title
+        return self._table.title(self._row)
 
     @property
     def page_number(self):
-        return self._page_number
+        return self._table.page_number(self._row)
+
+    @page_number.setter
+    def page_number(self, value):
+        """Set the page number, the file is not renamed"""
+        self._table.set_page_number(self._row, value)
 
     @property
     def orientation(self):
-        return self._orientation
+        return self._table.orientation(self._row)
 
     @property
     def is_recto(self):
-        return self._orientation == RECTO
+        return self.orientation == RECTO
 
     @property
     def is_verso(self):
-        return self._orientation == VERSO
+        return self.orientation == VERSO
 
     @property
     def extension(self):
-        return self._extension
+        return self._table.extension(self._row)
 
     ##############################################
 
-    def _parse_filename(self):
+    # The images are stored in the image cache of the book
 
-        title, page_number, *parts, extension = self._filename.split('.')
+    IMAGE = 'image'
+    DUAL_IMAGE = 'dual_image'
 
-        self._title = title
-        self._extension = extension
+    @property
+    def _image_cache(self):
+        return self._book.image_cache
 
-        if page_number.startswith('p'):
-            self._page_number = int(page_number[1:])
-            self._file_index = None
-        else:
-            self._page_number = None
-            self._file_index = int(page_number)
+    def _cache_key(self, kind):
+        return (self.filename, kind)
 
-        if len(parts) == 1:
-            self._orientation = parts[0]
-        else:
-            self._orientation = 'x'
+    ##############################################
+
+    def _decode_image(self):
+        with Image.open(str(self.path)) as pil_image:
+            return np.asarray(pil_image)
 
     ##############################################
 
-    def _load_image(self, reload=False):
-        if self._image is None or reload:
-            pil_image = Image.open(self.path)
-            self._image = np.asarray(pil_image)
-            # self._logger.info('Image shape {}'.format(self._image.shape))
+    @property
+    def size(self):
+        """Size of the source image, only the header is read"""
+        size = self._table.image_size(self._row)
+        if size is None:
+            sidecar = self._book.sidecar
+            size = sidecar.get(self, 'size')
+            if size is not None:
+                size = tuple(json.loads(size))
+            else:
+                with Image.open(str(self.path)) as image:
+                    size = image.size
+                # a cache of the header, browsing a book doesn't create the sidecar
+                sidecar.set(self, 'size', json.dumps(size), create=False)
+            self._table.set_image_size(self._row, size)
+        return size
+
+    @property
+    def dpi(self):
+        """Horizontal resolution of the source image or None, only the header is read"""
+        with Image.open(str(self.path)) as image:
+            dpi = image.info.get('dpi', None)
+        return float(dpi[0]) if dpi else None
 
     ##############################################
 
-    def _load_dual_image(self, reload=False):
-        self._load_image(reload)
-        if self._dual_image is None or reload:
-            self._dual_image = 255 - self._image
+    def open_image(self, scale=1):
+        """Return a lazy PIL image, see :func:`open_image`"""
+        return open_image(self.path, scale)
+
+    ##############################################
+
+    def load_regions(self, boxes, scale=1):
+        """Decode the image once and return the regions *boxes*, see :func:`load_regions`"""
+        return load_regions(self.path, boxes, scale)
+
+    def load_image(self, box=None, scale=1):
+        """Return the region *box* of the image reduced by *scale*, see :meth:`load_regions`"""
+        return self.load_regions((box,), scale)[0]
 
     ##############################################
 
     def release_image(self):
-        self._image = None
-        self._dual_image = None
+        for kind in (self.IMAGE, self.DUAL_IMAGE):
+            self._image_cache.discard(self._cache_key(kind))
 
     ##############################################
 
     @property
     def image(self):
-        self._load_image()
-        return self._image
+        return self._image_cache.get(self._cache_key(self.IMAGE), self._decode_image)
 
     @property
     def dual_image(self):
-        self._load_dual_image()
-        return self._dual_image
+        return self._image_cache.get(self._cache_key(self.DUAL_IMAGE), lambda: 255 - self.image)
 
     ##############################################
 
     def flip_image(self):
         # Fixme: is it fast ???
         # self.image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
-        self._image = np.flip(self.image, 0)
+        image = np.flip(self.image, 0)
+        self._image_cache.put(self._cache_key(self.IMAGE), image)
+        self._image_cache.discard(self._cache_key(self.DUAL_IMAGE))
 
     ##############################################
 
-    def guess_orientation(self, height=100, c_inf=0, c_sup=400):
+    # The dual image is 255 - image, these functions work on the image buffer
+    dual_sum = staticmethod(dual_sum)
+    dual_histogram = staticmethod(dual_histogram)
+
+    ##############################################
 
-        dual_image = self.dual_image
+    def guess_orientation(self, height=100, c_inf=0, c_sup=400):
 
-        top = int(np.sum(dual_image[:height,c_inf:c_sup]))
-        bottom = int(np.sum(dual_image[-height:,c_inf:c_sup]))
-        delta_ratio = 100 * (top - bottom)/top
+        # only the corner strips are used
+        delta_ratio = orientation_delta_ratio(self.path, height, c_inf, c_sup, self.ORIENTATION_SCALE)
         self._logger.info('top vs bottom {:.2f}'.format(delta_ratio))
 
         return delta_ratio > 0
 
     ##############################################
 
-    def get_histogram(self):
+    def get_histogram(self, scale=None):
+
+        """Compute the histogram of the dual image at a reduced resolution, the histograms to be
+        compared must be computed at the same scale.
 
-        dual_image = self.dual_image
-        height, width, _ = dual_image.shape
+        """
+
+        if scale is None:
+            scale = self.HISTOGRAM_SCALE
+        image = self.load_image(scale=scale)
+        height, width, _ = image.shape
         self._number_of_pixels = height*width
-        channels = [dual_image[:,:,i] for i in range(3)]
-        red, green, blue = channels
+        channels = [image[:,:,i] for i in range(3)]
 
-        histogram = [np.array(np.histogram(channel, bins=256))[0] for channel in channels]
-        self._histogram = histogram
+        self._histogram = [self.dual_histogram(channel) for channel in channels]
 
     ##############################################
 
@@ -276,31 +435,49 @@ class BookPage:
 
     ##############################################
 
-    def rename(self, file_index=None, page_number=None, orientation=None, suffix='', dry_run=False):
+    def make_name(self, file_index=None, page_number=None, orientation=None):
 
-        if page_number is not None:
-            self._page_number = int(page_number)
+        """Return the filename of the page with these name parts, the page is not modified"""
 
-        if orientation is not None:
-            self._orientation = str(orientation)
+        if file_index is not None:
+            page_number = None
+        else:
+            file_index = self.file_index
+            if page_number is not None:
+                page_number = int(page_number)
+            else:
+                page_number = self.page_number
+        if orientation is None:
+            orientation = self.orientation
 
-        number_of_digits = self._book.number_of_digits
-        if file_index is None and self._page_number is not None:
-            template = '{0._title}.p{0._page_number:0' + str(number_of_digits) + '}.{0._orientation}.{0._extension}'
+        number_of_digits = str(self._book.number_of_digits)
+        if page_number is not None:
+            template = '{0}.p{1:0' + number_of_digits + '}.{2}.{3}'
+            number = page_number
         else:
-            template = '{0._title}.{0._file_index:0' + str(number_of_digits) + '}.{0._orientation}.{0._extension}'
+            template = '{0}.{1:0' + number_of_digits + '}.{2}.{3}'
+            number = file_index
+        return template.format(self.title, number, orientation, self.extension)
 
-        if file_index is not None:
-            self._file_index = file_index
-            self._page_number = None
+    ##############################################
+
+    def set_filename(self, filename):
+        """Set the filename after the file was renamed, the name parts are updated"""
+        # the images are cached by filename
+        self.release_image()
+        self._table.set_filename(self._row, filename)
+
+    ##############################################
+
+    def rename(self, file_index=None, page_number=None, orientation=None, suffix='', dry_run=False):
 
         old_path = str(self.path) + str(suffix)
-        filename = template.format(self)
+        filename = self.make_name(file_index, page_number, orientation)
         new_path = self._book.joinpath(filename)
         self._logger.info('rename\n  {}\n->\n{}'.format(old_path, new_path))
         if old_path != new_path:
             if file_watcher.rename_file(old_path, new_path, dry_run=dry_run):
-                self._filename = filename
+                self.set_filename(filename)
                 return True
         return False
 
@@ -309,7 +486,7 @@ class BookPage:
     def flip(self, orientation=None):
 
         if orientation is None:
-            orientation = self._orientation
+            orientation = self.orientation
             if orientation == RECTO:
                 orientation = VERSO
             elif orientation == VERSO:
@@ -322,16 +499,61 @@ class BookPage:
 
     ##############################################
 
+    @staticmethod
+    def text_result_name(language, orientation, engine_version):
+        # the text of a verso depends on the flip, and another engine can recognise another text
+        return 'text/{}/{}/{}'.format(language, orientation, engine_version)
+
+    @staticmethod
+    def ocr_engine_version():
+        """Version of the OCR engine used to recognise the texts"""
+        from BookBrowser.OCR import OcrEngine
+        return OcrEngine().version
+
+    def cached_text(self, language, hash_content=True):
+
+        """Return the text stored in the sidecar of the book or in the :class:`OcrCache`, or None.
+
+        If *hash_content* is not set, the image file is not read to look up the OCR cache.
+
+        """
+
+        engine_version = self.ocr_engine_version()
+        result_name = self.text_result_name(language, self.orientation, engine_version)
+        sidecar = self._book.sidecar
+        text = sidecar.get(self, result_name)
+        if text is not None:
+            return text
+
+        from BookBrowser.OCR.OcrCache import OcrCache
+        text = OcrCache().get(self, language, engine_version, hash_content)
+        if text is not None:
+            self._book.store_text(self, language, engine_version, text)
+        return text
+
+    ##############################################
+
     def to_text(self, language, fake=False):
 
+        if not fake:
+            text = self.cached_text(language)
+            if text is not None:
+                return text
+
         from BookBrowser.OCR import OcrEngine
+        from BookBrowser.OCR.OcrCache import OcrCache
         ocr_engine = OcrEngine()
 
         if self.is_verso:
             self.flip_image()
 
-        text = ocr_engine.image_to_text(self.image, language, fake)
+        text = ocr_engine.image_to_text(self.image, language, fake, dpi=self.dpi)
 
         self.release_image()
 
+        if not fake and text is not None:
+            engine_version = ocr_engine.version
+            self._book.store_text(self, language, engine_version, text)
+            OcrCache().set(self, language, engine_version, text)
+
         return text
@@ -0,0 +1,253 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a compact table of the pages of a book.
+
+The fields of the pages are stored in parallel arrays, a row per page file.  The string fields
+which are shared by the pages, like the title, are stored as codes.  A :class:`BookPage` is a light
+view on a row which is created on demand, thus a book with tens of thousands of pages doesn't hold
+tens of thousands of Python objects.
+
+"""
+
+####################################################################################################
+
+__all__ = ['BookPageTable', 'parse_filename']
+
+####################################################################################################
+
+from array import array
+import logging
+import os
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+# On Windows the stat of a DirEntry is filled by the directory scan, on Unix it is a system call
+# like os.stat, thus the entries are not worth their memory
+_KEEP_DIR_ENTRIES = os.name == 'nt'
+
+####################################################################################################
+
+def parse_filename(filename):
+
+    """Return the tuple (title, page_number, file_index, orientation, extension) of a page filename
+    *title.index[.orientation].extension* or *title.pnumber[.orientation].extension*, the page number
+    or the file index is None.
+
+    """
+
+    title, page_number, *parts, extension = filename.split('.')
+
+    if page_number.startswith('p'):
+        page_number = int(page_number[1:])
+        file_index = None
+    else:
+        file_index = int(page_number)
+        page_number = None
+
+    if len(parts) == 1:
+        orientation = parts[0]
+    else:
+        orientation = 'x'
+
+    return title, page_number, file_index, orientation, extension
+
+####################################################################################################
+
+class _Codes:
+
+    """Class to store the distinct values of a string field"""
+
+    __slots__ = ('_values', '_codes')
+
+    ##############################################
+
+    def __init__(self):
+        self._values = []
+        self._codes = {}
+
+    ##############################################
+
+    def code(self, value):
+        code = self._codes.get(value, None)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._codes[value] = code
+        return code
+
+    def __getitem__(self, code):
+        return self._values[code]
+
+####################################################################################################
+
+class BookPageTable:
+
+    """Class to store the fields of the pages of a book in parallel arrays.
+
+    A missing integer is stored as -1.  The stat of a file is done on demand, on Windows from the
+    cached :class:`os.DirEntry` if the row was made by a directory scan.
+
+    """
+
+    _logger = _module_logger.getChild('BookPageTable')
+
+    ##############################################
+
+    def __init__(self, path):
+
+        self._path = path
+
+        self._filenames = []
+        self._titles = array('H')
+        self._page_numbers = array('l')
+        self._file_indexes = array('l')
+        self._orientations = array('B')
+        self._extensions = array('B')
+        # in nanoseconds
+        self._mtimes = array('q')
+        self._file_sizes = array('q')
+        self._widths = array('l')
+        self._heights = array('l')
+        # the entries are released after the stat
+        self._dir_entries = {}
+
+        self._title_codes = _Codes()
+        self._orientation_codes = _Codes()
+        self._extension_codes = _Codes()
+
+    ##############################################
+
+    def __len__(self):
+        return len(self._filenames)
+
+    ##############################################
+
+    def add(self, filename, dir_entry=None):
+
+        """Add a row for *filename* and return its index, raise an exception if the filename cannot
+        be parsed.
+
+        """
+
+        title, page_number, file_index, orientation, extension = parse_filename(filename)
+        row = len(self._filenames)
+        self._filenames.append(filename)
+        self._titles.append(self._title_codes.code(title))
+        self._page_numbers.append(page_number if page_number is not None else -1)
+        self._file_indexes.append(file_index if file_index is not None else -1)
+        self._orientations.append(self._orientation_codes.code(orientation))
+        self._extensions.append(self._extension_codes.code(extension))
+        self._mtimes.append(-1)
+        self._file_sizes.append(-1)
+        self._widths.append(-1)
+        self._heights.append(-1)
+        if dir_entry is not None and _KEEP_DIR_ENTRIES:
+            self._dir_entries[row] = dir_entry
+        return row
+
+    ##############################################
+
+    def filename(self, row):
+        return self._filenames[row]
+
+    def set_filename(self, row, filename):
+        """Set the filename of a renamed file, the name parts are parsed again"""
+        title, page_number, file_index, orientation, extension = parse_filename(filename)
+        self._filenames[row] = filename
+        self._titles[row] = self._title_codes.code(title)
+        self.set_page_number(row, page_number)
+        self.set_file_index(row, file_index)
+        self.set_orientation(row, orientation)
+        self._extensions[row] = self._extension_codes.code(extension)
+        # the entry has the old path, a rename doesn't change the stat
+        self._dir_entries.pop(row, None)
+
+    def title(self, row):
+        return self._title_codes[self._titles[row]]
+
+    def extension(self, row):
+        return self._extension_codes[self._extensions[row]]
+
+    ##############################################
+
+    def page_number(self, row):
+        page_number = self._page_numbers[row]
+        return page_number if page_number != -1 else None
+
+    def set_page_number(self, row, page_number):
+        self._page_numbers[row] = page_number if page_number is not None else -1
+
+    def file_index(self, row):
+        file_index = self._file_indexes[row]
+        return file_index if file_index != -1 else None
+
+    def set_file_index(self, row, file_index):
+        self._file_indexes[row] = file_index if file_index is not None else -1
+
+    def sort_key(self, row):
+        """Return the page number or the file index"""
+        page_number = self._page_numbers[row]
+        return page_number if page_number != -1 else self._file_indexes[row]
+
+    ##############################################
+
+    def orientation(self, row):
+        return self._orientation_codes[self._orientations[row]]
+
+    def set_orientation(self, row, orientation):
+        self._orientations[row] = self._orientation_codes.code(orientation)
+
+    ##############################################
+
+    def _stat(self, row):
+        dir_entry = self._dir_entries.pop(row, None)
+        if dir_entry is not None:
+            stat_result = dir_entry.stat()
+        else:
+            stat_result = os.stat(os.path.join(str(self._path), self._filenames[row]))
+        self._mtimes[row] = stat_result.st_mtime_ns
+        self._file_sizes[row] = stat_result.st_size
+
+    def mtime_ns(self, row):
+        if self._mtimes[row] == -1:
+            self._stat(row)
+        return self._mtimes[row]
+
+    def mtime(self, row):
+        """Return the mtime in integer seconds"""
+        return self.mtime_ns(row) // 10**9
+
+    def file_size(self, row):
+        if self._file_sizes[row] == -1:
+            self._stat(row)
+        return self._file_sizes[row]
+
+    ##############################################
+
+    def image_size(self, row):
+        """Return the size of the image or None if it is unknown"""
+        width = self._widths[row]
+        return (width, self._heights[row]) if width != -1 else None
+
+    def set_image_size(self, row, size):
+        self._widths[row], self._heights[row] = size
@@ -0,0 +1,321 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a per-book store of the results derived from the page images.
+
+The store is a SQLite database stored in the book directory.  A result is a named value attached to
+a page file, for example the orientation delta, the signature used to find the duplicated pages or
+the OCR text.  The results of a file are valid as long as its mtime and size don't change, thus a
+rerun only has to analyse the pages which changed.
+
+The files are identified by their filename, the renames and the deletions done through the
+:obj:`file_watcher` are applied to the stores.
+
+"""
+
+####################################################################################################
+
+__all__ = ['BookSidecar']
+
+####################################################################################################
+
+from pathlib import Path
+import logging
+import sqlite3
+import threading
+import weakref
+
+from BookBrowser.Common.FileTools import file_watcher
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class BookSidecar:
+
+    """Class to store the results of the page analysis of a book.
+
+    A value can be any type supported by SQLite: None, int, float, str and bytes.  The store can be
+    accessed from several threads.
+
+    The database is created on the first write, thus browsing a book doesn't write in its directory.
+
+    """
+
+    SQLITE_FILENAME = '.book-sidecar.sqlite'
+
+    # Bump this number to drop a store written by a previous version
+    SCHEMA_VERSION = 2
+
+    _logger = _module_logger.getChild('BookSidecar')
+
+    # open stores by book path, used to apply the renames
+    _instances = weakref.WeakValueDictionary()
+
+    ##############################################
+
+    @classmethod
+    def make_sqlite_path(cls, book_path):
+        return Path(str(book_path)).joinpath(cls.SQLITE_FILENAME)
+
+    ##############################################
+
+    def __init__(self, book_path):
+
+        self._book_path = str(book_path)
+        self._path = self.make_sqlite_path(book_path)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._instances[self._book_path] = self
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        if self._instances.get(self._book_path, None) is self:
+            del self._instances[self._book_path]
+
+    ##############################################
+
+    def _connect(self, create=True):
+
+        """Return the connection, the lock must be held by the caller.  If *create* is not set, None is
+        returned when the database doesn't exist.
+
+        """
+
+        if self._connection is None:
+            if not create and not self._path.exists():
+                return None
+            self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+            self._create_schema()
+        return self._connection
+
+    ##############################################
+
+    def _create_schema(self):
+
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._logger.info('Create book sidecar {}'.format(self._path))
+            with self._connection:
+                self._connection.execute('DROP TABLE IF EXISTS files')
+                self._connection.execute('DROP TABLE IF EXISTS results')
+                self._connection.execute(
+                    'CREATE TABLE files ('
+                    ' filename TEXT PRIMARY KEY,'
+                    ' mtime INTEGER NOT NULL,'
+                    ' size INTEGER NOT NULL'
+                    ')'
+                )
+                self._connection.execute(
+                    'CREATE TABLE results ('
+                    ' filename TEXT NOT NULL,'
+                    ' name TEXT NOT NULL,'
+                    ' value,'
+                    ' PRIMARY KEY (filename, name)'
+                    ')'
+                )
+                # PRAGMA doesn't support parameter binding
+                self._connection.execute('PRAGMA user_version = {:d}'.format(self.SCHEMA_VERSION))
+
+    ##############################################
+
+    @staticmethod
+    def _identity(page):
+        # a file rewritten within the same second has a new identity
+        return (int(page.mtime_ns), int(page.file_size))
+
+    ##############################################
+
+    def get(self, page, name, default=None):
+
+        """Return the value *name* of the :class:`BookPage` *page*, or *default* if it is missing or
+        the file changed.
+
+        """
+
+        with self._lock:
+            connection = self._connect(create=False)
+            if connection is None:
+                return default
+            row = connection.execute(
+                'SELECT files.mtime, files.size, results.value FROM files JOIN results USING (filename)'
+                ' WHERE filename = ? AND name = ?',
+                (page.filename, name),
+            ).fetchone()
+        if row is None or row[:2] != self._identity(page):
+            return default
+        return row[2]
+
+    ##############################################
+
+    def values(self, pages, name):
+
+        """Return a dict mapping the filename to the value *name* for the pages which have an up to
+        date value.
+
+        """
+
+        identities = {page.filename:self._identity(page) for page in pages}
+        with self._lock:
+            connection = self._connect(create=False)
+            if connection is None:
+                return {}
+            cursor = connection.execute(
+                'SELECT filename, files.mtime, files.size, results.value FROM files JOIN results USING (filename)'
+                ' WHERE name = ?',
+                (name,),
+            )
+            return {
+                filename:value
+                for filename, mtime, size, value in cursor
+                if identities.get(filename, None) == (mtime, size)
+            }
+
+    ##############################################
+
+    def set(self, page, name, value, create=True):
+        self.set_many(name, ((page, value),), create)
+
+    def set_many(self, name, items, create=True):
+
+        """Store the values *name* given as (page, value) tuples.  The results of a page file which
+        changed are dropped.  If *create* is not set, the values are only stored if the database
+        exists.
+
+        """
+
+        items = list(items)
+        with self._lock:
+            connection = self._connect(create)
+            if connection is None:
+                return
+            with connection:
+                for page, value in items:
+                    filename = page.filename
+                    identity = self._identity(page)
+                    row = connection.execute('SELECT mtime, size FROM files WHERE filename = ?', (filename,)).fetchone()
+                    if row != identity:
+                        if row is not None:
+                            connection.execute('DELETE FROM results WHERE filename = ?', (filename,))
+                        connection.execute(
+                            'INSERT OR REPLACE INTO files (filename, mtime, size) VALUES (?, ?, ?)',
+                            (filename,) + identity,
+                        )
+                    connection.execute(
+                        'INSERT OR REPLACE INTO results (filename, name, value) VALUES (?, ?, ?)',
+                        (filename, name, value),
+                    )
+
+    ##############################################
+
+    def rename(self, old_filename, new_filename):
+        self._logger.info('Rename {} -> {}'.format(old_filename, new_filename))
+        with self._lock:
+            connection = self._connect(create=False)
+            if connection is None:
+                return
+            with connection:
+                for table in ('files', 'results'):
+                    # a stale entry could use the new name
+                    connection.execute('DELETE FROM {} WHERE filename = ?'.format(table), (new_filename,))
+                    connection.execute(
+                        'UPDATE {} SET filename = ? WHERE filename = ?'.format(table),
+                        (new_filename, old_filename),
+                    )
+
+    ##############################################
+
+    def remove(self, filenames):
+        """Remove the results of the files which don't exist any more"""
+        rows = [(filename,) for filename in filenames]
+        with self._lock:
+            connection = self._connect(create=False)
+            if connection is None:
+                return
+            with connection:
+                for table in ('files', 'results'):
+                    connection.executemany('DELETE FROM {} WHERE filename = ?'.format(table), rows)
+
+    ##############################################
+
+    def prune(self, filenames):
+        """Remove the results of the files which are not in *filenames*"""
+        filenames = set(filenames)
+        with self._lock:
+            connection = self._connect(create=False)
+            if connection is None:
+                return
+            stale_filenames = [
+                row[0] for row in connection.execute('SELECT filename FROM files')
+                if row[0] not in filenames
+            ]
+        if stale_filenames:
+            self._logger.info('Remove {} stale files'.format(len(stale_filenames)))
+            self.remove(stale_filenames)
+
+    ##############################################
+
+    @classmethod
+    def _for_directory(cls, path, callback):
+        book_path = str(Path(path).parent)
+        sidecar = cls._instances.get(book_path, None)
+        if sidecar is not None:
+            callback(sidecar)
+        elif cls.make_sqlite_path(book_path).exists():
+            with cls(book_path) as sidecar:
+                callback(sidecar)
+
+    @classmethod
+    def _on_rename(cls, old_path, new_path):
+        old_path = Path(old_path)
+        new_path = Path(new_path)
+        if old_path.parent == new_path.parent:
+            cls._for_directory(old_path, lambda sidecar: sidecar.rename(old_path.name, new_path.name))
+        else:
+            cls._on_delete(old_path)
+
+    @classmethod
+    def _on_delete(cls, path):
+        path = Path(path)
+        cls._for_directory(path, lambda sidecar: sidecar.remove((path.name,)))
+
+####################################################################################################
+
+file_watcher.add_rename_listener(BookSidecar._on_rename)
+file_watcher.add_delete_listener(BookSidecar._on_delete)
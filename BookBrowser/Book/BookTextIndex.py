@@ -0,0 +1,325 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a full-text index of the OCR texts of the books of a library.
+
+The index is a SQLite database stored at the root of the library, next to the library JSON file.
+The texts are indexed by the `FTS5 <https://www.sqlite.org/fts5.html>`_ extension, a query returns
+the pages sorted by the BM25 rank.  A page is indexed as soon as it is recognised, and the texts
+stored in the sidecar of a book can be indexed using :meth:`BookTextIndex.update_book`.
+
+The renames and the deletions done through the :obj:`file_watcher` are applied to the indexes.
+
+"""
+
+####################################################################################################
+
+__all__ = ['BookTextIndex', 'TextSearchHit']
+
+####################################################################################################
+
+from collections import namedtuple
+from pathlib import Path
+import hashlib
+import logging
+import sqlite3
+import threading
+import weakref
+
+from BookBrowser.Common.FileTools import file_watcher
+from .BookPageTable import parse_filename
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+TextSearchHit = namedtuple('TextSearchHit', ('book_path', 'filename', 'page_number', 'rank', 'snippet'))
+
+####################################################################################################
+
+class BookTextIndex:
+
+    """Class to index the texts of the pages of a library.
+
+    A page is identified by its book path and its filename, only its last text is indexed.  The
+    index can be accessed from several threads.
+
+    """
+
+    SQLITE_FILENAME = '.book-text-index.sqlite'
+
+    # Bump this number to drop an index written by a previous version
+    SCHEMA_VERSION = 1
+
+    _logger = _module_logger.getChild('BookTextIndex')
+
+    # open indexes by library path, used to apply the renames
+    _instances = weakref.WeakValueDictionary()
+
+    ##############################################
+
+    @classmethod
+    def make_sqlite_path(cls, library_path):
+        return Path(str(library_path)).joinpath(cls.SQLITE_FILENAME)
+
+    ##############################################
+
+    def __init__(self, library_path):
+
+        self._library_path = str(Path(str(library_path)).resolve())
+        self._path = self.make_sqlite_path(library_path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._create_schema()
+        self._instances[self._library_path] = self
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        if self._instances.get(self._library_path, None) is self:
+            del self._instances[self._library_path]
+
+    ##############################################
+
+    def _create_schema(self):
+
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._logger.info('Create text index {}'.format(self._path))
+            with self._connection:
+                self._connection.execute('DROP TABLE IF EXISTS pages')
+                self._connection.execute('DROP TABLE IF EXISTS texts')
+                self._connection.execute(
+                    'CREATE TABLE pages ('
+                    ' id INTEGER PRIMARY KEY,'
+                    ' book_path TEXT NOT NULL,'
+                    ' filename TEXT NOT NULL,'
+                    ' page_number INTEGER,'
+                    ' digest TEXT NOT NULL,'
+                    ' UNIQUE (book_path, filename)'
+                    ')'
+                )
+                # the rowid of a text is the id of its page
+                self._connection.execute(
+                    "CREATE VIRTUAL TABLE texts USING fts5(text, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+                # PRAGMA doesn't support parameter binding
+                self._connection.execute('PRAGMA user_version = {:d}'.format(self.SCHEMA_VERSION))
+
+    ##############################################
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    ##############################################
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    ##############################################
+
+    def _set_page(self, book_path, filename, page_number, text):
+
+        """Index a text, the lock must be held by the caller.  Return True if the index is modified."""
+
+        digest = self._digest(text)
+        row = self._connection.execute(
+            'SELECT id, page_number, digest FROM pages WHERE book_path = ? AND filename = ?',
+            (book_path, filename),
+        ).fetchone()
+        if row is not None:
+            page_id, old_page_number, old_digest = row
+            if old_digest == digest:
+                if old_page_number != page_number:
+                    self._connection.execute('UPDATE pages SET page_number = ? WHERE id = ?', (page_number, page_id))
+                return False
+            self._connection.execute(
+                'UPDATE pages SET page_number = ?, digest = ? WHERE id = ?',
+                (page_number, digest, page_id),
+            )
+            self._connection.execute('DELETE FROM texts WHERE rowid = ?', (page_id,))
+        else:
+            page_id = self._connection.execute(
+                'INSERT INTO pages (book_path, filename, page_number, digest) VALUES (?, ?, ?, ?)',
+                (book_path, filename, page_number, digest),
+            ).lastrowid
+        self._connection.execute('INSERT INTO texts (rowid, text) VALUES (?, ?)', (page_id, text))
+        return True
+
+    ##############################################
+
+    def set_page(self, book_path, page, text):
+        """Index the text of the :class:`BookPage` *page* of the book *book_path*"""
+        with self._lock, self._connection:
+            self._set_page(str(book_path), page.filename, int(page), text)
+
+    ##############################################
+
+    def _remove_pages(self, page_ids):
+        self._connection.executemany('DELETE FROM texts WHERE rowid = ?', ((page_id,) for page_id in page_ids))
+        self._connection.executemany('DELETE FROM pages WHERE id = ?', ((page_id,) for page_id in page_ids))
+
+    ##############################################
+
+    def update_book(self, book, language=None, engine_version=None):
+
+        """Index the texts stored in the sidecar of *book*, the pages which don't exist anymore are
+        removed.  Return the number of indexed pages.
+
+        """
+
+        book_path = str(book.path)
+        texts = book.texts(language, engine_version)
+        pages = {page.filename:page for page in book if not page.is_empty}
+        counter = 0
+        with self._lock, self._connection:
+            cursor = self._connection.execute('SELECT id, filename FROM pages WHERE book_path = ?', (book_path,))
+            stale_ids = [page_id for page_id, filename in cursor if filename not in texts]
+            self._remove_pages(stale_ids)
+            for filename, text in texts.items():
+                page = pages[filename]
+                if self._set_page(book_path, filename, int(page), text):
+                    counter += 1
+        self._logger.info('Indexed {} pages of {}, removed {}'.format(counter, book_path, len(stale_ids)))
+        return counter
+
+    ##############################################
+
+    def book_paths(self):
+        with self._lock:
+            return [book_path for book_path, in self._connection.execute('SELECT DISTINCT book_path FROM pages')]
+
+    def rename(self, book_path, old_filename, new_filename):
+        try:
+            title, page_number, file_index, orientation, extension = parse_filename(new_filename)
+            page_number = page_number if page_number is not None else file_index
+        except ValueError:
+            page_number = None
+        book_path = str(book_path)
+        with self._lock, self._connection:
+            # a stale entry could use the new name
+            self._remove_pages([
+                page_id for page_id, in self._connection.execute(
+                    'SELECT id FROM pages WHERE book_path = ? AND filename = ?', (book_path, new_filename))
+            ])
+            self._connection.execute(
+                'UPDATE pages SET filename = ?, page_number = ? WHERE book_path = ? AND filename = ?',
+                (new_filename, page_number, book_path, old_filename),
+            )
+
+    ##############################################
+
+    def remove(self, book_path, filenames):
+        """Remove the pages which don't exist any more"""
+        book_path = str(book_path)
+        with self._lock, self._connection:
+            page_ids = []
+            for filename in filenames:
+                cursor = self._connection.execute(
+                    'SELECT id FROM pages WHERE book_path = ? AND filename = ?', (book_path, filename))
+                page_ids.extend(page_id for page_id, in cursor)
+            self._remove_pages(page_ids)
+
+    ##############################################
+
+    def remove_books(self, book_paths):
+        with self._lock, self._connection:
+            for book_path in book_paths:
+                cursor = self._connection.execute('SELECT id FROM pages WHERE book_path = ?', (str(book_path),))
+                self._remove_pages([page_id for page_id, in cursor])
+
+    ##############################################
+
+    def search(self, query, limit=50):
+
+        """Return a list of :class:`TextSearchHit` for the pages matching the FTS5 *query*, the best
+        matches first.
+
+        """
+
+        try:
+            with self._lock:
+                # the ranked query is done first, then only the hits are joined
+                rows = self._connection.execute(
+                    'SELECT pages.book_path, pages.filename, pages.page_number, hits.rank, hits.snippet'
+                    ' FROM ('
+                    "  SELECT rowid, rank, snippet(texts, 0, '[', ']', '...', 12) AS snippet"
+                    '  FROM texts WHERE texts MATCH ? ORDER BY rank LIMIT ?'
+                    ' ) AS hits JOIN pages ON pages.id = hits.rowid'
+                    ' ORDER BY hits.rank',
+                    (query, limit),
+                ).fetchall()
+        except sqlite3.OperationalError as exception:
+            raise ValueError('Invalid query {}: {}'.format(query, exception))
+        return [TextSearchHit(*row) for row in rows]
+
+    ##############################################
+
+    @classmethod
+    def _for_book(cls, path, callback):
+        book_path = Path(path).resolve().parent
+        for library_path in book_path.parents:
+            index = cls._instances.get(str(library_path), None)
+            if index is not None:
+                callback(index, book_path)
+                return
+            elif cls.make_sqlite_path(library_path).exists():
+                with cls(library_path) as index:
+                    callback(index, book_path)
+                return
+
+    @classmethod
+    def _on_rename(cls, old_path, new_path):
+        old_path = Path(old_path)
+        new_path = Path(new_path)
+        if old_path.parent == new_path.parent:
+            cls._for_book(old_path, lambda index, book_path: index.rename(book_path, old_path.name, new_path.name))
+        else:
+            cls._on_delete(old_path)
+
+    @classmethod
+    def _on_delete(cls, path):
+        path = Path(path)
+        cls._for_book(path, lambda index, book_path: index.remove(book_path, (path.name,)))
+
+####################################################################################################
+
+file_watcher.add_rename_listener(BookTextIndex._on_rename)
+file_watcher.add_delete_listener(BookTextIndex._on_delete)
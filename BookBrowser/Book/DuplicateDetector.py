@@ -0,0 +1,267 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to find the pages of a book which were scanned twice.
+
+A page is summarised by a signature made of a 64-bit difference hash (dHash) of the grey image and
+a coarse histogram of the dual grey image.  The pages are decoded at a reduced scale in a process
+pool, then the signatures of the batch are computed with Numpy.  They are stored in the
+:class:`BookSidecar` of the book, thus only the pages which changed are decoded again.
+
+The near-duplicates are found by bucketing the hashes: a hash is cut in 8 bands of 8 bits, two
+hashes which differ by less than 8 bits have at least one band in common.  Only the pages sharing a
+bucket are compared.
+
+"""
+
+####################################################################################################
+
+__all__ = ['DuplicateDetector', 'DuplicatePair']
+
+####################################################################################################
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+
+from PIL import Image
+import numpy as np
+
+from .BookPage import BookPage, draft_image, dual_histogram
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+HASH_SIZE = 8
+HISTOGRAM_BINS = 32
+NUMBER_OF_BANDS = 8
+# a band shared by more pages is not discriminating, e.g. the blank pages, and would give too many pairs
+MAX_BUCKET_SIZE = 32
+
+####################################################################################################
+
+def page_fingerprint(path, scale=BookPage.HISTOGRAM_SCALE):
+
+    """Decode the image *path* reduced by *scale* and return the grey image used by the hash and the
+    dual histogram of the grey image.  This function can be run in a worker process.
+
+    """
+
+    with Image.open(str(path)) as image:
+        width, height = image.size
+        draft_image(image, scale)
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        size = (max(1, width // scale), max(1, height // scale))
+        if image.size != size:
+            image = image.resize(size, Image.BOX)
+        image = image.convert('L')
+    thumbnail = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX)
+    return np.asarray(thumbnail), dual_histogram(np.asarray(image))
+
+####################################################################################################
+
+def signatures(thumbnails, histograms):
+
+    """Return the hashes as an array of uint64 and the normalised histograms of *HISTOGRAM_BINS* bins
+    for a batch of fingerprints.
+
+    """
+
+    thumbnails = np.asarray(thumbnails, dtype=np.int16).reshape(-1, HASH_SIZE, HASH_SIZE + 1)
+    # a bit is set when the intensity increases from left to right
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    hashes = np.packbits(bits.reshape(len(bits), -1), axis=1).view('>u8').ravel().astype(np.uint64)
+
+    histograms = np.asarray(histograms, dtype=np.float64).reshape(len(hashes), HISTOGRAM_BINS, -1).sum(axis=2)
+    totals = histograms.sum(axis=1, keepdims=True)
+    histograms = (histograms / np.maximum(totals, 1)).astype(np.float32)
+
+    return hashes, histograms
+
+####################################################################################################
+
+def hash_distance(hashes1, hashes2):
+    """Return the Hamming distances between two arrays of uint64 hashes"""
+    xor = np.bitwise_xor(np.asarray(hashes1, dtype=np.uint64), np.asarray(hashes2, dtype=np.uint64))
+    return np.unpackbits(xor.reshape(-1, 1).view(np.uint8), axis=1).sum(axis=1)
+
+def histogram_distance(histograms1, histograms2):
+    """Return the total variation distances, in [0, 1], between two arrays of normalised histograms"""
+    return .5 * np.abs(np.asarray(histograms1) - np.asarray(histograms2)).sum(axis=-1)
+
+####################################################################################################
+
+def candidate_pairs(hashes, max_bucket_size=MAX_BUCKET_SIZE):
+
+    """Return the pairs of indexes (i, j), with i < j, of the hashes which have a band in common, as
+    two arrays.
+
+    A band value shared by more than *max_bucket_size* hashes is ignored, thus the number of pairs
+    is linear in the number of hashes.  These pairs are only found if they share another band.
+
+    """
+
+    number_of_hashes = len(hashes)
+    bands = np.asarray(hashes, dtype='>u8').reshape(-1, 1).view(np.uint8)
+    keys = []
+    number_of_skipped_buckets = 0
+    for band in bands.T:
+        order = np.argsort(band, kind='stable')
+        sorted_band = band[order]
+        starts = np.flatnonzero(np.r_[True, sorted_band[1:] != sorted_band[:-1]])
+        ends = np.r_[starts[1:], number_of_hashes]
+        for start, end in zip(starts, ends):
+            if end - start > max_bucket_size:
+                number_of_skipped_buckets += 1
+            elif end - start > 1:
+                bucket = np.sort(order[start:end])
+                i, j = np.triu_indices(len(bucket), k=1)
+                keys.append(bucket[i] * number_of_hashes + bucket[j])
+    if number_of_skipped_buckets:
+        _module_logger.info('Skipped {} band buckets larger than {}'.format(number_of_skipped_buckets, max_bucket_size))
+    if not keys:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    # a pair can share several bands
+    keys = np.unique(np.concatenate(keys))
+    return keys // number_of_hashes, keys % number_of_hashes
+
+####################################################################################################
+
+class DuplicatePair(namedtuple('DuplicatePair', ('page1', 'page2', 'hash_distance', 'histogram_distance'))):
+
+    __slots__ = ()
+
+    ##############################################
+
+    def __str__(self):
+        return '{0.page1.filename} {0.page2.filename} hash {0.hash_distance} histogram {0.histogram_distance:.3f}'.format(self)
+
+####################################################################################################
+
+class DuplicateDetector:
+
+    """Class to find the pages of a :class:`Book` which look the same.
+
+    Two pages are duplicates if their hashes differ by at most *max_hash_distance* bits and the
+    distance of their histograms is lower than *max_histogram_distance*.  The hash distance must be
+    lower than the number of bands, else pairs could be missed.
+
+    The signatures are computed by a process pool using the *mp_context* multiprocessing context, the
+    default fork context must not be used from a process which runs threads like a Qt application.
+
+    """
+
+    MAX_HASH_DISTANCE = 6
+    MAX_HISTOGRAM_DISTANCE = .05
+
+    _logger = _module_logger.getChild('DuplicateDetector')
+
+    ##############################################
+
+    def __init__(self, book, number_of_workers=None, max_hash_distance=None, max_histogram_distance=None,
+                 mp_context=None):
+
+        self._book = book
+        self._number_of_workers = number_of_workers or os.cpu_count()
+        self._mp_context = mp_context
+        if max_hash_distance is None:
+            max_hash_distance = self.MAX_HASH_DISTANCE
+        if max_histogram_distance is None:
+            max_histogram_distance = self.MAX_HISTOGRAM_DISTANCE
+        if max_hash_distance >= NUMBER_OF_BANDS:
+            raise ValueError('Hash distance must be lower than {}'.format(NUMBER_OF_BANDS))
+        self._max_hash_distance = max_hash_distance
+        self._max_histogram_distance = max_histogram_distance
+
+    ##############################################
+
+    def update(self, progress_callback=None):
+
+        """Update the page signatures stored in the book sidecar and return the pages with their
+        hashes and histograms.
+
+        *progress_callback* is called with the number of processed pages and the number of pages to
+        be processed.
+
+        """
+
+        pages = [page for page in self._book if not page.is_empty]
+        sidecar = self._book.sidecar
+        # a signature is stored as a big endian hash and a float32 histogram
+        stored_hashes = sidecar.values(pages, 'hash')
+        stored_histograms = sidecar.values(pages, 'histogram')
+        stored_signatures = {
+            filename:(int.from_bytes(hash_, 'big'), np.frombuffer(stored_histograms[filename], dtype=np.float32))
+            for filename, hash_ in stored_hashes.items()
+            if filename in stored_histograms
+        }
+        outdated_pages = [page for page in pages if page.filename not in stored_signatures]
+
+        if outdated_pages:
+            self._logger.info('Compute the signature of {}/{} pages using {} processes'.format(
+                len(outdated_pages), len(pages), self._number_of_workers))
+            thumbnails = []
+            histograms = []
+            with ProcessPoolExecutor(max_workers=self._number_of_workers, mp_context=self._mp_context) as executor:
+                futures = [executor.submit(page_fingerprint, str(page.path)) for page in outdated_pages]
+                for future in futures:
+                    thumbnail, histogram = future.result()
+                    thumbnails.append(thumbnail)
+                    histograms.append(histogram)
+                    if progress_callback is not None:
+                        progress_callback(len(thumbnails), len(outdated_pages))
+            hashes, histograms = signatures(thumbnails, histograms)
+            sidecar.set_many('hash', [(page, int(hash_).to_bytes(8, 'big')) for page, hash_ in zip(outdated_pages, hashes)])
+            sidecar.set_many('histogram', [(page, histogram.tobytes()) for page, histogram in zip(outdated_pages, histograms)])
+            for page, hash_, histogram in zip(outdated_pages, hashes, histograms):
+                stored_signatures[page.filename] = (hash_, histogram)
+
+        hashes = np.array([stored_signatures[page.filename][0] for page in pages], dtype=np.uint64)
+        histograms = np.array([stored_signatures[page.filename][1] for page in pages], dtype=np.float32)
+        return pages, hashes, histograms
+
+    ##############################################
+
+    def find_duplicates(self, progress_callback=None):
+
+        """Return the list of :class:`DuplicatePair`, the most similar first"""
+
+        pages, hashes, histograms = self.update(progress_callback)
+        i, j = candidate_pairs(hashes)
+        hash_distances = hash_distance(hashes[i], hashes[j])
+        histogram_distances = histogram_distance(histograms[i], histograms[j])
+        selected = np.flatnonzero(
+            (hash_distances <= self._max_hash_distance) &
+            (histogram_distances <= self._max_histogram_distance)
+        )
+        self._logger.info('{} candidate pairs, {} duplicates'.format(len(i), len(selected)))
+
+        pairs = [
+            DuplicatePair(pages[i[k]], pages[j[k]], int(hash_distances[k]), float(histogram_distances[k]))
+            for k in selected
+        ]
+        pairs.sort(key=lambda pair: (pair.hash_distance, pair.histogram_distance))
+        return pairs
@@ -0,0 +1,170 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a LRU cache of page images bounded by their memory size.
+
+"""
+
+####################################################################################################
+
+__all__ = ['ImageCache']
+
+####################################################################################################
+
+from collections import OrderedDict
+import logging
+import threading
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class ImageCache:
+
+    """Class to implement a LRU cache of Numpy arrays bounded by the number of bytes.
+
+    The least recently used arrays are evicted when the budget is exceeded.  The cache can be
+    accessed from several threads.
+
+    """
+
+    # About 5 pages of a 600 dpi A4 colour scan and their dual image, a page requires 200 MB
+    MEMORY_BUDGET = 1024**3
+
+    _logger = _module_logger.getChild('ImageCache')
+
+    ##############################################
+
+    def __init__(self, memory_budget=None):
+
+        self._memory_budget = memory_budget or self.MEMORY_BUDGET
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._memory_size = 0
+        self.reset_statistics()
+
+    ##############################################
+
+    def reset_statistics(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    ##############################################
+
+    @property
+    def memory_budget(self):
+        return self._memory_budget
+
+    @property
+    def memory_size(self):
+        return self._memory_size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._images
+
+    ##############################################
+
+    def __str__(self):
+        template = 'Image cache: {} images {:.1f}/{:.1f} MB, {} hits, {} misses, {} evictions'
+        return template.format(
+            len(self),
+            self._memory_size / 1024**2,
+            self._memory_budget / 1024**2,
+            self._hits,
+            self._misses,
+            self._evictions,
+        )
+
+    ##############################################
+
+    def get(self, key, loader=None):
+
+        """Return the array for *key*.  On a miss, the array is made by calling *loader* and it is
+        inserted, if *loader* is None then None is returned.
+
+        """
+
+        with self._lock:
+            image = self._images.get(key, None)
+            if image is not None:
+                self._images.move_to_end(key)
+                self._hits += 1
+                return image
+            self._misses += 1
+
+        if loader is None:
+            return None
+        # the loader is called without the lock, thus two threads can load the same image
+        image = loader()
+        self.put(key, image)
+        return image
+
+    ##############################################
+
+    def put(self, key, image):
+
+        size = image.nbytes
+        with self._lock:
+            old_image = self._images.pop(key, None)
+            if old_image is not None:
+                self._memory_size -= old_image.nbytes
+            if size > self._memory_budget:
+                self._logger.warning('Image {} is larger than the cache budget'.format(key))
+                return
+            self._images[key] = image
+            self._memory_size += size
+            while self._memory_size > self._memory_budget:
+                _, old_image = self._images.popitem(last=False)
+                self._memory_size -= old_image.nbytes
+                self._evictions += 1
+
+    ##############################################
+
+    def discard(self, key):
+        with self._lock:
+            image = self._images.pop(key, None)
+            if image is not None:
+                self._memory_size -= image.nbytes
+
+    ##############################################
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._memory_size = 0
@@ -0,0 +1,120 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to guess the orientation of the pages of a book using a process pool.
+
+Decoding a scan is CPU bound, thus the pages are analysed in worker processes.  A worker only
+receives a path and returns a number, the page objects stay in the main process.  The results can
+be stored in the :class:`BookSidecar` of the book, thus the pages which didn't change are skipped by
+a rerun.
+
+"""
+
+####################################################################################################
+
+__all__ = ['OrientationDetector']
+
+####################################################################################################
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+
+from .BookPage import BookPage, orientation_delta_ratio
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class OrientationDetector:
+
+    """Class to guess the orientation of a batch of pages.
+
+    The parameters are the ones of :meth:`BookPage.guess_orientation`.
+
+    """
+
+    # number of results stored at once in the sidecar
+    STORE_BATCH_SIZE = 20
+
+    _logger = _module_logger.getChild('OrientationDetector')
+
+    ##############################################
+
+    def __init__(self, number_of_workers=None, height=100, c_inf=0, c_sup=400):
+
+        self._number_of_workers = number_of_workers or os.cpu_count()
+        self._parameters = (height, c_inf, c_sup, BookPage.ORIENTATION_SCALE)
+        self._result_name = 'orientation_delta/{}/{}/{}'.format(height, c_inf, c_sup)
+
+    ##############################################
+
+    def delta_ratios(self, pages, progress_callback=None, sidecar=None):
+
+        """Return the top versus bottom ink ratio of *pages* in the same order.
+
+        *progress_callback* is called with the number of processed pages and the total number of
+        pages.  If a :class:`BookSidecar` is given, the stored results are reused and the new ones
+        are stored.
+
+        """
+
+        pages = list(pages)
+        number_of_pages = len(pages)
+        stored_ratios = sidecar.values(pages, self._result_name) if sidecar is not None else {}
+        new_pages = [page for page in pages if page.filename not in stored_ratios]
+        self._logger.info('Guess orientation of {}/{} pages using {} processes'.format(
+            len(new_pages), number_of_pages, self._number_of_workers))
+
+        delta_ratios = {}
+        if new_pages:
+            batch = []
+            with ProcessPoolExecutor(max_workers=self._number_of_workers) as executor:
+                futures = {
+                    executor.submit(orientation_delta_ratio, str(page.path), *self._parameters):page
+                    for page in new_pages
+                }
+                try:
+                    for future in as_completed(futures):
+                        page = futures[future]
+                        delta_ratio = future.result()
+                        self._logger.info('{} top vs bottom {:.2f}'.format(page.filename, delta_ratio))
+                        delta_ratios[page.filename] = delta_ratio
+                        batch.append((page, delta_ratio))
+                        # the results are stored as they come, thus an interrupted run is resumed
+                        if sidecar is not None and len(batch) >= self.STORE_BATCH_SIZE:
+                            sidecar.set_many(self._result_name, batch)
+                            batch = []
+                        if progress_callback is not None:
+                            progress_callback(number_of_pages - len(new_pages) + len(delta_ratios), number_of_pages)
+                finally:
+                    if sidecar is not None and batch:
+                        sidecar.set_many(self._result_name, batch)
+
+        delta_ratios.update(stored_ratios)
+        return [delta_ratios[page.filename] for page in pages]
+
+    ##############################################
+
+    def guess(self, pages, progress_callback=None, sidecar=None):
+        """Return a list of booleans which are set if the page is a recto"""
+        return [delta_ratio > 0 for delta_ratio in self.delta_ratios(pages, progress_callback, sidecar)]
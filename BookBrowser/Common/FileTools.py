@@ -45,13 +45,30 @@ class FileWatcher(metaclass=SingletonMetaClass):
         self._rename_queue = []
         self._delete_queue = []
 
+        self._rename_listeners = []
+        self._delete_listeners = []
+
+    ##############################################
+
+    def add_rename_listener(self, callback):
+        """Register a callback called with the old and new path after a rename"""
+        self._rename_listeners.append(callback)
+
+    def add_delete_listener(self, callback):
+        """Register a callback called with the path after a deletion"""
+        self._delete_listeners.append(callback)
+
     ##############################################
 
     def _push_rename(self, old, new):
         self._rename_queue.append((old, new))
+        for callback in self._rename_listeners:
+            callback(old, new)
 
     def _push_delete(self, path):
         self._delete_queue.append(path)
+        for callback in self._delete_listeners:
+            callback(path)
 
     ##############################################
 
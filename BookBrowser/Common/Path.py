@@ -20,10 +20,20 @@
 
 ####################################################################################################
 
+from pathlib import Path
 import os
 
 ####################################################################################################
 
+def user_cache_path(*parts):
+    # $XDG_CACHE_HOME defaults to ~/.cache, a relative path is ignored according to the specification
+    cache_home = os.environ.get('XDG_CACHE_HOME', '')
+    if not os.path.isabs(cache_home):
+        cache_home = Path.home().joinpath('.cache')
+    return Path(cache_home).joinpath(*parts)
+
+####################################################################################################
+
 def to_absolute_path(path):
     # Expand ~ . and Remove trailing '/'
     return os.path.abspath(os.path.expanduser(path))
@@ -42,9 +42,9 @@ class OtsuThresholdingFilter(ImageFilter):
 
     """Filter to apply an Otsu thresholding"""
 
-    __filter_name__ = 'Gaussian Blur Filter'
+    __filter_name__ = 'Otsu Thresholding Filter'
     __input_names__ = ('input',)
-    __output_names__ = ('blur_image',)
+    __output_names__ = ('threshold_image',)
 
     ##############################################
 
@@ -281,16 +281,15 @@ class ImageFilter(TimeStampMixin):
         self._inputs = dict()
 
         number_of_outputs = len(self.__output_names__)
-        number_of_classes = len(self.__output_classes__)
-        if number_of_classes == 1:
+        if isinstance(self.__output_classes__, type):
             output_classes = [self.__output_classes__]*number_of_outputs
-        elif number_of_classes == number_of_outputs:
+        elif len(self.__output_classes__) == number_of_outputs:
             output_classes = self.__output_classes__
         else:
             raise ValueError('Inconsistent number of output classes')
         self._outputs = {
-            name:ImageFilterOutput(self, name, output_classes)
-            for name, output_cls in zip(self.__output_names__, self.__output_classes__)
+            name:ImageFilterOutput(self, name, output_cls)
+            for name, output_cls in zip(self.__output_names__, output_classes)
         }
 
         self.modified()
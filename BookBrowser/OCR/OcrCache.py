@@ -0,0 +1,322 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a persistent cache of the OCR texts shared by all the books.
+
+The cache is a SQLite database stored in the user cache directory.  A text is keyed by the digest
+of the image file, the language, the orientation of the page and the version of the OCR engine,
+thus it survives a copy or a move of the book and a new engine version invalidates it.  The digests
+are recorded by path, mtime and size, thus a file is only read to compute its digest once.
+
+When the size of the texts exceeds a budget, the least recently used texts are removed.
+
+"""
+
+####################################################################################################
+
+__all__ = ['OcrCache']
+
+####################################################################################################
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+from BookBrowser.Common.Path import user_cache_path
+from BookBrowser.Common.Singleton import SingletonMetaClass
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class OcrCache(metaclass=SingletonMetaClass):
+
+    """Class to store the OCR texts of the pages in the user cache directory.
+
+    The cache can be accessed from several threads.
+
+    When the size of the texts exceeds *size_budget* after an insertion, the least recently used
+    texts are removed until the size is lower than *EVICTION_RATIO* of the budget.
+
+    """
+
+    SQLITE_FILENAME = 'ocr-cache.sqlite'
+
+    # Bump this number to drop a cache written by a previous version
+    SCHEMA_VERSION = 3
+
+    # a page of text requires a few kB
+    SIZE_BUDGET = 100 * 1024**2
+    # evict more than the excess, thus the eviction query doesn't run at each insertion
+    EVICTION_RATIO = .9
+
+    _logger = _module_logger.getChild('OcrCache')
+
+    ##############################################
+
+    @classmethod
+    def make_sqlite_path(cls):
+        return user_cache_path('book-browser', cls.SQLITE_FILENAME)
+
+    ##############################################
+
+    def __init__(self, size_budget=None):
+
+        # the cache is a singleton, thus the path cannot be passed to the constructor
+        self._path = self.make_sqlite_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._size_budget = size_budget or self.SIZE_BUDGET
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._path), check_same_thread=False)
+        self._create_schema()
+        self._text_size = self._connection.execute('SELECT total(size) FROM texts').fetchone()[0]
+        self.reset_statistics()
+
+    ##############################################
+
+    def reset_statistics(self):
+        self._hits = 0
+        self._misses = 0
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def size_budget(self):
+        return self._size_budget
+
+    @property
+    def text_size(self):
+        return int(self._text_size)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def hit_rate(self):
+        number_of_lookups = self._hits + self._misses
+        return self._hits / number_of_lookups if number_of_lookups else 0
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT count(*) FROM texts').fetchone()[0]
+
+    @property
+    def file_size(self):
+        try:
+            return self._path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    ##############################################
+
+    def __str__(self):
+        template = 'OCR cache: {} texts {:.1f} MB, {} hits, {} misses, {:.0%} hit rate'
+        return template.format(
+            len(self),
+            self.file_size / 1024**2,
+            self._hits,
+            self._misses,
+            self.hit_rate,
+        )
+
+    ##############################################
+
+    def log_statistics(self):
+        # the message is only formatted if it is logged, it requires a query
+        self._logger.info('%s', self)
+
+    ##############################################
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    ##############################################
+
+    def _create_schema(self):
+
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._logger.info('Create OCR cache {}'.format(self._path))
+            with self._connection:
+                self._connection.execute('DROP TABLE IF EXISTS files')
+                self._connection.execute('DROP TABLE IF EXISTS texts')
+                self._connection.execute(
+                    'CREATE TABLE files ('
+                    ' path TEXT PRIMARY KEY,'
+                    ' mtime INTEGER NOT NULL,'
+                    ' size INTEGER NOT NULL,'
+                    ' digest TEXT NOT NULL'
+                    ')'
+                )
+                self._connection.execute(
+                    'CREATE TABLE texts ('
+                    ' digest TEXT NOT NULL,'
+                    ' language TEXT NOT NULL,'
+                    ' orientation TEXT NOT NULL,'
+                    ' engine_version TEXT NOT NULL,'
+                    ' text TEXT NOT NULL,'
+                    ' size INTEGER NOT NULL,'
+                    ' last_access REAL NOT NULL,'
+                    ' PRIMARY KEY (digest, language, orientation, engine_version)'
+                    ')'
+                )
+                self._connection.execute('CREATE INDEX texts_last_access ON texts (last_access)')
+                # PRAGMA doesn't support parameter binding
+                self._connection.execute('PRAGMA user_version = {:d}'.format(self.SCHEMA_VERSION))
+
+    ##############################################
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(str(path), 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1024**2), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    ##############################################
+
+    def _digest(self, page, hash_content):
+
+        """Return the digest of the file of the :class:`BookPage` *page*.  If the digest is not known
+        and *hash_content* is not set, return None.
+
+        """
+
+        path = str(page.path)
+        identity = (int(page.mtime_ns), int(page.file_size))
+        with self._lock:
+            row = self._connection.execute('SELECT mtime, size, digest FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[:2] == identity:
+            return row[2]
+        if not hash_content:
+            return None
+
+        digest = self.hash_file(path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files (path, mtime, size, digest) VALUES (?, ?, ?, ?)',
+                (path,) + identity + (digest,),
+            )
+        return digest
+
+    @staticmethod
+    def _text_key(digest, page, language, engine_version):
+        return (digest, str(language), str(page.orientation), str(engine_version))
+
+    ##############################################
+
+    def get(self, page, language, engine_version, hash_content=True):
+
+        """Return the text of the :class:`BookPage` *page* or None.
+
+        If *hash_content* is not set, a file which was not hashed before is not read and the lookup
+        misses.
+
+        """
+
+        digest = self._digest(page, hash_content)
+        if digest is None:
+            # not a lookup, thus the statistics are not updated
+            return None
+
+        key = self._text_key(digest, page, language, engine_version)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT text FROM texts'
+                ' WHERE digest = ? AND language = ? AND orientation = ? AND engine_version = ?',
+                key,
+            ).fetchone()
+            if row is not None:
+                text = row[0]
+                self._hits += 1
+                with self._connection:
+                    self._connection.execute(
+                        'UPDATE texts SET last_access = ?'
+                        ' WHERE digest = ? AND language = ? AND orientation = ? AND engine_version = ?',
+                        (time.time(),) + key,
+                    )
+            else:
+                text = None
+                self._misses += 1
+        self._logger.debug('%s %s', 'Hit' if text is not None else 'Miss', page.filename)
+        return text
+
+    ##############################################
+
+    def set(self, page, language, engine_version, text):
+
+        digest = self._digest(page, hash_content=True)
+        key = self._text_key(digest, page, language, engine_version)
+        size = len(text.encode('utf-8'))
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT size FROM texts'
+                ' WHERE digest = ? AND language = ? AND orientation = ? AND engine_version = ?',
+                key,
+            ).fetchone()
+            if row is not None:
+                self._text_size -= row[0]
+            self._connection.execute(
+                'INSERT OR REPLACE INTO texts (digest, language, orientation, engine_version, text, size, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                key + (text, size, time.time()),
+            )
+            self._text_size += size
+            if self._text_size > self._size_budget:
+                self._evict()
+
+    ##############################################
+
+    def _evict(self):
+
+        """Remove the least recently used texts, the lock must be held by the caller"""
+
+        size_to_free = self._text_size - self.EVICTION_RATIO * self._size_budget
+        freed_size = 0
+        rowids = []
+        cursor = self._connection.execute('SELECT rowid, size FROM texts ORDER BY last_access')
+        for rowid, size in cursor:
+            if freed_size >= size_to_free:
+                break
+            rowids.append((rowid,))
+            freed_size += size
+        cursor.close()
+        self._connection.executemany('DELETE FROM texts WHERE rowid = ?', rowids)
+        # the digests of the files without text are not required anymore
+        self._connection.execute('DELETE FROM files WHERE digest NOT IN (SELECT digest FROM texts)')
+        self._text_size -= freed_size
+        self._logger.info('Evicted {} OCR texts'.format(len(rowids)))
@@ -0,0 +1,182 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to OCR a whole book or library using a thread pool.
+
+Tesseract releases the GIL while it recognises a page, thus the pages are processed by threads
+sharing the pool of Tesseract APIs of the :class:`OcrEngine`.  The text of a page is stored in the
+:class:`BookSidecar` of its book as soon as it is recognised, thus an interrupted run resumes at the
+pages which don't have a text.
+
+"""
+
+####################################################################################################
+
+__all__ = ['OcrService']
+
+####################################################################################################
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import os
+import threading
+
+from BookBrowser.Book import Book, BookLibrary
+from .OcrCache import OcrCache
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class OcrService:
+
+    """Class to OCR all the pages of a book or a library.
+
+    *language* is the language of the pages, if it is None the language of the book metadata is
+    used.
+
+    The OCR can be cancelled from another thread using :meth:`cancel`.
+
+    """
+
+    _logger = _module_logger.getChild('OcrService')
+
+    ##############################################
+
+    def __init__(self, number_of_workers=None, language=None):
+
+        self._number_of_workers = number_of_workers or os.cpu_count()
+        self._language = language
+        self._cancel_event = threading.Event()
+
+    ##############################################
+
+    @property
+    def number_of_workers(self):
+        return self._number_of_workers
+
+    ##############################################
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    ##############################################
+
+    @classmethod
+    def iter_books(cls, source):
+
+        """Yield the books of *source* which can be a :class:`Book` or a :class:`BookLibrary`"""
+
+        if isinstance(source, BookLibrary):
+            if not len(source):
+                source.scan()
+            for book_cover in source:
+                yield Book(book_cover.path)
+        else:
+            yield source
+
+    ##############################################
+
+    def book_language(self, book):
+        return self._language or book.metadata.language or None
+
+    ##############################################
+
+    def pending_pages(self, book):
+
+        """Return the pages of *book* which don't have a text in the sidecar"""
+
+        texts = book.texts(self.book_language(book))
+        return [page for page in book if not page.is_empty and page.filename not in texts]
+
+    ##############################################
+
+    def make_texts(self, source, progress_callback=None):
+
+        """OCR the pages of *source* which don't have a text, see :meth:`iter_books`.
+
+        *progress_callback* is called with the number of processed pages and the total number of
+        pages each time a page is processed.
+
+        Return the number of recognised pages.
+
+        """
+
+        self._cancel_event.clear()
+
+        # the books of a library are closed while they wait, thus only one book has open files
+        jobs = []
+        for book in self.iter_books(source):
+            filenames = set(page.filename for page in self.pending_pages(book))
+            if filenames:
+                jobs.append((book if book is source else book.path, filenames))
+            if book is not source:
+                book.close()
+        number_of_pages = sum(len(filenames) for _, filenames in jobs)
+        self._logger.info('OCR {} pages of {} books using {} threads'.format(
+            number_of_pages, len(jobs), self._number_of_workers))
+
+        counter = 0
+        number_of_processed_pages = 0
+        with ThreadPoolExecutor(max_workers=self._number_of_workers) as executor:
+            for book, filenames in jobs:
+                if self.is_cancelled:
+                    break
+                if book is not source:
+                    book = Book(book)
+                pages = [page for page in book if not page.is_empty and page.filename in filenames]
+                language = self.book_language(book)
+                # open the text index before the threads
+                book.text_index
+                futures = {executor.submit(page.to_text, language):page for page in pages}
+                try:
+                    for future in as_completed(futures):
+                        if self.is_cancelled:
+                            break
+                        try:
+                            if future.result() is not None:
+                                counter += 1
+                        except Exception as exception:
+                            self._logger.warning('Cannot OCR {}\n{}'.format(futures[future].path, exception))
+                        number_of_processed_pages += 1
+                        if progress_callback is not None:
+                            progress_callback(number_of_processed_pages, number_of_pages)
+                except KeyboardInterrupt:
+                    self.cancel()
+                if self.is_cancelled:
+                    self._logger.info('Cancel OCR')
+                    for future in futures:
+                        future.cancel()
+                # the texts of the running pages are stored before the sidecar is closed
+                for future in futures:
+                    if not future.cancelled():
+                        future.exception()
+                if book is not source:
+                    book.close()
+
+        self._logger.info('Recognised {} pages'.format(counter))
+        OcrCache().log_statistics()
+        return counter
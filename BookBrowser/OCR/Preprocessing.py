@@ -0,0 +1,162 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to prepare a page image for the OCR engine.
+
+Tesseract works best on a binary image of about 300 dpi, and its time grows with the number of
+pixels.  A colour scan at 600 dpi is thus converted to grey, downscaled, binarised using an Otsu
+threshold and cropped to the ink before it is recognised.  The pipeline is made of the
+:mod:`BookBrowser.ImageProcessing.Filter` image filters, which require OpenCV.
+
+"""
+
+####################################################################################################
+
+__all__ = ['OcrPreprocessor']
+
+####################################################################################################
+
+import logging
+
+import numpy as np
+
+from BookBrowser.ImageProcessing.CvTools.MorphoMath import ball_structuring_element
+from BookBrowser.ImageProcessing.Filter.Color import GrayFilter
+from BookBrowser.ImageProcessing.Filter.IO import InputImageFilter
+from BookBrowser.ImageProcessing.Filter.MorphoMath import CloseFilter
+from BookBrowser.ImageProcessing.Filter.Size import ResizeFilter
+from BookBrowser.ImageProcessing.Filter.Threshold import OtsuThresholdingFilter
+from BookBrowser.ImageProcessing.Image import Image, ImageFormat
+from BookBrowser.ImageProcessing.ImageFilter import ImageFilter
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class OcrPreprocessor:
+
+    """Class to prepare a page image for the OCR engine.
+
+    *target_dpi* is the resolution of the image given to the OCR engine, the image is only resized
+    if the resolution of the scan is known.  If *binarise* is set, an Otsu threshold is applied.
+    If *denoise_radius* is not null, the dark specks of the binary image are removed using a
+    closing.  If *crop_margins* is set, the image is cropped to the ink plus a margin of *margin*
+    pixels.
+
+    """
+
+    # ink is black on a white paper
+    INK_THRESHOLD = 128
+
+    _logger = _module_logger.getChild('OcrPreprocessor')
+
+    ##############################################
+
+    def __init__(self, target_dpi=300, binarise=True, denoise_radius=0, crop_margins=True, margin=20):
+
+        self._target_dpi = target_dpi
+        self._binarise = binarise
+        self._denoise_radius = denoise_radius
+        self._crop_margins = crop_margins
+        self._margin = margin
+
+    ##############################################
+
+    @property
+    def signature(self):
+        """String identifying the parameters, a text recognised with other parameters can differ"""
+        steps = ['gray']
+        if self._target_dpi:
+            steps.append('dpi{}'.format(self._target_dpi))
+        if self._binarise:
+            steps.append('otsu')
+        if self._denoise_radius:
+            steps.append('close{}'.format(self._denoise_radius))
+        if self._crop_margins:
+            steps.append('crop{}'.format(self._margin))
+        return '/'.join(steps)
+
+    ##############################################
+
+    def _make_filters(self, image, dpi):
+
+        filters = [InputImageFilter(image)]
+        if image.image_format.channels == ImageFormat.RGB:
+            filters.append(GrayFilter())
+        if self._target_dpi and dpi:
+            scale_factor = self._target_dpi / dpi
+            # don't resample for a few percents
+            if abs(scale_factor - 1) > .05:
+                filters.append(ResizeFilter(scale_factor))
+                dpi = self._target_dpi
+        if self._binarise:
+            filters.append(OtsuThresholdingFilter())
+            if self._denoise_radius:
+                filters.append(CloseFilter(ball_structuring_element(self._denoise_radius)))
+        return filters, dpi
+
+    ##############################################
+
+    def crop(self, image):
+
+        """Return a view of *image* cropped to the ink"""
+
+        ink = image < self.INK_THRESHOLD
+        rows = np.flatnonzero(ink.any(axis=1))
+        if not rows.size:
+            return image
+        columns = np.flatnonzero(ink.any(axis=0))
+        height, width = image.shape[:2]
+        margin = self._margin
+        return image[
+            max(rows[0] - margin, 0):min(rows[-1] + margin + 1, height),
+            max(columns[0] - margin, 0):min(columns[-1] + margin + 1, width),
+        ]
+
+    ##############################################
+
+    def process(self, image, dpi=None):
+
+        """Return the grey image to recognise and its resolution.
+
+        *image* is a Numpy array, *dpi* is the resolution of the scan if it is known.
+
+        """
+
+        if image.dtype == np.bool_:
+            image = image.astype(np.uint8) * 255
+        if image.ndim == 3:
+            # drop the alpha channel
+            image = Image(image[..., :3], channels=ImageFormat.RGB)
+        else:
+            image = Image(image, channels=ImageFormat.Gray)
+
+        filters, dpi = self._make_filters(image, dpi)
+        last_filter = ImageFilter.connect_filters(filters)
+        last_filter.update()
+        output = np.asarray(last_filter.output().image)
+
+        if self._crop_margins:
+            output = self.crop(output)
+        self._logger.info('{} {}x{} -> {}x{}'.format(
+            self.signature, image.shape[1], image.shape[0], output.shape[1], output.shape[0]))
+        return output, dpi
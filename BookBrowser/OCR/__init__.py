@@ -20,13 +20,16 @@
 
 __all__ = [
     'OcrEngine',
+    'TesseractApiPool',
 ]
 
 ####################################################################################################
 
+from contextlib import contextmanager
 from pathlib import Path
 import logging
 import os
+import threading
 
 import numpy as np
 from PIL import Image
@@ -35,6 +38,12 @@ import tesserocr
 
 from BookBrowser.Common.Singleton import SingletonMetaClass
 
+try:
+    # require OpenCV
+    from .Preprocessing import OcrPreprocessor
+except ImportError:
+    OcrPreprocessor = None
+
 ####################################################################################################
 
 _module_logger = logging.getLogger(__name__)
@@ -61,20 +70,160 @@ LANGUAGE_CODE = {
 
 ####################################################################################################
 
+class TesseractApiPool:
+
+    """Class to implement a pool of initialised Tesseract APIs.
+
+    Initialising a Tesseract API loads the traineddata of the language, thus an API is reused for
+    the next pages.  An API is not thread safe, thus a thread checks out an API for a page and
+    returns it to the pool.  The pool makes at most *max_size* APIs for a language and a data path,
+    a thread waits when all of them are checked out.
+
+    """
+
+    _logger = _module_logger.getChild('TesseractApiPool')
+
+    ##############################################
+
+    def __init__(self, max_size=None):
+
+        self._max_size = max_size or os.cpu_count()
+        self._condition = threading.Condition()
+        # (language, data path) -> list of idle APIs
+        self._idle_apis = {}
+        # (language, data path) -> number of APIs
+        self._number_of_apis = {}
+
+    ##############################################
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        with self._condition:
+            return sum(self._number_of_apis.values())
+
+    ##############################################
+
+    def _make_api(self, language, data_path):
+
+        self._logger.info('Initialise Tesseract API for {} {}'.format(language, data_path))
+        kwargs = {}
+        if language:
+            kwargs['lang'] = language
+        if data_path:
+            kwargs['path'] = data_path
+        return tesserocr.PyTessBaseAPI(**kwargs)
+
+    ##############################################
+
+    def checkout(self, language, data_path=None):
+
+        """Return an API for *language* and *data_path*, it must be returned using :meth:`checkin`"""
+
+        key = (language, data_path)
+        with self._condition:
+            while True:
+                idle_apis = self._idle_apis.setdefault(key, [])
+                if idle_apis:
+                    return idle_apis.pop()
+                if self._number_of_apis.get(key, 0) < self._max_size:
+                    # reserve the slot, the API is made without the lock
+                    self._number_of_apis[key] = self._number_of_apis.get(key, 0) + 1
+                    break
+                self._condition.wait()
+
+        try:
+            return self._make_api(language, data_path)
+        except:
+            with self._condition:
+                self._number_of_apis[key] -= 1
+                self._condition.notify()
+            raise
+
+    ##############################################
+
+    def checkin(self, api, language, data_path=None):
+        api.Clear()
+        with self._condition:
+            self._idle_apis.setdefault((language, data_path), []).append(api)
+            self._condition.notify()
+
+    ##############################################
+
+    @contextmanager
+    def api(self, language, data_path=None):
+        api = self.checkout(language, data_path)
+        try:
+            yield api
+        finally:
+            self.checkin(api, language, data_path)
+
+    ##############################################
+
+    def close(self):
+
+        """End the idle APIs"""
+
+        with self._condition:
+            for key, idle_apis in self._idle_apis.items():
+                for api in idle_apis:
+                    api.End()
+                self._number_of_apis[key] -= len(idle_apis)
+                idle_apis.clear()
+
+####################################################################################################
+
 class OcrEngine(metaclass=SingletonMetaClass):
 
     _logger = _module_logger.getChild('OcrEngine')
 
     ##############################################
 
-    def __init__(self, data_path=TESSERACT_DATA_PATH):
+    # the preprocessing is opt-in until it is benchmarked on real books
+    def __init__(self, data_path=TESSERACT_DATA_PATH, number_of_apis=None, preprocess=False):
 
         self._path = Path(data_path) if data_path else None
         self._logger.info('TESSERACT Data _path {}'.format(self._path))
+        self._api_pool = TesseractApiPool(number_of_apis)
+        if preprocess and OcrPreprocessor is None:
+            self._logger.warning('OpenCV is not available, the pages are not preprocessed')
+        self._preprocessor = OcrPreprocessor() if preprocess and OcrPreprocessor is not None else None
 
     ##############################################
 
-    def image_to_text(self, image, language, fake=False):
+    @property
+    def api_pool(self):
+        return self._api_pool
+
+    @property
+    def preprocessor(self):
+        return self._preprocessor
+
+    @preprocessor.setter
+    def preprocessor(self, value):
+        """Set the :class:`OcrPreprocessor` instance, None to disable the preprocessing"""
+        self._preprocessor = value
+
+    ##############################################
+
+    @property
+    def version(self):
+        """Version of the OCR engine and of the preprocessing, a new version can recognise another text"""
+        version = 'tesseract {}'.format(tesserocr.tesseract_version().splitlines()[0])
+        if self._preprocessor is not None:
+            version += ' ' + self._preprocessor.signature
+        return version
+
+    ##############################################
+
+    def image_to_text(self, image, language, fake=False, dpi=None):
+
+        """Return the text of *image*, a Numpy array or a PIL image.  *dpi* is the resolution of the
+        scan if it is known.
+
+        """
 
         self._logger.info('Run OCR engine...')
 
@@ -82,20 +231,29 @@ class OcrEngine(metaclass=SingletonMetaClass):
             import BookBrowser.Common.LoremIpsum as Lorem
             return Lorem.lorem_ipsum_20
 
-        if isinstance(image, np.ndarray):
+        if self._preprocessor is not None:
+            if isinstance(image, Image.Image):
+                image = np.asarray(image)
+            elif not isinstance(image, np.ndarray):
+                raise ValueError
+            image, dpi = self._preprocessor.process(image, dpi)
             image = Image.fromarray(image)
-        elif not isinstance(image, Image):
-            raise ValueError
-        image = image.convert('L')
+        else:
+            if isinstance(image, np.ndarray):
+                image = Image.fromarray(image)
+            elif not isinstance(image, Image.Image):
+                raise ValueError
+            image = image.convert('L')
 
-        kwargs = {}
-        if language:
-            kwargs['lang'] = LANGUAGE_CODE[language.lower()]
-        if self._path:
-            kwargs['path'] = str(self._path)
+        language = LANGUAGE_CODE[language.lower()] if language else None
+        data_path = str(self._path) if self._path else None
 
         try:
-            text = tesserocr.image_to_text(image, **kwargs)
+            with self._api_pool.api(language, data_path) as api:
+                api.SetImage(image)
+                if dpi:
+                    api.SetSourceResolution(int(dpi))
+                text = api.GetUTF8Text()
             self._logger.info('OCR done')
             return text
         except:
@@ -0,0 +1,162 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement the read-ahead of the pages shown by the page viewer.
+
+The pages following the current page in the reading direction, and the previous one, are decoded
+on the thread pool into a memory bounded cache of :class:`QImage`, where the page pyramid image
+provider looks first.
+
+"""
+
+####################################################################################################
+
+__all__ = ['QImageCache', 'PagePrefetcher']
+
+####################################################################################################
+
+from collections import OrderedDict
+import logging
+import threading
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class QImageCache:
+
+    """Class to implement a LRU cache of :class:`QImage` bounded by the memory size of the images.
+
+    It is accessed from the QML image loader threads and the thread pool.
+
+    """
+
+    # 256 MB is about 40 pages of a 600 dpi A4 scan displayed at 1/4 scale
+    MEMORY_BUDGET = 256 * 1024**2
+
+    _logger = _module_logger.getChild('QImageCache')
+
+    ##############################################
+
+    def __init__(self, memory_budget=None):
+
+        self._memory_budget = memory_budget or self.MEMORY_BUDGET
+        self._memory_size = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    ##############################################
+
+    @property
+    def memory_size(self):
+        return self._memory_size
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._images
+
+    ##############################################
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key, None)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    ##############################################
+
+    def put(self, key, image):
+
+        if image.isNull():
+            return
+        size = image.sizeInBytes()
+        if size > self._memory_budget:
+            return
+
+        with self._lock:
+            old_image = self._images.pop(key, None)
+            if old_image is not None:
+                self._memory_size -= old_image.sizeInBytes()
+            self._images[key] = image
+            self._memory_size += size
+            while self._memory_size > self._memory_budget:
+                _, old_image = self._images.popitem(last=False)
+                self._memory_size -= old_image.sizeInBytes()
+
+####################################################################################################
+
+class PagePrefetcher:
+
+    """Class to prefetch the pages around the page shown by the page viewer.
+
+    The reading direction is deduced from the last navigation, thus the prefetch follows a reader
+    going backward.
+
+    """
+
+    NUMBER_OF_PAGES_AHEAD = 3
+    NUMBER_OF_PAGES_BEHIND = 1
+
+    _logger = _module_logger.getChild('PagePrefetcher')
+
+    ##############################################
+
+    def __init__(self, qml_book):
+
+        self._qml_book = qml_book
+        self._page_number = None
+        self._direction = 1
+
+    ##############################################
+
+    @property
+    def direction(self):
+        return self._direction
+
+    ##############################################
+
+    def page_numbers_around(self, page_number):
+        """Return the page numbers to prefetch, the nearest first"""
+        direction = self._direction
+        page_numbers = [page_number + direction*i for i in range(1, self.NUMBER_OF_PAGES_AHEAD +1)]
+        page_numbers += [page_number - direction*i for i in range(1, self.NUMBER_OF_PAGES_BEHIND +1)]
+        return [x for x in page_numbers if self._qml_book.is_valid_page_number(x)]
+
+    ##############################################
+
+    def navigate(self, page_number):
+
+        if self._page_number is not None and page_number != self._page_number:
+            self._direction = 1 if page_number > self._page_number else -1
+        self._page_number = page_number
+
+        from .QmlApplication import Application
+        provider = Application.instance.page_pyramid_provider
+        for i, prefetched_page_number in enumerate(self.page_numbers_around(page_number)):
+            qml_page = self._qml_book.page(prefetched_page_number)
+            if qml_page is not None and not qml_page.is_empty:
+                # the nearest page is decoded first
+                provider.prefetch(qml_page.pyramid, priority=-i)
@@ -58,10 +58,11 @@ from BookBrowser.Common.Platform import QtPlatform
 from .ApplicationMetadata import ApplicationMetadata
 from .ApplicationSettings import ApplicationSettings, Shortcut
 from .KeySequenceEditor import KeySequenceEditor
-from .QmlBook import QmlBook, QmlBookPage, QmlBookMetadata
+from .QmlBook import BookThumbnailImageProvider, PagePyramidImageProvider, QmlBook, QmlBookPage, QmlBookPageModel, QmlBookMetadata
 from .QmlBookLibrary import QmlBookCover, QmlBookLibrary
 from .QmlScanner import ScannerImageProvider, QmlScanner, QmlScannerConfig
 from .Runnable import Worker
+from .ThumbnailScheduler import ThumbnailScheduler
 
 from .rcc import BookBrowserRessource
 
@@ -177,6 +178,12 @@ class QmlApplication(QObject):
 
     ##############################################
 
+    @Property(ThumbnailScheduler, constant=True)
+    def thumbnail_scheduler(self):
+        return self._application.thumbnail_scheduler
+
+    ##############################################
+
     @Slot()
     def debug(self):
 
@@ -274,10 +281,15 @@ class Application(QObject):
 
         self._thread_pool = QtCore.QThreadPool()
         self._logger.info("Multithreading with maximum {} threads".format(self._thread_pool.maxThreadCount()))
+        self._thumbnail_scheduler = ThumbnailScheduler(self._thread_pool)
 
         self._scanner = None
         self._scanner_image_provider = ScannerImageProvider()
         self._engine.addImageProvider('scanner_image',  self._scanner_image_provider)
+        self._book_thumbnail_provider = BookThumbnailImageProvider()
+        self._engine.addImageProvider('book_thumbnail',  self._book_thumbnail_provider)
+        self._page_pyramid_provider = PagePyramidImageProvider()
+        self._engine.addImageProvider('page_pyramid',  self._page_pyramid_provider)
 
         QTimer.singleShot(0, self._post_init)
 
@@ -307,6 +319,18 @@ class Application(QObject):
     def thread_pool(self):
         return self._thread_pool
 
+    @property
+    def thumbnail_scheduler(self):
+        return self._thumbnail_scheduler
+
+    @property
+    def book_thumbnail_provider(self):
+        return self._book_thumbnail_provider
+
+    @property
+    def page_pyramid_provider(self):
+        return self._page_pyramid_provider
+
     @property
     def scanner_image_provider(self):
         return self._scanner_image_provider
@@ -490,9 +514,11 @@ class Application(QObject):
         qmlRegisterUncreatableType(QmlBookLibrary, 'BookBrowser', 1, 0, 'QmlBookLibrary', 'Cannot create QmlBookLi')
         qmlRegisterUncreatableType(QmlBook, 'BookBrowser', 1, 0, 'QmlBook', 'Cannot create QmlBook')
         qmlRegisterUncreatableType(QmlBookPage, 'BookBrowser', 1, 0, 'QmlBookPage', 'Cannot create QmlBookPage')
+        qmlRegisterUncreatableType(QmlBookPageModel, 'BookBrowser', 1, 0, 'QmlBookPageModel', 'Cannot create QmlBookPageModel')
         qmlRegisterUncreatableType(QmlBookMetadata, 'BookBrowser', 1, 0, 'QmlBookMetadata', 'Cannot create QmlBookMetadata')
         qmlRegisterUncreatableType(QmlScannerConfig, 'BookBrowser', 1, 0, 'QmlScannerConfig', 'Cannot create QmlScannerConfig')
         qmlRegisterUncreatableType(QmlScanner, 'BookBrowser', 1, 0, 'QmlScanner', 'Cannot create QmlScanner')
+        qmlRegisterUncreatableType(ThumbnailScheduler, 'BookBrowser', 1, 0, 'ThumbnailScheduler', 'Cannot create ThumbnailScheduler')
 
     ##############################################
 
@@ -590,6 +616,8 @@ class Application(QObject):
 
     def load_book(self, path):
         self._logger.info('Load book {} ...'.format(path))
+        if self._book is not None:
+            self._book.close()
         self._book = QmlBook(path)
         self._logger.info('Book loaded')
 
@@ -19,7 +19,10 @@
 ####################################################################################################
 
 __all__ = [
+    'BookThumbnailImageProvider',
+    'PagePyramidImageProvider',
     'QmlBook',
+    'QmlBookPageModel',
 ]
 
 ####################################################################################################
@@ -27,20 +30,27 @@ __all__ = [
 from pathlib import Path
 import glob
 import logging
+import multiprocessing
 import subprocess
+import threading
 import time
 
 from PyQt5.QtCore import QCoreApplication, QFileSystemWatcher
-from PyQt5.QtQml import QQmlListProperty
+from PyQt5.QtGui import QImage, QImageReader, QPainter
+from PyQt5.QtQuick import QQuickImageProvider
 from QtShim.QtCore import (
     Property, Signal, Slot, QObject,
-    Qt, QTimer, QUrl
+    QAbstractListModel, QModelIndex,
+    Qt, QRect, QSize, QTimer, QUrl
 )
 
 import markdown
 
 from BookBrowser.Thumbnail import FreeDesktopThumbnailCache # Fixme: Linux only
+from BookBrowser.Thumbnail.PagePyramid import PagePyramid, PagePyramidCache
+from BookBrowser.Thumbnail.ThumbnailPack import ThumbnailPack
 from BookBrowser.Book import Book
+from .PagePrefetcher import PagePrefetcher, QImageCache
 from .Runnable import Worker
 
 ####################################################################################################
@@ -50,6 +60,264 @@ _module_logger = logging.getLogger(__name__)
 ####################################################################################################
 
 thumbnail_cache = FreeDesktopThumbnailCache()
+page_pyramid_cache = PagePyramidCache()
+
+####################################################################################################
+
+class BookThumbnailImageProvider(QQuickImageProvider):
+
+    """Image provider to serve the page thumbnails from the thumbnail pack of a book.
+
+    The image id is *key/page_number* where *key* is returned by :meth:`register`, thus the QML
+    image cache doesn't mix the pages of two books.
+
+    """
+
+    _logger = _module_logger.getChild('BookThumbnailImageProvider')
+
+    ##############################################
+
+    def __init__(self):
+
+        super().__init__(QQuickImageProvider.Image)
+
+        # requestImage is called from the QML image loader threads
+        self._lock = threading.Lock()
+        self._packs = {}
+        self._counter = 0
+
+    ##############################################
+
+    def register(self, pack):
+        with self._lock:
+            self._counter += 1
+            key = str(self._counter)
+            self._packs[key] = pack
+        return key
+
+    def unregister(self, key):
+        with self._lock:
+            return self._packs.pop(key, None)
+
+    ##############################################
+
+    def requestImage(self, image_id, size):
+
+        image = QImage()
+        try:
+            key, page_number = image_id.split('/')
+            with self._lock:
+                pack = self._packs.get(key, None)
+            data = pack.page_data(int(page_number)) if pack is not None else None
+        except ValueError as exception:
+            self._logger.warning('{} {}'.format(image_id, exception))
+            data = None
+        if data is not None:
+            image.loadFromData(data, 'PNG')
+        if image.isNull():
+            self._logger.warning('Thumbnail not found {}'.format(image_id))
+        elif size.isValid():
+            image = image.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return image, image.size()
+
+####################################################################################################
+
+class PagePyramidImageProvider(QQuickImageProvider):
+
+    """Image provider to serve the levels and the tiles of the page pyramids.
+
+    The image id is *key* for a level, the level is chosen according to the requested source size,
+    and *key/level/row/column* for a tile.  The pyramid is built in the thread pool the first time a
+    tile is requested, i.e. when the page is zoomed, meanwhile the levels and the tiles are decoded
+    from the source image.
+
+    The levels are kept in a :class:`QImageCache`, :meth:`prefetch` is used to decode in advance the
+    pages which are likely to be shown next.
+
+    """
+
+    _logger = _module_logger.getChild('PagePyramidImageProvider')
+
+    ##############################################
+
+    def __init__(self):
+
+        super().__init__(QQuickImageProvider.Image)
+
+        # requestImage is called from the QML image loader threads
+        self._lock = threading.Lock()
+        self._pyramids = {}
+        self._jobs = set()
+        self._image_cache = QImageCache()
+        # size requested by the page viewer, used to prefetch the right level
+        self._requested_size = None
+
+    ##############################################
+
+    @property
+    def image_cache(self):
+        return self._image_cache
+
+    ##############################################
+
+    @staticmethod
+    def _make_key(pyramid):
+        # the mtime is part of the id, thus the QML image cache is not outdated
+        return '{}-{}'.format(pyramid.key, pyramid.mtime)
+
+    def register(self, pyramid):
+        """Return the image provider URL for *pyramid*"""
+        key = self._make_key(pyramid)
+        with self._lock:
+            self._pyramids[key] = pyramid
+        return 'image://page_pyramid/' + key
+
+    ##############################################
+
+    def _start(self, job_key, function, priority=0):
+
+        """Run *function* in the thread pool unless a job with the same key is running"""
+
+        with self._lock:
+            if job_key in self._jobs:
+                return
+            self._jobs.add(job_key)
+
+        def job():
+            try:
+                function()
+            finally:
+                with self._lock:
+                    self._jobs.discard(job_key)
+
+        worker = Worker(job)
+        from .QmlApplication import Application
+        Application.instance.thread_pool.start(worker, priority)
+
+    ##############################################
+
+    def _make_level_image(self, pyramid, level):
+
+        # the pyramid is not evicted while its tiles are read
+        with pyramid.read_tiles() as is_built:
+            if is_built:
+                image = self._assemble_level_image(pyramid, level)
+                if image is not None:
+                    return image
+
+        width, height = pyramid.level_size(level)
+        reader = QImageReader(str(pyramid.source_path))
+        # JPEG is decoded at a reduced scale
+        reader.setScaledSize(QSize(width, height))
+        return reader.read()
+
+    ##############################################
+
+    def _assemble_level_image(self, pyramid, level):
+
+        """Return the level assembled from its tiles, or None if a tile cannot be read"""
+
+        width, height = pyramid.level_size(level)
+        number_of_rows, number_of_columns = pyramid.level_grid(level)
+        image = None
+        painter = None
+        try:
+            for row in range(number_of_rows):
+                for column in range(number_of_columns):
+                    tile = QImage(str(pyramid.tile_path(level, row, column)))
+                    if tile.isNull():
+                        self._logger.warning('Cannot read tile {}/{}/{} of {}'.format(
+                            level, row, column, pyramid.source_path))
+                        return None
+                    if image is None:
+                        image = QImage(width, height, tile.format())
+                        painter = QPainter(image)
+                    painter.drawImage(column * pyramid.TILE_SIZE, row * pyramid.TILE_SIZE, tile)
+        finally:
+            if painter is not None:
+                painter.end()
+        return image
+
+    ##############################################
+
+    def _make_tile_image(self, pyramid, level, row, column):
+
+        with pyramid.read_tiles() as is_built:
+            if is_built:
+                tile = QImage(str(pyramid.tile_path(level, row, column)))
+                if not tile.isNull():
+                    return tile
+
+        # decode the area of the tile, JPEG is decoded at a reduced scale
+        x_min, y_min, x_max, y_max = pyramid.tile_box(level, row, column)
+        scale = 2**level
+        x = x_min * scale
+        y = y_min * scale
+        width = min((x_max - x_min) * scale, pyramid.width - x)
+        height = min((y_max - y_min) * scale, pyramid.height - y)
+        reader = QImageReader(str(pyramid.source_path))
+        reader.setClipRect(QRect(x, y, width, height))
+        reader.setScaledSize(QSize(x_max - x_min, y_max - y_min))
+        return reader.read()
+
+    ##############################################
+
+    def _level_image(self, key, pyramid, size):
+
+        self._requested_size = size
+        level = pyramid.level_for_size(size.width(), size.height())
+        cache_key = (key, level)
+        image = self._image_cache.get(cache_key)
+        if image is not None:
+            self._logger.info('{} level {} from cache'.format(key, level))
+            return image
+
+        self._logger.info('{} level {}'.format(key, level))
+        image = self._make_level_image(pyramid, level)
+        self._image_cache.put(cache_key, image)
+        return image
+
+    ##############################################
+
+    def prefetch(self, pyramid, priority=0):
+
+        """Decode in the thread pool the level of *pyramid* which will be requested by the page viewer"""
+
+        size = self._requested_size
+        if size is None:
+            return
+        key = self._make_key(pyramid)
+        level = pyramid.level_for_size(size.width(), size.height())
+        cache_key = (key, level)
+        if cache_key in self._image_cache:
+            return
+
+        def job():
+            # only the level is decoded, the pyramid is built when the page is zoomed
+            self._image_cache.put(cache_key, self._make_level_image(pyramid, level))
+
+        self._logger.info('Prefetch {} level {}'.format(key, level))
+        self._start(('prefetch', key), job, priority)
+
+    ##############################################
+
+    def requestImage(self, image_id, size):
+
+        parts = image_id.split('/')
+        with self._lock:
+            pyramid = self._pyramids.get(parts[0], None)
+        if pyramid is None:
+            self._logger.warning('Unknown page pyramid {}'.format(image_id))
+            image = QImage()
+        elif len(parts) == 1:
+            image = self._level_image(parts[0], pyramid, size)
+        else:
+            level, row, column = [int(x) for x in parts[1:]]
+            # the tiles are requested when the page is zoomed
+            if not pyramid.is_built:
+                self._start(('build', parts[0]), pyramid.build)
+            image = self._make_tile_image(pyramid, level, row, column)
+        return image, image.size()
 
 ####################################################################################################
 
@@ -295,12 +563,14 @@ class QmlBookPage(QObject):
 
     ##############################################
 
-    def __init__(self, qml_book, book_page):
+    def __init__(self, qml_book, book_page, row, parent=None):
 
-        super().__init__()
+        super().__init__(parent)
 
         self._qml_book = qml_book
         self._page = book_page
+        # row in the page model
+        self._row = row
 
         self._text = None
         self._ocr_running = False
@@ -317,6 +587,10 @@ class QmlBookPage(QObject):
     def page(self):
         return self._page
 
+    @property
+    def row(self):
+        return self._row
+
     ##############################################
 
     @Property(bool, constant=True)
@@ -344,24 +618,73 @@ class QmlBookPage(QObject):
 
     @Property(str, notify=large_thumbnail_path_changed)
     def large_thumbnail_path(self):
-        # Fixme: cache thumbnail instance ?
-        return str(thumbnail_cache[self._page.path].large_path)
+        url = self._qml_book.thumbnail_pack_url(self._page)
+        if url is not None:
+            return url
+        return str(self._thumbnail.large_path)
 
     ##############################################
 
-    thumbnail_ready = Signal()
+    @property
+    def pyramid(self):
+        return page_pyramid_cache.get(self._page.path, self._page.mtime)
 
-    @Slot()
-    def request_large_thumbnail(self):
+    @Property(str, notify=path_changed)
+    def pyramid_source(self):
+        if self._page.is_empty:
+            return ''
+        from .QmlApplication import Application
+        return Application.instance.page_pyramid_provider.register(self.pyramid)
 
-        def job():
-            # Fixme: issue when the application is closed
-            return str(thumbnail_cache[self._page.path].large)
+    @Property(int, notify=path_changed)
+    def image_width(self):
+        return 0 if self._page.is_empty else self.pyramid.width
 
-        worker = Worker(job)
-        worker.signals.finished.connect(self.thumbnail_ready)
+    @Property(int, notify=path_changed)
+    def image_height(self):
+        return 0 if self._page.is_empty else self.pyramid.height
+
+    @Property(int, notify=path_changed)
+    def number_of_levels(self):
+        return 0 if self._page.is_empty else self.pyramid.number_of_levels
+
+    @Property(int, constant=True)
+    def tile_size(self):
+        return PagePyramid.TILE_SIZE
+
+    ##############################################
+
+    @property
+    def _thumbnail(self):
+        # instances are cached by the thumbnail cache
+        return thumbnail_cache.get(self._page.path, self._page.mtime)
+
+    ##############################################
+
+    thumbnail_ready = Signal()
+
+    @Slot(bool)
+    def request_large_thumbnail(self, visible=True):
         from .QmlApplication import Application
-        Application.instance.thread_pool.start(worker)
+        Application.instance.thumbnail_scheduler.request(
+            self._page.path,
+            self._on_thumbnail_ready,
+            mtime=self._page.mtime,
+            visible=visible,
+        )
+
+    @Slot(bool)
+    def set_thumbnail_visible(self, visible):
+        from .QmlApplication import Application
+        Application.instance.thumbnail_scheduler.set_visible(self._page.path, visible)
+
+    @Slot()
+    def cancel_thumbnail_request(self):
+        from .QmlApplication import Application
+        Application.instance.thumbnail_scheduler.cancel(self._page.path, self._on_thumbnail_ready)
+
+    def _on_thumbnail_ready(self):
+        self.thumbnail_ready.emit()
 
     ##############################################
 
@@ -384,8 +707,7 @@ class QmlBookPage(QObject):
     @Slot()
     def flip_page(self):
         self._page.flip()
-        self.orientation_changed.emit()
-        self._qml_book.pages_changed.emit()
+        self._qml_book.page_model.update_pages(self._row, self._row)
 
     ##############################################
 
@@ -399,6 +721,8 @@ class QmlBookPage(QObject):
             language = metadata.language or None
 
             def job():
+                # the stored text is looked up by the worker, thus the GUI thread doesn't query the
+                # sidecar and the OCR cache
                 # Set fake to debug and receive a large lorem ipsum
                 text = self._page.to_text(language, fake=False)
                 # use result signal ???
@@ -441,6 +765,106 @@ class QmlBookPage(QObject):
 
 ####################################################################################################
 
+class QmlBookPageModel(QAbstractListModel):
+
+    """Model of the pages of a book.
+
+    The :class:`QmlBookPage` instances are made when a row is requested for the first time, thus a
+    view only makes the pages it shows.
+
+    """
+
+    BOOK_PAGE_ROLE = Qt.UserRole + 1
+    PAGE_NUMBER_ROLE = Qt.UserRole + 2
+    ORIENTATION_ROLE = Qt.UserRole + 3
+
+    _ROLE_NAMES = {
+        BOOK_PAGE_ROLE: b'book_page',
+        PAGE_NUMBER_ROLE: b'page_number',
+        ORIENTATION_ROLE: b'orientation',
+    }
+
+    _logger = _module_logger.getChild('QmlBookPageModel')
+
+    ##############################################
+
+    def __init__(self, qml_book, book):
+
+        super().__init__(qml_book)
+
+        self._qml_book = qml_book
+        self._book = book
+        # page index -> QmlBookPage
+        self._pages = {}
+
+    ##############################################
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._book)
+
+    def roleNames(self):
+        return self._ROLE_NAMES
+
+    ##############################################
+
+    def page(self, index):
+        """Return the :class:`QmlBookPage` at *index* or None"""
+        if not 0 <= index < len(self._book):
+            return None
+        qml_page = self._pages.get(index, None)
+        if qml_page is None:
+            # the model is the parent, thus QML doesn't take the ownership
+            qml_page = QmlBookPage(self._qml_book, self._book[index + 1], index, parent=self)
+            self._pages[index] = qml_page
+        return qml_page
+
+    ##############################################
+
+    def data(self, model_index, role=Qt.DisplayRole):
+
+        qml_page = self.page(model_index.row()) if model_index.isValid() else None
+        if qml_page is None:
+            return None
+
+        if role == self.BOOK_PAGE_ROLE:
+            return qml_page
+        elif role == self.PAGE_NUMBER_ROLE:
+            return qml_page.page_number
+        elif role == self.ORIENTATION_ROLE:
+            return qml_page.orientation
+        return None
+
+    ##############################################
+
+    @Property(int, constant=True)
+    def large_thumbnail_size(self):
+        return FreeDesktopThumbnailCache.LARGE_SIZE
+
+    ##############################################
+
+    def update_pages(self, first, last):
+        """Notify the pages from *first* to *last* rows were flipped, thus renamed"""
+        for index in range(first, last + 1):
+            qml_page = self._pages.get(index, None)
+            if qml_page is not None:
+                qml_page.path_changed.emit()
+                qml_page.large_thumbnail_path_changed.emit()
+                qml_page.orientation_changed.emit()
+        self.dataChanged.emit(self.index(first), self.index(last), [self.ORIENTATION_ROLE])
+
+    ##############################################
+
+    def add_page(self, filename):
+        row = len(self._book)
+        self.beginInsertRows(QModelIndex(), row, row)
+        page = self._book.add_page(filename)
+        self.endInsertRows()
+        return page
+
+####################################################################################################
+
 class QmlBook(QObject):
 
     new_page = Signal(int)
@@ -458,8 +882,40 @@ class QmlBook(QObject):
 
         self._metadata = QmlBookMetadata(self._book)
 
-        # We must prevent garbage collection
-        self._pages = [QmlBookPage(self, page) for page in self._book]
+        self._page_model = QmlBookPageModel(self, self._book)
+
+        self._thumbnail_pack = ThumbnailPack(self._book.path)
+        self._thumbnail_pack_key = None
+
+        self._prefetcher = PagePrefetcher(self)
+
+        self._duplicates = []
+        self._duplicates_running = False
+
+    ##############################################
+
+    def close(self):
+        if self._thumbnail_pack_key is not None:
+            from .QmlApplication import Application
+            Application.instance.book_thumbnail_provider.unregister(self._thumbnail_pack_key)
+            self._thumbnail_pack_key = None
+        self._thumbnail_pack.close()
+        self._book.close()
+
+    ##############################################
+
+    def thumbnail_pack_url(self, page):
+
+        """Return the image provider URL for the thumbnail of *page* if the pack has it, else None"""
+
+        if not self._thumbnail_pack.has_page(page):
+            return None
+        if self._thumbnail_pack_key is None:
+            # the provider is created after the first book is loaded
+            from .QmlApplication import Application
+            provider = Application.instance.book_thumbnail_provider
+            self._thumbnail_pack_key = provider.register(self._thumbnail_pack)
+        return 'image://book_thumbnail/{}/{}'.format(self._thumbnail_pack_key, int(page))
 
     ##############################################
 
@@ -479,8 +935,7 @@ class QmlBook(QObject):
 
     @Property(int, notify=number_of_pages_changed)
     def number_of_pages(self):
-        # return self._book.number_of_pages
-        return len(self._pages)
+        return self._book.number_of_pages
 
     @Slot(int, result=bool)
     def is_valid_page_number(self, page_number):
@@ -496,34 +951,32 @@ class QmlBook(QObject):
 
     ##############################################
 
-    pages_changed = Signal()
+    @property
+    def page_model(self):
+        return self._page_model
 
-    @Property(QQmlListProperty, notify=pages_changed)
+    @Property(QmlBookPageModel, constant=True)
     def pages(self):
-        return QQmlListProperty(QmlBookPage, self, self._pages)
+        return self._page_model
 
     ##############################################
 
     @Property(QmlBookPage)
     def first_page(self):
-        try:
-            return self._pages[0]
-        except IndexError:
-            return None
+        return self._page_model.page(0)
 
     @Property(QmlBookPage)
     def last_page(self):
-        try:
-            return self._pages[-1]
-        except IndexError:
-            return None
+        return self._page_model.page(self._book.number_of_pages - 1)
 
     @Slot(int, result=QmlBookPage)
     def page(self, page_number):
-        try:
-            return self._pages[page_number-1]
-        except IndexError:
-            return None
+        return self._page_model.page(page_number - 1)
+
+    @Slot(int)
+    def prefetch_around(self, page_number):
+        """Decode in advance the pages around *page_number* in the reading direction"""
+        self._prefetcher.navigate(page_number)
 
     ##############################################
 
@@ -532,8 +985,61 @@ class QmlBook(QObject):
         # Fixme: qml_page.page.page_number is None
         self._logger.info('{} {}'.format(qml_page.page_number, orientation))
         self._book.flip_from_page(qml_page.page_number, orientation)
-        qml_page.orientation_changed.emit()
-        self.pages_changed.emit()
+        self._page_model.update_pages(qml_page.row, self._page_model.rowCount() - 1)
+
+    ##############################################
+
+    duplicates_changed = Signal()
+
+    @Property('QVariantList', notify=duplicates_changed)
+    def duplicates(self):
+        """List of the pages which look the same, a pair is a map with the keys page_number1,
+        page_number2, hash_distance and histogram_distance.
+
+        """
+        return self._duplicates
+
+    duplicates_running_changed = Signal()
+
+    @Property(bool, notify=duplicates_running_changed)
+    def duplicates_running(self):
+        return self._duplicates_running
+
+    @Slot()
+    def find_duplicates(self):
+
+        """Search the duplicated pages on the thread pool, :attr:`duplicates` is updated when it is
+        done.
+
+        """
+
+        if self._duplicates_running:
+            return
+
+        def job():
+            # forking a process which runs Qt threads is unsafe
+            pairs = self._book.find_duplicates(mp_context=multiprocessing.get_context('spawn'))
+            self._duplicates = [
+                dict(
+                    page_number1=int(pair.page1),
+                    page_number2=int(pair.page2),
+                    hash_distance=pair.hash_distance,
+                    histogram_distance=pair.histogram_distance,
+                )
+                for pair in pairs
+            ]
+
+        worker = Worker(job)
+        worker.signals.finished.connect(self._on_duplicates_found)
+        self._duplicates_running = True
+        self.duplicates_running_changed.emit()
+        from .QmlApplication import Application
+        Application.instance.thread_pool.start(worker)
+
+    def _on_duplicates_found(self):
+        self._duplicates_running = False
+        self.duplicates_running_changed.emit()
+        self.duplicates_changed.emit()
 
     ##############################################
 
@@ -564,6 +1070,10 @@ class QmlBook(QObject):
         self._logger.info('New files {}'.format(new_files))
         # Fixme: overwrite
 
+        # Drop the cached thumbnails of the files which were removed or replaced
+        for filename in (self._files ^ files):
+            thumbnail_cache.invalidate(self._book.joinpath(filename))
+
         for filename in new_files:
             self._on_new_file(filename)
 
@@ -577,11 +1087,10 @@ class QmlBook(QObject):
 
         # try:
 
-        page = self._book.add_page(filename)
-        page._page_number = self._book.number_of_pages # Fixme: !!!
+        page = self._page_model.add_page(filename)
+        page.page_number = self._book.number_of_pages # Fixme: !!!
         self._logger.info('New page\n{}'.format(page))
 
-        self._pages.append(QmlBookPage(self, page))
         self.number_of_pages_changed.emit()
         self.new_page.emit(page.page_number)
 
@@ -25,10 +25,12 @@ __all__ = [
 ####################################################################################################
 
 import logging
+import os
 
 from PyQt5.QtQml import QQmlListProperty
 from QtShim.QtCore import (
     Property, Signal, Slot, QObject,
+    QTimer,
 )
 
 from BookBrowser.Book import BookLibrary
@@ -59,10 +61,28 @@ class QmlBookCover(QObject):
 
     ##############################################
 
+    @property
+    def book_cover(self):
+        return self._book_cover
+
     @Property(str, constant=True)
     def path(self):
         return str(self._book_cover.path)
 
+    @Property(str, constant=True)
+    def title(self):
+        return self._book_cover.title
+
+    @Property(str, constant=True)
+    def authors(self):
+        return self._book_cover.authors_str
+
+    @Property(int, constant=True)
+    def year(self):
+        return self._book_cover.year
+
+    ##############################################
+
     @Property(str, constant=True)
     def cover_path(self):
         cover_path = self._book_cover.cover_path
@@ -81,12 +101,19 @@ class QmlBookCover(QObject):
 
     large_thumbnail_path_changed = Signal()
 
+    @property
+    def _cover_mtime(self):
+        # the thumbnail is outdated if the cover is modified
+        try:
+            return os.stat(self.cover_path).st_mtime
+        except OSError:
+            return None
+
     @Property(str, notify=large_thumbnail_path_changed)
     def large_thumbnail_path(self):
-        # Fixme: cache thumbnail instance ?
         cover_path = self.cover_path
         if cover_path:
-            return str(thumbnail_cache[cover_path].large_path)
+            return str(thumbnail_cache.get(cover_path, self._cover_mtime).large_path)
         else:
             return ''
 
@@ -94,31 +121,47 @@ class QmlBookCover(QObject):
 
     thumbnail_ready = Signal()
 
-    @Slot()
-    def request_large_thumbnail(self):
-
+    @Slot(bool)
+    def request_large_thumbnail(self, visible=True):
         cover_path = self.cover_path
-        if not cover_path:
-            return
-
-        def job():
-            # Fixme: issue when the application is closed
-            return str(thumbnail_cache[cover_path].large)
+        if cover_path:
+            from .QmlApplication import Application
+            Application.instance.thumbnail_scheduler.request(
+                cover_path,
+                self._on_thumbnail_ready,
+                mtime=self._cover_mtime,
+                visible=visible,
+            )
+
+    @Slot(bool)
+    def set_thumbnail_visible(self, visible):
+        cover_path = self.cover_path
+        if cover_path:
+            from .QmlApplication import Application
+            Application.instance.thumbnail_scheduler.set_visible(cover_path, visible)
 
-        worker = Worker(job)
-        # worker.signals.result.connect(self.print_output)
-        worker.signals.finished.connect(self.thumbnail_ready)
-        # worker.signals.progress.connect(self.progress_fn)
+    @Slot()
+    def cancel_thumbnail_request(self):
+        cover_path = self.cover_path
+        if cover_path:
+            from .QmlApplication import Application
+            Application.instance.thumbnail_scheduler.cancel(cover_path, self._on_thumbnail_ready)
 
-        from .QmlApplication import Application
-        Application.instance.thread_pool.start(worker)
+    def _on_thumbnail_ready(self):
+        self.thumbnail_ready.emit()
 
 ####################################################################################################
 
 class QmlBookLibrary(QObject):
 
+    # Number of book covers sent at once to the QML side while scanning
+    SCAN_BATCH_SIZE = 50
+
     _logger = _module_logger.getChild('QmlBookLibrary')
 
+    # Internal signal used to send book covers from the scan thread
+    _book_covers_found = Signal(list)
+
     ##############################################
 
     def __init__(self, path):
@@ -126,13 +169,18 @@ class QmlBookLibrary(QObject):
         super().__init__()
 
         self._book_library = BookLibrary(path)
-        self.scan()
+        # We must prevent garbage collection
+        self._book_covers = []
+        self._book_cover_map = {}
+        # removed book covers waiting for their deletion by the event loop
+        self._released_book_covers = {}
+        self._scanning = False
 
-    ##############################################
+        self._book_covers_found.connect(self._on_book_covers_found)
+        # The application thread pool is not yet available
+        QTimer.singleShot(0, self.scan)
 
-    def _make_book_covers(self):
-        # We must prevent garbage collection
-        self._book_covers = [QmlBookCover(book_cover) for book_cover in self._book_library]
+    ##############################################
 
     @Property(str, constant=True)
     def path(self):
@@ -140,11 +188,120 @@ class QmlBookLibrary(QObject):
 
     ##############################################
 
+    scanning_changed = Signal()
+
+    @Property(bool, notify=scanning_changed)
+    def scanning(self):
+        return self._scanning
+
+    def _set_scanning(self, value):
+        if self._scanning != value:
+            self._scanning = value
+            self.scanning_changed.emit()
+
+    ##############################################
+
+    def _get_qml_book_cover(self, book_cover):
+        # Reuse the instance, since it can be referenced by QML, unless the book was updated
+        key = str(book_cover.path)
+        qml_book_cover = self._book_cover_map.get(key, None)
+        if qml_book_cover is None or qml_book_cover.book_cover.to_dict() != book_cover.to_dict():
+            qml_book_cover = QmlBookCover(book_cover)
+            self._book_cover_map[key] = qml_book_cover
+        return qml_book_cover
+
+    ##############################################
+
+    def _load_summary(self):
+
+        """Show the books of the summary saved by the last scan, the scan then updates the model"""
+
+        try:
+            self._book_library.load_from_json()
+        except (OSError, ValueError, TypeError) as exception:
+            # an empty file only marks the library
+            self._logger.info('Cannot load library summary\n{}'.format(exception))
+            return
+        self._book_covers = [self._get_qml_book_cover(book_cover) for book_cover in self._book_library]
+        self._logger.info('Loaded {} books from the library summary'.format(len(self._book_covers)))
+        self.books_changed.emit()
+
+    ##############################################
+
     @Slot()
     def scan(self):
-        self._book_library.scan()
-        self._make_book_covers()
+
+        """Scan the library in the thread pool, the new book covers are appended to the model as soon
+        as they are found.  The first scan starts from the summary saved by the last one.
+
+        """
+
+        if self._scanning:
+            return
+        self._set_scanning(True)
+
+        if not self._book_covers:
+            self._load_summary()
+
+        def job():
+            batch = []
+            def on_book_cover(book_cover):
+                batch.append(book_cover)
+                if len(batch) >= self.SCAN_BATCH_SIZE:
+                    self._book_covers_found.emit(list(batch))
+                    batch.clear()
+            self._book_library.scan(callback=on_book_cover)
+            if batch:
+                self._book_covers_found.emit(batch)
+            # the summary is loaded by the next launch
+            self._book_library.save_json()
+
+        worker = Worker(job)
+        worker.signals.finished.connect(self._on_scan_done)
+        from .QmlApplication import Application
+        Application.instance.thread_pool.start(worker)
+
+    ##############################################
+
+    def _on_book_covers_found(self, book_covers):
+        # the books of the summary are already shown, they are updated when the scan is done
+        book_covers = [
+            book_cover for book_cover in book_covers
+            if str(book_cover.path) not in self._book_cover_map
+        ]
+        if book_covers:
+            self._book_covers += [self._get_qml_book_cover(book_cover) for book_cover in book_covers]
+            self.books_changed.emit()
+
+    ##############################################
+
+    def _on_scan_done(self):
+        # Reorder the model by title and drop the removed books
+        old_book_covers = list(self._book_cover_map.values())
+        self._book_covers = [self._get_qml_book_cover(book_cover) for book_cover in self._book_library]
+        self._book_cover_map = {str(qml_book_cover.path):qml_book_cover for qml_book_cover in self._book_covers}
         self.books_changed.emit()
+        # the model is updated, thus the removed and the replaced book covers can be released
+        self._release_book_covers(
+            qml_book_cover for qml_book_cover in old_book_covers
+            if self._book_cover_map.get(str(qml_book_cover.path), None) is not qml_book_cover
+        )
+        self._set_scanning(False)
+
+    ##############################################
+
+    def _release_book_covers(self, qml_book_covers):
+
+        """Delete the book covers from the event loop, once QML released them.  A reference is kept
+        until then, else the garbage collector would delete them at once.
+
+        """
+
+        for qml_book_cover in qml_book_covers:
+            key = id(qml_book_cover)
+            self._released_book_covers[key] = qml_book_cover
+            qml_book_cover.destroyed.connect(lambda obj=None, key=key: self._released_book_covers.pop(key, None))
+            qml_book_cover.deleteLater()
 
     ##############################################
 
@@ -154,9 +311,30 @@ class QmlBookLibrary(QObject):
 
     ##############################################
 
-    @Property(str, constant=True)
-    def path(self):
-        return str(self._book_library.path)
+    @Slot(str, result='QVariantList')
+    def search(self, query):
+
+        """Search the OCR texts, return a list of hits with the book path and title, the page number,
+        the filename and a snippet.
+
+        """
+
+        try:
+            hits = self._book_library.search_texts(query)
+        except ValueError as exception:
+            self._logger.warning(str(exception))
+            return []
+        results = []
+        for hit in hits:
+            qml_book_cover = self._book_cover_map.get(hit.book_path, None)
+            results.append({
+                'book_path': hit.book_path,
+                'title': qml_book_cover.title if qml_book_cover is not None else '',
+                'page_number': hit.page_number,
+                'filename': hit.filename,
+                'snippet': hit.snippet,
+            })
+        return results
 
     ##############################################
 
@@ -0,0 +1,194 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to schedule the generation of thumbnails on the application thread pool.
+
+Requests for visible thumbnails run before the others, and the most recent request first, so the
+thumbnails of the viewport are rendered first while flicking.  Requests for the same image share a
+job, and a job which is no longer requested is removed from the queue before it runs.
+
+"""
+
+####################################################################################################
+
+__all__ = ['ThumbnailScheduler']
+
+####################################################################################################
+
+import logging
+
+from PyQt5.QtCore import QRunnable
+from QtShim.QtCore import (
+    Property, Signal, Slot, QObject,
+)
+
+from BookBrowser.Thumbnail import FreeDesktopThumbnailCache # Fixme: Linux only
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+thumbnail_cache = FreeDesktopThumbnailCache()
+
+####################################################################################################
+
+class ThumbnailJob(QRunnable):
+
+    _logger = _module_logger.getChild('ThumbnailJob')
+
+    ##############################################
+
+    def __init__(self, scheduler, path, mtime):
+
+        super().__init__()
+        # The scheduler keeps a reference until the job is done
+        self.setAutoDelete(False)
+
+        self._scheduler = scheduler
+        self._path = path
+        self._mtime = mtime
+        self.priority = 0
+        self.callbacks = []
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def run(self):
+        try:
+            thumbnail_cache.get(self._path, self._mtime).large
+        except Exception as exception:
+            self._logger.warning('Cannot make thumbnail for {}\n{}'.format(self._path, exception))
+        # queued to the main thread
+        self._scheduler._job_done.emit(self._path)
+
+####################################################################################################
+
+class ThumbnailScheduler(QObject):
+
+    # Visible requests have a priority greater than this offset
+    VISIBLE_PRIORITY = 1 << 30
+
+    _logger = _module_logger.getChild('ThumbnailScheduler')
+
+    _job_done = Signal(str)
+
+    ##############################################
+
+    def __init__(self, thread_pool):
+
+        super().__init__()
+
+        self._thread_pool = thread_pool
+        self._jobs = {}
+        # incremented for each request, thus the most recent request run first
+        self._counter = 0
+
+        self._job_done.connect(self._on_job_done)
+
+    ##############################################
+
+    queue_depth_changed = Signal()
+
+    @Property(int, notify=queue_depth_changed)
+    def queue_depth(self):
+        """Number of pending or running thumbnail jobs"""
+        return len(self._jobs)
+
+    ##############################################
+
+    def _priority(self, visible):
+        self._counter += 1
+        priority = self._counter % self.VISIBLE_PRIORITY
+        if visible:
+            priority += self.VISIBLE_PRIORITY
+        return priority
+
+    ##############################################
+
+    def request(self, path, callback, mtime=None, visible=True):
+
+        """Request the large thumbnail of the image *path*, *callback* is called in the main thread
+        when the thumbnail is ready.
+
+        """
+
+        path = str(path)
+        job = self._jobs.get(path, None)
+        if job is None:
+            job = ThumbnailJob(self, path, mtime)
+            job.priority = self._priority(visible)
+            self._jobs[path] = job
+            self._thread_pool.start(job, job.priority)
+            self.queue_depth_changed.emit()
+        else:
+            self.set_visible(path, visible)
+        job.callbacks.append(callback)
+
+    ##############################################
+
+    def set_visible(self, path, visible):
+
+        """Update the priority of a pending request"""
+
+        job = self._jobs.get(str(path), None)
+        if job is None:
+            return
+        was_visible = job.priority >= self.VISIBLE_PRIORITY
+        # a visible request is moved to the head of the queue
+        if visible or was_visible:
+            # tryTake fails if the job is already running
+            if self._thread_pool.tryTake(job):
+                job.priority = self._priority(visible)
+                self._thread_pool.start(job, job.priority)
+
+    ##############################################
+
+    def cancel(self, path, callback):
+
+        """Cancel a request, the job is dropped if it is pending and there is no more request"""
+
+        path = str(path)
+        job = self._jobs.get(path, None)
+        if job is None:
+            return
+        try:
+            job.callbacks.remove(callback)
+        except ValueError:
+            pass
+        if not job.callbacks and self._thread_pool.tryTake(job):
+            self._logger.info('Cancel {}'.format(path))
+            del self._jobs[path]
+            self.queue_depth_changed.emit()
+
+    ##############################################
+
+    def _on_job_done(self, path):
+        job = self._jobs.pop(path, None)
+        if job is not None:
+            for callback in job.callbacks:
+                callback()
+            self.queue_depth_changed.emit()
@@ -73,6 +73,19 @@ Item {
                     property int border_width: 5
                     property int image_size: book_cover.large_thumbnail_size
                     property bool image_ready: thumbnail.status === Image.Ready
+                    // Flow is at the origin of the flickable content
+                    property bool in_viewport: (y + height > flickable.contentY) && (y < flickable.contentY + flickable.height)
+                    property bool thumbnail_requested: false
+
+                    onIn_viewportChanged: {
+                        if (thumbnail_requested)
+                            book_cover.set_thumbnail_visible(in_viewport)
+                    }
+
+                    Component.onDestruction: {
+                        if (thumbnail_requested)
+                            book_cover.cancel_thumbnail_request()
+                    }
 
                     width: (image_ready ? thumbnail.sourceSize.width : image_size) + 2*border_width
                     height: (image_ready ? thumbnail.sourceSize.height : image_size) + 2*border_width
@@ -85,6 +98,9 @@ Item {
                         running: !(book_cover.is_empty || image_ready)
                     }
 
+                    ToolTip.visible: selected
+                    ToolTip.text: book_cover.title + (book_cover.authors ? '\n' + book_cover.authors : '')
+
                     Image {
                         id: thumbnail
                         anchors.centerIn: parent
@@ -106,14 +122,17 @@ Item {
                         }
 
                         function on_thumbnail_ready() {
+                            thumbnail_requested = false
+                            book_cover.thumbnail_ready.disconnect(on_thumbnail_ready)
                             source = book_cover.large_thumbnail_path
                         }
 
                         onStatusChanged: {
-                            if (thumbnail.status == Image.Error) {
+                            if (thumbnail.status == Image.Error && !thumbnail_requested) {
                                 source = ''
-                                book_cover.request_large_thumbnail()
+                                thumbnail_requested = true
                                 book_cover.thumbnail_ready.connect(on_thumbnail_ready)
+                                book_cover.request_large_thumbnail(in_viewport)
                             }
                         }
                     }
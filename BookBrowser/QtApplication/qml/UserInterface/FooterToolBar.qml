@@ -32,6 +32,7 @@ ToolBar {
      */
 
     property alias message: message_label.text
+    property int thumbnail_queue_depth: 0
 
     /******************************************************/
 
@@ -39,5 +40,10 @@ ToolBar {
         Label {
             id: message_label
         }
+
+        Label {
+            visible: thumbnail_queue_depth > 0
+            text: qsTr('Thumbnails: %1').arg(thumbnail_queue_depth)
+        }
     }
 }
@@ -39,6 +39,7 @@ ToolBar {
     property var page_viewer_page
     property var scanner_ui
     property var stack_layout
+    property var thumbnail_page
 
     /******************************************************/
 
@@ -88,6 +89,13 @@ ToolBar {
             }
         }
 
+        Widgets.ToolButtonTip {
+            visible: thumbnail_page.visible
+            icon.name: 'find-in-page-black'
+            tip: qsTr('Find duplicated pages')
+            onClicked: thumbnail_page.find_duplicates()
+        }
+
         Ui.PageViewerToolBar {
             visible: page_viewer_page.visible
 
@@ -93,13 +93,23 @@ Widgets.ImageViewer {
 
     property var book: application.book
 
-    image_source: book_page ? book_page.path : ''
+    image_source: book_page ? book_page.pyramid_source : ''
+    tiled: true
+    source_width: book_page ? book_page.image_width : 0
+    source_height: book_page ? book_page.image_height : 0
+    number_of_levels: book_page ? book_page.number_of_levels : 1
+    tile_size: book_page ? book_page.tile_size : 512
     image_rotation: book_page ? book_page.orientation : 0
 
     Component.onCompleted: {
         book.new_page.connect(last_page)
     }
 
+    onBook_pageChanged: {
+        if (book_page)
+            book.prefetch_around(book_page.page_number)
+    }
+
     onMovementEnded: {
         // Fixme: this simple implementation has issues
         //   It require to start a flick event (a wheel event is not enought)
@@ -17,11 +17,12 @@
  *  along with this program.  If not, see <https://www.gnu.org/licenses/>.
  *
  ***************************************************************************************************/
-
 import QtQuick 2.11
 import QtQuick.Controls 2.4
+import QtQuick.Layouts 1.11
 
 import BookBrowser 1.0
+import Constants 1.0
 import '.' 1.0 as Ui
 
 Page {
@@ -36,17 +37,98 @@ Page {
     property var page_viewer
     // property var stack_layout
 
+    function find_duplicates() {
+        duplicates_pane.visible = true
+        application.book.find_duplicates()
+    }
+
     /******************************************************/
 
-    Ui.ThumbnailViewer {
-        id: thumbnail_viewer
+    function show_page(page_number) {
+        page_viewer.to_page(page_number)
+        stack_layout.set_viewer_page()
+    }
+
+    RowLayout {
         anchors.fill: parent
+        spacing: 0
+
+        Ui.ThumbnailViewer {
+            id: thumbnail_viewer
+            Layout.fillWidth: true
+            Layout.fillHeight: true
+
+            thumbnail_model: application.book.pages
+
+            onShow_page: root.show_page(page_number)
+        }
+
+        Pane {
+            id: duplicates_pane
+            Layout.fillHeight: true
+            Layout.preferredWidth: 250
+            visible: false
+
+            ColumnLayout {
+                anchors.fill: parent
+
+                RowLayout {
+                    Label {
+                        Layout.fillWidth: true
+                        font.bold: true
+                        text: qsTr('Duplicated pages')
+                    }
+
+                    BusyIndicator {
+                        Layout.preferredHeight: 24
+                        Layout.preferredWidth: 24
+                        running: application.book.duplicates_running
+                        visible: running
+                    }
+
+                    ToolButton {
+                        icon.name: 'close-black'
+                        onClicked: duplicates_pane.visible = false
+                    }
+                }
+
+                Label {
+                    visible: !application.book.duplicates_running && !duplicates_list_view.count
+                    text: qsTr('No duplicated pages')
+                }
+
+                ListView {
+                    id: duplicates_list_view
+                    Layout.fillWidth: true
+                    Layout.fillHeight: true
+                    clip: true
+                    spacing: Style.spacing.small
+                    model: application.book.duplicates
+                    ScrollBar.vertical: ScrollBar {}
+
+                    // a pair is shown as two links to the pages
+                    delegate: RowLayout {
+                        spacing: Style.spacing.small
+
+                        Button {
+                            flat: true
+                            text: modelData.page_number1
+                            onClicked: root.show_page(modelData.page_number1)
+                        }
 
-        thumbnail_model: application.book.pages
+                        Button {
+                            flat: true
+                            text: modelData.page_number2
+                            onClicked: root.show_page(modelData.page_number2)
+                        }
 
-        onShow_page: {
-            page_viewer.to_page(page_number)
-            stack_layout.set_viewer_page()
+                        Label {
+                            color: 'grey'
+                            text: modelData.hash_distance
+                        }
+                    }
+                }
+            }
         }
     }
 }
@@ -41,89 +41,106 @@ Item {
 
     /******************************************************/
 
-    Flickable {
-        id: flickable
+    GridView {
+        id: grid_view
         anchors.fill: parent
-        contentWidth: flow.width
-        contentHeight: flow.height
+
+        // the model is a QmlBookPageModel, thus only the visible pages are made
+        model: thumbnail_model
+
+        property int border_width: 5
+        property int spacing: 30
+        property int image_size: thumbnail_model ? thumbnail_model.large_thumbnail_size : 256
+        cellWidth: image_size + 2*border_width + spacing
+        cellHeight: cellWidth
 
         boundsBehavior: Flickable.StopAtBounds
         clip: true
 
-        // ScrollView {
-        Flow {
-            // Fixme: QML Flow: Cannot anchor to an item that isn't a parent or sibling.
-            id: flow
-            width: flickable.width
-            //! anchors.horizontalCenter: flickable.horizontalCenter
-            // anchors.margins: 0
-            spacing: 30
-
-            Repeater {
-                model: thumbnail_model
-
-                Rectangle {
-                    id: image_container
-
-                    property var book_page: modelData
-
-                    property bool selected: false
-                    property int border_width: 5
-                    property int image_size: book_page.large_thumbnail_size
-                    property bool image_ready: thumbnail.status === Image.Ready
-
-                    width: (image_ready ? thumbnail.sourceSize.width : image_size) + 2*border_width
-                    height: (image_ready ? thumbnail.sourceSize.height : image_size) + 2*border_width
-                    border.width: border_width
-                    border.color: selected ? '#38b0ff' : '#00000000'
-                    color: image_ready ? '#00000000' :'#aaaaaa'
-
-                    BusyIndicator {
-                        anchors.centerIn: parent
-                        running: !(book_page.is_empty || image_ready)
-                    }
+        delegate: Item {
+            id: cell
+            width: grid_view.cellWidth
+            height: grid_view.cellHeight
 
-                    Text {
-                        // visible: thumbnail.status !== Image.Ready
-                        anchors.horizontalCenter: parent.horizontalCenter
-                        anchors.top: parent.top
-                        anchors.topMargin: 20
-                        font.pixelSize: image_size * .10
-                        text: 'P' + book_page.page_number
-                        z: 100
-                    }
+            property var book_page: model.book_page
+            // delegates are positioned in the content item
+            property bool in_viewport: (y + height > grid_view.contentY) && (y < grid_view.contentY + grid_view.height)
+            property bool thumbnail_requested: false
 
-                    Image {
-                        id: thumbnail
-                        anchors.centerIn: parent
-                        visible: ! book_page.is_empty
+            onIn_viewportChanged: {
+                if (thumbnail_requested)
+                    book_page.set_thumbnail_visible(in_viewport)
+            }
 
-                        asynchronous: true
-                        rotation: book_page.orientation
+            Component.onDestruction: {
+                if (thumbnail_requested)
+                    book_page.cancel_thumbnail_request()
+            }
 
-                        MouseArea {
-                            anchors.fill: parent
-                            hoverEnabled: true
-                            onClicked: thumbnail_container.show_page(book_page.page_number)
-                            onEntered: selected = true
-                            onExited: selected = false
-                        }
+            Rectangle {
+                id: image_container
+                anchors.left: parent.left
+                anchors.top: parent.top
+
+                property bool selected: false
+                property int border_width: grid_view.border_width
+                property int image_size: grid_view.image_size
+                property bool image_ready: thumbnail.status === Image.Ready
+
+                width: (image_ready ? thumbnail.sourceSize.width : image_size) + 2*border_width
+                height: (image_ready ? thumbnail.sourceSize.height : image_size) + 2*border_width
+                border.width: border_width
+                border.color: selected ? '#38b0ff' : '#00000000'
+                color: image_ready ? '#00000000' :'#aaaaaa'
+
+                BusyIndicator {
+                    anchors.centerIn: parent
+                    running: !(book_page.is_empty || image_container.image_ready)
+                }
 
-                        Component.onCompleted: {
-                            if (!book_page.is_empty)
-                                source = book_page.large_thumbnail_path
-                        }
+                Text {
+                    // visible: thumbnail.status !== Image.Ready
+                    anchors.horizontalCenter: parent.horizontalCenter
+                    anchors.top: parent.top
+                    anchors.topMargin: 20
+                    font.pixelSize: image_container.image_size * .10
+                    text: 'P' + model.page_number
+                    z: 100
+                }
+
+                Image {
+                    id: thumbnail
+                    anchors.centerIn: parent
+                    visible: ! book_page.is_empty
+
+                    asynchronous: true
+                    rotation: model.orientation
+
+                    MouseArea {
+                        anchors.fill: parent
+                        hoverEnabled: true
+                        onClicked: thumbnail_container.show_page(model.page_number)
+                        onEntered: image_container.selected = true
+                        onExited: image_container.selected = false
+                    }
 
-                        function on_thumbnail_ready() {
+                    Component.onCompleted: {
+                        if (!book_page.is_empty)
                             source = book_page.large_thumbnail_path
-                        }
+                    }
+
+                    function on_thumbnail_ready() {
+                        cell.thumbnail_requested = false
+                        book_page.thumbnail_ready.disconnect(on_thumbnail_ready)
+                        source = book_page.large_thumbnail_path
+                    }
 
-                        onStatusChanged: {
-                            if (thumbnail.status == Image.Error) {
-                                source = ''
-                                book_page.request_large_thumbnail()
-                                book_page.thumbnail_ready.connect(on_thumbnail_ready)
-                            }
+                    onStatusChanged: {
+                        if (thumbnail.status == Image.Error && !cell.thumbnail_requested) {
+                            source = ''
+                            cell.thumbnail_requested = true
+                            book_page.thumbnail_ready.connect(on_thumbnail_ready)
+                            book_page.request_large_thumbnail(cell.in_viewport)
                         }
                     }
                 }
@@ -35,6 +35,14 @@ Flickable {
     property string image_source
     property int image_rotation
 
+    // Tiled mode: image_source is a page pyramid provided by an image provider which serves the
+    // level matching the source size and the tiles as image_source/level/row/column
+    property bool tiled: false
+    property int source_width: 0
+    property int source_height: 0
+    property int number_of_levels: 1
+    property int tile_size: 512
+
     function reset_rotation() {
         image_rotation = 0
     }
@@ -97,18 +105,92 @@ Flickable {
     property real max_zoom: 2.0
     property real zoom_step: 0.1
 
+    // Level of the base image, it is the smallest one which fits the screen
+    property int base_level: {
+        if (!tiled || !source_width || !source_height)
+            return 0
+        var fit_scale = Math.min(flickable.width / source_width, flickable.height / source_height)
+        return level_for_scale(fit_scale)
+    }
+
+    // Level matching the current zoom, the tiles are shown when it is finer than the base level
+    property int tile_level: level_for_scale(image.scale)
+
+    function level_for_scale(scale) {
+        if (scale >= 1 || scale <= 0)
+            return 0
+        return Math.min(Math.floor(Math.log(1 / scale) / Math.LN2), number_of_levels - 1)
+    }
+
+    function level_size(level) {
+        var factor = Math.pow(2, level)
+        return Qt.size(Math.max(1, Math.floor(source_width / factor)), Math.max(1, Math.floor(source_height / factor)))
+    }
+
+    function update_tiles() {
+        if (!tiled || image.status !== Image.Ready || tile_level >= base_level) {
+            tile_layer.tiles = []
+            return
+        }
+
+        var level = tile_level
+        var factor = Math.pow(2, level)
+        var size = level_size(level)
+        var number_of_columns = Math.ceil(size.width / tile_size)
+        var number_of_rows = Math.ceil(size.height / tile_size)
+        // visible area in image coordinates, it takes care of the scale and the rotation
+        var area = image.mapFromItem(flickable, 0, 0, flickable.width, flickable.height)
+        var step = tile_size * factor
+        var column_inf = Math.max(0, Math.floor(area.x / step))
+        var column_sup = Math.min(number_of_columns - 1, Math.floor((area.x + area.width) / step))
+        var row_inf = Math.max(0, Math.floor(area.y / step))
+        var row_sup = Math.min(number_of_rows - 1, Math.floor((area.y + area.height) / step))
+
+        var tiles = []
+        for (var row = row_inf; row <= row_sup; row++) {
+            for (var column = column_inf; column <= column_sup; column++) {
+                tiles.push({
+                    x: column * step,
+                    y: row * step,
+                    width: Math.min(tile_size, size.width - column * tile_size) * factor,
+                    height: Math.min(tile_size, size.height - row * tile_size) * factor,
+                    source: image_source + '/' + level + '/' + row + '/' + column,
+                })
+            }
+        }
+        tile_layer.tiles = tiles
+    }
+
+    onImage_sourceChanged: tile_layer.tiles = []
+    onTile_levelChanged: tile_timer.restart()
+
+    Timer {
+        id: tile_timer
+        // wait the end of a burst of moves
+        interval: 50
+        onTriggered: update_tiles()
+    }
+
     onWidthChanged: {
         if (fit_to_screen_active)
             fit_to_screen()
+        tile_timer.restart()
     }
 
     onHeightChanged: {
         if (fit_to_screen_active)
             fit_to_screen()
+        tile_timer.restart()
     }
 
-    onContentXChanged: console.debug('CX' + contentX)
-    onContentYChanged: console.debug('CY' + contentY)
+    onContentXChanged: {
+        console.debug('CX' + contentX)
+        tile_timer.restart()
+    }
+    onContentYChanged: {
+        console.debug('CY' + contentY)
+        tile_timer.restart()
+    }
 
     Item {
         id: image_container // purpose ???
@@ -125,12 +207,17 @@ Flickable {
 
             property real prev_scale: 1.0
 
+            // in tiled mode, the item has the size of the source image whatever the loaded level
+            width: tiled ? source_width : implicitWidth
+            height: tiled ? source_height : implicitHeight
+
             asynchronous: true
             cache: false
             fillMode: Image.PreserveAspectFit
             smooth: flickable.moving
 
             source: image_source
+            sourceSize: tiled ? flickable.level_size(base_level) : Qt.size(0, 0)
             rotation: image_rotation
 
             onScaleChanged: {
@@ -147,6 +234,7 @@ Flickable {
                     flickable.contentY = y_offset - flickable.height / 2
                 }
                 prev_scale = scale
+                tile_timer.restart()
             }
 
             onStatusChanged: {
@@ -155,11 +243,34 @@ Flickable {
                         flickable.fit_to_screen()
                     else if (flickable.full_zoom_active)
                         flickable.zoom_full()
+                    tile_timer.restart()
                 }
             }
 
             onWidthChanged: console.debug(width)
             onHeightChanged: console.debug(height)
+
+            Item {
+                id: tile_layer
+                // in the coordinates of the source image
+                anchors.fill: parent
+                visible: tiled
+
+                property var tiles: []
+
+                Repeater {
+                    model: tile_layer.tiles
+
+                    Image {
+                        x: modelData.x
+                        y: modelData.y
+                        width: modelData.width
+                        height: modelData.height
+                        asynchronous: true
+                        source: modelData.source
+                    }
+                }
+            }
         }
     }
 
@@ -176,6 +176,7 @@ ApplicationWindow {
         page_viewer_page: page_viewer_page
         scanner_ui: scanner_page.scanner_ui
         stack_layout: stack_layout
+        thumbnail_page: thumbnail_page
     }
 
     /*******************************************************
@@ -239,5 +240,6 @@ ApplicationWindow {
 
     footer: Ui.FooterToolBar {
         id: footer_tool_bar
+        thumbnail_queue_depth: application.thumbnail_scheduler.queue_depth
     }
 }
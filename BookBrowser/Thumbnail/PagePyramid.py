@@ -0,0 +1,462 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a multi-resolution tiled pyramid of a page image.
+
+The level 0 is the source image, the level *n* is downscaled by a factor 2**n, the last level fits
+in a tile.  Each level is cut in square tiles which are stored as PNG files in a cache directory,
+thus a viewer only decodes the tiles of the level matching its scale which are visible.
+
+"""
+
+####################################################################################################
+
+__all__ = ['PagePyramid', 'PagePyramidCache']
+
+####################################################################################################
+
+from contextlib import contextmanager
+from pathlib import Path
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+
+from PIL import Image
+
+from BookBrowser.Common.Path import user_cache_path
+from BookBrowser.Common.Singleton import SingletonMetaClass
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class PagePyramid:
+
+    TILE_SIZE = 512
+    METADATA_FILENAME = 'pyramid.json'
+
+    # Fast compression, tiles are written once and read many times but they are numerous
+    PNG_COMPRESS_LEVEL = 1
+
+    _logger = _module_logger.getChild('PagePyramid')
+
+    ##############################################
+
+    def __init__(self, cache, path, mtime):
+
+        self._cache = cache
+        self._source_path = Path(path)
+        self._mtime = int(mtime)
+        self._key = cache.make_key(path)
+        self._path = cache.path.joinpath(self._key)
+        self._lock = threading.Lock()
+        # number of threads reading the tiles, the pyramid is not evicted meanwhile
+        self._number_of_readers = 0
+        self._size = None
+        self._is_built = self._load_metadata()
+        if self._is_built:
+            self.touch()
+
+    ##############################################
+
+    @property
+    def source_path(self):
+        return self._source_path
+
+    @property
+    def mtime(self):
+        return self._mtime
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def is_built(self):
+        return self._is_built
+
+    ##############################################
+
+    def touch(self):
+        """Update the access time used by the eviction of the cache"""
+        try:
+            os.utime(str(self._path))
+        except OSError:
+            pass
+        self._cache._use(self._key)
+
+    def _invalidate(self):
+        """Mark the pyramid as not built before it is evicted, return False if its tiles are read"""
+        with self._lock:
+            if self._number_of_readers:
+                return False
+            self._is_built = False
+            return True
+
+    ##############################################
+
+    @contextmanager
+    def read_tiles(self):
+
+        """Context manager which returns True if the tiles can be read, the pyramid is not evicted
+        until the context is exited.
+
+        """
+
+        with self._lock:
+            is_built = self._is_built
+            if is_built:
+                self._number_of_readers += 1
+        try:
+            yield is_built
+        finally:
+            if is_built:
+                with self._lock:
+                    self._number_of_readers -= 1
+
+    ##############################################
+
+    def _load_metadata(self):
+        try:
+            with open(str(self._path.joinpath(self.METADATA_FILENAME))) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if data.get('mtime', None) != self._mtime or data.get('tile_size', None) != self.TILE_SIZE:
+            return False
+        self._size = (data['width'], data['height'])
+        return True
+
+    ##############################################
+
+    @property
+    def size(self):
+        if self._size is None:
+            # only read the header
+            with Image.open(str(self._source_path)) as image:
+                self._size = image.size
+        return self._size
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    ##############################################
+
+    @property
+    def number_of_levels(self):
+        largest_side = max(self.size)
+        if largest_side <= self.TILE_SIZE:
+            return 1
+        return int(math.ceil(math.log2(largest_side / self.TILE_SIZE))) + 1
+
+    def level_size(self, level):
+        scale = 2**level
+        width, height = self.size
+        return max(1, width // scale), max(1, height // scale)
+
+    def level_grid(self, level):
+        """Return the number of tile rows and columns of *level*"""
+        width, height = self.level_size(level)
+        return int(math.ceil(height / self.TILE_SIZE)), int(math.ceil(width / self.TILE_SIZE))
+
+    ##############################################
+
+    def level_for_size(self, width, height):
+
+        """Return the smallest level which is not smaller than the size *width* x *height*, a zero
+        dimension is ignored.
+
+        """
+
+        scales = []
+        if width > 0:
+            scales.append(width / self.width)
+        if height > 0:
+            scales.append(height / self.height)
+        if not scales:
+            return 0
+        scale = min(scales)
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / scale)))
+        return min(level, self.number_of_levels - 1)
+
+    ##############################################
+
+    def tile_path(self, level, row, column):
+        return self._path.joinpath('{}-{}-{}.png'.format(level, row, column))
+
+    def tile_box(self, level, row, column):
+        """Return the box of a tile in the coordinates of its level"""
+        width, height = self.level_size(level)
+        x = column * self.TILE_SIZE
+        y = row * self.TILE_SIZE
+        return x, y, min(x + self.TILE_SIZE, width), min(y + self.TILE_SIZE, height)
+
+    ##############################################
+
+    def build(self):
+
+        """Decode the source image once and write the tiles of all the levels"""
+
+        with self._lock:
+            # an other thread could have built it
+            if self._is_built:
+                return
+            self._logger.info('Build page pyramid for {}'.format(self._source_path))
+
+            if self._path.exists():
+                shutil.rmtree(str(self._path), ignore_errors=True)
+            self._path.mkdir(parents=True)
+
+            with Image.open(str(self._source_path)) as image:
+                image.load()
+                self._size = image.size
+                disk_size = 0
+                for level in range(self.number_of_levels):
+                    if level:
+                        # each level is derived from the previous one
+                        image = image.resize(self.level_size(level), Image.BOX)
+                    disk_size += self._save_tiles(image, level)
+
+            # written at the end, thus an interrupted build is not seen as built
+            data = dict(
+                mtime=self._mtime,
+                tile_size=self.TILE_SIZE,
+                width=self.width,
+                height=self.height,
+                disk_size=disk_size,
+            )
+            with open(str(self._path.joinpath(self.METADATA_FILENAME)), 'w') as fh:
+                json.dump(data, fh)
+            self._is_built = True
+
+        self._cache._add(self._key, disk_size)
+        self._cache.evict(keep=self._key)
+
+    ##############################################
+
+    def _save_tiles(self, image, level):
+        """Save the tiles of *level* and return their size on disk"""
+        disk_size = 0
+        number_of_rows, number_of_columns = self.level_grid(level)
+        for row in range(number_of_rows):
+            for column in range(number_of_columns):
+                tile = image.crop(self.tile_box(level, row, column))
+                tile_path = str(self.tile_path(level, row, column))
+                tile.save(tile_path, 'PNG', compress_level=self.PNG_COMPRESS_LEVEL)
+                disk_size += os.stat(tile_path).st_size
+        return disk_size
+
+####################################################################################################
+
+class PagePyramidCache(metaclass=SingletonMetaClass):
+
+    """Class to store the page pyramids in the user cache directory.
+
+    When the size of the cache exceeds *disk_budget* after a build, the least recently used pyramids
+    are removed, a pyramid is used when it is loaded or built.  The size of a pyramid is recorded in
+    its metadata at build time, thus the cache directory is only walked once to load the sizes.
+
+    """
+
+    # suffix of a directory which is evicted, it is renamed before it is removed
+    EVICTED_SUFFIX = '.evicted'
+
+    # the tiles of a 600 dpi A4 scan require a few tens of MB
+    DISK_BUDGET = 2 * 1024**3
+
+    _logger = _module_logger.getChild('PagePyramidCache')
+
+    ##############################################
+
+    def __init__(self, disk_budget=None):
+
+        self._path = user_cache_path('book-browser', 'page-pyramids')
+        self._disk_budget = disk_budget or self.DISK_BUDGET
+        self._pyramids = {}
+        self._lock = threading.Lock()
+        # key -> [access time, disk size] of the pyramids on disk, loaded on demand
+        self._entries = None
+        self._eviction_lock = threading.Lock()
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def disk_budget(self):
+        return self._disk_budget
+
+    ##############################################
+
+    @classmethod
+    def make_key(cls, path):
+        uri = 'file://' + str(Path(path).resolve())
+        return hashlib.md5(uri.encode('utf-8')).hexdigest()
+
+    ##############################################
+
+    def get(self, path, mtime):
+
+        """Return the :class:`PagePyramid` instance for the image *path*, a new instance is made if
+        *mtime* changed.
+
+        """
+
+        key = self.make_key(path)
+        with self._lock:
+            pyramid = self._pyramids.get(key, None)
+            if pyramid is None or pyramid.mtime != int(mtime):
+                pyramid = PagePyramid(self, path, mtime)
+                self._pyramids[key] = pyramid
+        return pyramid
+
+    ##############################################
+
+    @staticmethod
+    def _directory_size(path):
+        size = 0
+        with os.scandir(str(path)) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+        return size
+
+    ##############################################
+
+    def _load_entries(self):
+
+        """Load the access time and the size of the pyramids on disk, the eviction lock must be held
+        by the caller.
+
+        """
+
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        try:
+            with os.scandir(str(self._path)) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.name.endswith(self.EVICTED_SUFFIX):
+                        # an interrupted eviction
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        continue
+                    try:
+                        with open(os.path.join(entry.path, PagePyramid.METADATA_FILENAME)) as fh:
+                            disk_size = json.load(fh)['disk_size']
+                    except (OSError, ValueError, KeyError):
+                        # an interrupted build
+                        disk_size = self._directory_size(entry.path)
+                    access_time = entry.stat(follow_symlinks=False).st_mtime
+                    self._entries[entry.name] = [access_time, disk_size]
+        except FileNotFoundError:
+            pass
+        return self._entries
+
+    @property
+    def disk_size(self):
+        with self._eviction_lock:
+            return sum(disk_size for access_time, disk_size in self._load_entries().values())
+
+    def _add(self, key, disk_size):
+        with self._eviction_lock:
+            self._load_entries()[key] = [time.time(), disk_size]
+
+    def _use(self, key):
+        with self._eviction_lock:
+            entry = self._load_entries().get(key, None)
+            if entry is not None:
+                entry[0] = time.time()
+
+    ##############################################
+
+    def evict(self, keep=None):
+
+        """Remove the least recently used pyramids until the cache fits in the disk budget, the
+        pyramid *keep* and the pyramids which are read are not removed.  Return the number of
+        removed pyramids.
+
+        """
+
+        with self._eviction_lock:
+            entries = self._load_entries()
+            total_size = sum(disk_size for access_time, disk_size in entries.values())
+            victims = []
+            for key, (access_time, disk_size) in sorted(entries.items(), key=lambda item: item[1][0]):
+                if total_size <= self._disk_budget:
+                    break
+                if key != keep:
+                    victims.append((key, entries.pop(key)))
+                    total_size -= disk_size
+
+        counter = 0
+        for key, entry in victims:
+            path = self._path.joinpath(key)
+            with self._lock:
+                pyramid = self._pyramids.get(key, None)
+                if pyramid is not None and not pyramid._invalidate():
+                    # its tiles are read, it will be evicted later
+                    with self._eviction_lock:
+                        self._entries[key] = entry
+                    continue
+                self._pyramids.pop(key, None)
+                # a new instance must not load the metadata of a directory which is removed
+                evicted_path = path.with_name(key + self.EVICTED_SUFFIX)
+                try:
+                    os.rename(str(path), str(evicted_path))
+                except OSError:
+                    evicted_path = path
+            shutil.rmtree(str(evicted_path), ignore_errors=True)
+            counter += 1
+
+        if counter:
+            self._logger.info('Evicted {} page pyramids, cache size is {:.1f} MB'.format(counter, self.disk_size / 1024**2))
+        return counter
+
+    ##############################################
+
+    def clear_cache(self):
+        self._logger.info('Clear page pyramid cache {}'.format(self._path))
+        with self._lock:
+            self._pyramids.clear()
+        with self._eviction_lock:
+            self._entries = None
+        shutil.rmtree(str(self._path), ignore_errors=True)
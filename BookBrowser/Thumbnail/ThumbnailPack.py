@@ -0,0 +1,248 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to implement a per-book thumbnail pack.
+
+A pack is a single file stored in the book directory which holds the PNG thumbnails of all the
+pages.  It is memory mapped, thus a thumbnail is read without opening a file per page.
+
+File layout, integers are little endian::
+
+    header: magic, version, number of entries
+    index:  for each entry, page number, page mtime, offset, length, filename length, filename
+    data:   PNG blobs
+
+"""
+
+####################################################################################################
+
+__all__ = ['ThumbnailPack']
+
+####################################################################################################
+
+from pathlib import Path
+import logging
+import mmap
+import os
+import struct
+
+from . import FreeDesktopThumbnailCache
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class ThumbnailPackEntry:
+
+    __slots__ = ('filename', 'page_number', 'mtime', 'offset', 'length')
+
+    ##############################################
+
+    def __init__(self, filename, page_number, mtime, offset, length):
+
+        self.filename = filename
+        self.page_number = page_number
+        self.mtime = mtime
+        self.offset = offset
+        self.length = length
+
+####################################################################################################
+
+class ThumbnailPack:
+
+    """Class to read and build the thumbnail pack of a book.
+
+    A pack entry is valid as long as the mtime of the page doesn't change.
+
+    """
+
+    PACK_FILENAME = '.book-thumbnails.pack'
+
+    MAGIC = b'BBTP'
+    VERSION = 1
+
+    _HEADER = struct.Struct('<4sII')
+    _ENTRY = struct.Struct('<IqQIH')
+
+    _logger = _module_logger.getChild('ThumbnailPack')
+
+    ##############################################
+
+    @classmethod
+    def make_pack_path(cls, book_path):
+        return Path(str(book_path)).joinpath(cls.PACK_FILENAME)
+
+    ##############################################
+
+    def __init__(self, book_path):
+
+        self._path = self.make_pack_path(book_path)
+        self._mmap = None
+        self._entries = {}
+        self._page_numbers = {}
+        self.open()
+
+    ##############################################
+
+    @property
+    def path(self):
+        return self._path
+
+    ##############################################
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    ##############################################
+
+    def open(self):
+
+        """Map the pack file if it exists, a corrupted pack is ignored"""
+
+        self.close()
+        try:
+            with open(str(self._path), 'rb') as fh:
+                # the mapping stays valid after the file is closed
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError is raised for an empty file
+            return
+        try:
+            self._read_index()
+        except (struct.error, ValueError) as exception:
+            self._logger.warning('Invalid thumbnail pack {}\n{}'.format(self._path, exception))
+            self.close()
+
+    ##############################################
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._entries = {}
+        self._page_numbers = {}
+
+    ##############################################
+
+    def _read_index(self):
+
+        magic, version, number_of_entries = self._HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('Wrong magic or version')
+
+        position = self._HEADER.size
+        for i in range(number_of_entries):
+            page_number, mtime, offset, length, filename_length = self._ENTRY.unpack_from(self._mmap, position)
+            position += self._ENTRY.size
+            filename = self._mmap[position:position + filename_length].decode('utf-8')
+            position += filename_length
+            if offset + length > len(self._mmap):
+                raise ValueError('Truncated pack')
+            entry = ThumbnailPackEntry(filename, page_number, mtime, offset, length)
+            self._entries[filename] = entry
+            self._page_numbers[page_number] = entry
+
+    ##############################################
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return self._mmap is not None
+
+    ##############################################
+
+    def has_page(self, page):
+        """Test if the pack has an up to date thumbnail for the :class:`BookPage` *page*"""
+        entry = self._entries.get(page.filename, None)
+        return entry is not None and entry.mtime == int(page.mtime) and entry.page_number == int(page)
+
+    ##############################################
+
+    def _data(self, entry):
+        if entry is None or self._mmap is None:
+            return None
+        # slicing makes a copy, thus the data stays valid when the pack is closed
+        return self._mmap[entry.offset:entry.offset + entry.length]
+
+    def get(self, filename, mtime=None):
+        """Return the PNG data for *filename* or None if it is missing or outdated"""
+        entry = self._entries.get(filename, None)
+        if entry is not None and mtime is not None and entry.mtime != int(mtime):
+            return None
+        return self._data(entry)
+
+    def page_data(self, page_number):
+        return self._data(self._page_numbers.get(page_number, None))
+
+    ##############################################
+
+    @classmethod
+    def build(cls, book, flavour=FreeDesktopThumbnailCache.LARGE):
+
+        """Build the thumbnail pack of a :class:`Book` from the thumbnail cache.
+
+        Entries of the previous pack which are up to date are reused, the missing thumbnails are
+        made.  The pack is written to a temporary file which is then renamed, thus a reader never
+        sees a partial pack.
+
+        Return the number of entries.
+
+        """
+
+        thumbnail_cache = FreeDesktopThumbnailCache()
+        path = cls.make_pack_path(book.path)
+        tmp_path = path.with_name(path.name + '.tmp')
+
+        blobs = []
+        with cls(book.path) as old_pack:
+            for page in book:
+                if page.is_empty:
+                    continue
+                data = old_pack.get(page.filename, page.mtime)
+                if data is None:
+                    thumbnail = thumbnail_cache.get(page.path, page.mtime)
+                    with open(str(thumbnail.flavour_thumbnail(flavour)), 'rb') as fh:
+                        data = fh.read()
+                blobs.append((page, data))
+
+        filenames = [page.filename.encode('utf-8') for page, data in blobs]
+        index_size = sum(cls._ENTRY.size + len(filename) for filename in filenames)
+        offset = cls._HEADER.size + index_size
+        index = bytearray()
+        for (page, data), filename in zip(blobs, filenames):
+            index += cls._ENTRY.pack(int(page), int(page.mtime), offset, len(data), len(filename))
+            index += filename
+            offset += len(data)
+
+        cls._logger.info('Write thumbnail pack {} with {} entries'.format(path, len(blobs)))
+        with open(str(tmp_path), 'wb') as fh:
+            fh.write(cls._HEADER.pack(cls.MAGIC, cls.VERSION, len(blobs)))
+            fh.write(index)
+            for page, data in blobs:
+                fh.write(data)
+        os.replace(str(tmp_path), str(path))
+
+        return len(blobs)
@@ -0,0 +1,170 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Module to generate the thumbnails of a whole book or library using a process pool.
+
+Decoding and resizing a scan is mostly done by Python code holding the GIL, thus the work is
+distributed to processes instead of threads.
+
+"""
+
+####################################################################################################
+
+__all__ = ['ThumbnailService']
+
+####################################################################################################
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+import threading
+
+from . import FreeDesktopThumbnailCache
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+def _make_thumbnails(path, flavours):
+
+    """Make the missing thumbnails for the image *path*, this function is run in a worker process.
+    Return the number of generated thumbnails.
+
+    """
+
+    thumbnail = FreeDesktopThumbnailCache()[path]
+    missing_flavours = thumbnail.missing_flavours(flavours)
+    # all the flavours are made from a single decode
+    thumbnail.make_thumbnails(missing_flavours)
+    return len(missing_flavours)
+
+####################################################################################################
+
+class ThumbnailService:
+
+    """Class to generate the thumbnails of all the pages of a book or a library.
+
+    By default the normal and large thumbnails are made, *extra_flavours* can be used to make
+    also the x-large and xx-large thumbnails.
+
+    The generation can be cancelled from another thread using :meth:`cancel`.
+
+    """
+
+    _logger = _module_logger.getChild('ThumbnailService')
+
+    ##############################################
+
+    def __init__(self, number_of_workers=None, extra_flavours=()):
+
+        self._number_of_workers = number_of_workers or os.cpu_count()
+        self._flavours = tuple(FreeDesktopThumbnailCache.DEFAULT_FLAVOURS) + tuple(extra_flavours)
+        self._cancel_event = threading.Event()
+
+    ##############################################
+
+    @property
+    def number_of_workers(self):
+        return self._number_of_workers
+
+    ##############################################
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    ##############################################
+
+    @classmethod
+    def iter_image_paths(cls, source):
+
+        """Yield the image paths of *source* which can be a :class:`Book`, a :class:`BookLibrary` or an
+        iterable of paths.
+
+        """
+
+        from BookBrowser.Book import Book, BookLibrary
+
+        if isinstance(source, BookLibrary):
+            if not len(source):
+                source.scan()
+            for book_cover in source:
+                book = Book(book_cover.path)
+                try:
+                    yield from cls.iter_image_paths(book)
+                finally:
+                    book.close()
+        elif isinstance(source, Book):
+            for page in source:
+                if not page.is_empty:
+                    yield str(page.path)
+        else:
+            for path in source:
+                yield str(path)
+
+    ##############################################
+
+    def make_thumbnails(self, source, progress_callback=None):
+
+        """Make the missing thumbnails for *source*, see :meth:`iter_image_paths`.
+
+        *progress_callback* is called with the number of processed images and the total number of
+        images each time an image is processed.
+
+        Return the number of generated thumbnails.
+
+        """
+
+        self._cancel_event.clear()
+
+        paths = list(self.iter_image_paths(source))
+        number_of_images = len(paths)
+        self._logger.info('Make thumbnails for {} images using {} processes'.format(
+            number_of_images, self._number_of_workers))
+
+        counter = 0
+        number_of_processed_images = 0
+        with ProcessPoolExecutor(max_workers=self._number_of_workers) as executor:
+            futures = {executor.submit(_make_thumbnails, path, self._flavours):path for path in paths}
+            try:
+                for future in as_completed(futures):
+                    if self.is_cancelled:
+                        break
+                    try:
+                        counter += future.result()
+                    except Exception as exception:
+                        self._logger.warning('Cannot make thumbnail for {}\n{}'.format(futures[future], exception))
+                    number_of_processed_images += 1
+                    if progress_callback is not None:
+                        progress_callback(number_of_processed_images, number_of_images)
+            except KeyboardInterrupt:
+                self.cancel()
+            if self.is_cancelled:
+                self._logger.info('Cancel thumbnail generation')
+                for future in futures:
+                    future.cancel()
+
+        self._logger.info('Generated {} thumbnails'.format(counter))
+        return counter
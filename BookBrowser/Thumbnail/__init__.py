@@ -29,15 +29,19 @@ __all__ = ['FreeDesktopThumbnailCache']
 
 ####################################################################################################
 
+from collections import OrderedDict
 from pathlib import Path
 import hashlib
 import logging
 import mimetypes
 import os
+import threading
 # import shutil
 
 from PIL import Image, PngImagePlugin
 
+from BookBrowser.Common.FileTools import file_watcher
+from BookBrowser.Common.Path import user_cache_path
 from BookBrowser.Common.Singleton import SingletonMetaClass
 
 ####################################################################################################
@@ -69,12 +73,16 @@ class FreeDesktopThumbnail:
 
     ##############################################
 
-    def __init__(self, cache, path):
+    def __init__(self, cache, path, mtime=None):
 
         self._cache = cache
         self._source_path = Path(path).resolve()
         self._filename = self.mangle_path(path)
-        self._stat = self._source_path.stat()
+        # stat is done on demand
+        self._stat = None
+        self._mtime = int(mtime) if mtime is not None else None
+        # cache the thumbnail existence checks
+        self._has_flavour = {}
 
     ##############################################
 
@@ -88,13 +96,21 @@ class FreeDesktopThumbnail:
 
     ##############################################
 
+    @property
+    def stat(self):
+        if self._stat is None:
+            self._stat = self._source_path.stat()
+        return self._stat
+
     @property
     def size(self):
-        return self._stat.st_size
+        return self.stat.st_size
 
     @property
     def mtime(self):
-        return int(self._stat.st_mtime)
+        if self._mtime is None:
+            self._mtime = int(self.stat.st_mtime)
+        return self._mtime
 
     @property
     def mime_type(self):
@@ -113,23 +129,36 @@ class FreeDesktopThumbnail:
     def thumbnail_path(self, is_normal=True):
         return self._cache.thumbnail_path(self._filename, is_normal)
 
+    def flavour_path(self, flavour):
+        return self._cache.flavour_thumbnail_path(self._filename, flavour)
+
     ##############################################
 
-    def _delete_thumbnail(self, is_normal=False):
-        path = self.thumbnail_path(is_normal)
+    def _delete_thumbnail(self, flavour):
+        path = self.flavour_path(flavour)
         if path.exists():
             self._logger.info('Delete thumbnail for {}'.format(self._source_path))
             os.unlink(path)
 
 
+    def forget_flavours(self):
+        """Forget the thumbnails known to exist, they are checked again on the next request"""
+        self._has_flavour.clear()
+
     def delete_thumbnail(self):
-        for is_normal in (False, True):
-            self._delete_thumbnail(is_normal)
+        self._has_flavour.clear()
+        for flavour in self._cache.FLAVOURS:
+            self._delete_thumbnail(flavour)
 
     ##############################################
 
     def has_thumbnail(self, is_normal=True):
-        path = self.thumbnail_path(is_normal)
+        return self.has_flavour(self._cache.to_flavour(is_normal))
+
+    def has_flavour(self, flavour):
+        if self._has_flavour.get(flavour, False):
+            return True
+        path = self.flavour_path(flavour)
         if path.exists():
             stat = path.stat()
             thumbnail_size = int(stat.st_size)
@@ -137,6 +166,7 @@ class FreeDesktopThumbnail:
             if not thumbnail_size or thumbnail_mtime < self.mtime:
                 self.delete_thumbnail()
             else:
+                self._has_flavour[flavour] = True
                 return True
         return False
 
@@ -175,35 +205,54 @@ class FreeDesktopThumbnail:
 
     ##############################################
 
-    def _make_thumbnail(self, dst_path, size):
+    def make_thumbnails(self, flavours=None):
 
-        image = Image.open(str(self._source_path))
-        image.thumbnail((size, size), resample=self.SAMPLING)
-        png_info = self._make_png_info()
-        image.save(str(dst_path), 'PNG', pnginfo=png_info)
+        """Make the thumbnails for *flavours* from a single decode of the source image.
 
-    ##############################################
+        The largest thumbnail is made first, then each smaller one is derived from the previous
+        one.  For a JPEG source, the image is decoded directly at a reduced scale.
 
-    def _make_normal_thumbnail(self):
-        self._make_thumbnail(self.normal_path, self._cache.NORMAL_SIZE)
+        """
 
-    def _make_large_thumbnail(self):
-        self._make_thumbnail(self.large_path, self._cache.LARGE_SIZE)
+        if flavours is None:
+            flavours = self._cache.DEFAULT_FLAVOURS
+        flavours = sorted(flavours, key=self._cache.flavour_size, reverse=True)
+        if not flavours:
+            return
 
-    def _make_xxx_thumbnail(self, is_normal=True):
-        if is_normal:
-            self._make_normal_thumbnail()
-        else:
-            self._make_large_thumbnail()
+        png_info = self._make_png_info()
+        with Image.open(str(self._source_path)) as image:
+            largest_size = self._cache.flavour_size(flavours[0])
+            # Only supported by JPEG, it is a no-op for other formats
+            image.draft(None, (largest_size, largest_size))
+            for flavour in flavours:
+                size = self._cache.flavour_size(flavour)
+                # resize in place, thus the next thumbnail is derived from this one
+                image.thumbnail((size, size), resample=self.SAMPLING)
+                image.save(str(self.flavour_path(flavour)), 'PNG', pnginfo=png_info)
+                self._has_flavour[flavour] = True
 
     ##############################################
 
-    def thumbnail(self, is_normal=True):
+    def missing_flavours(self, flavours=None):
+        if flavours is None:
+            flavours = self._cache.DEFAULT_FLAVOURS
+        return [flavour for flavour in flavours if not self.has_flavour(flavour)]
+
+    ##############################################
+
+    def flavour_thumbnail(self, flavour):
         # Fixme: mangle x3
-        if not self.has_thumbnail(is_normal):
+        if not self.has_flavour(flavour):
             self._logger.info('Make thumbnail for {}'.format(self._source_path))
-            self._make_xxx_thumbnail(is_normal)
-        return self.thumbnail_path(is_normal)
+            # Make the other missing default flavours at the same time
+            flavours = set(self.missing_flavours())
+            flavours.add(flavour)
+            self.make_thumbnails(flavours)
+        return self.flavour_path(flavour)
+
+    def thumbnail(self, is_normal=True):
+        return self.flavour_thumbnail(self._cache.to_flavour(is_normal))
 
     @property
     def normal(self):
@@ -221,20 +270,57 @@ class FreeDesktopThumbnailCache(metaclass=SingletonMetaClass):
 
     NORMAL_SIZE = 128
     LARGE_SIZE = 256
+    X_LARGE_SIZE = 512
+    XX_LARGE_SIZE = 1024
+
+    NORMAL = 'normal'
+    LARGE = 'large'
+    X_LARGE = 'x-large'
+    XX_LARGE = 'xx-large'
+
+    # Flavour name is also the directory name
+    FLAVOURS = {
+        NORMAL: NORMAL_SIZE,
+        LARGE: LARGE_SIZE,
+        X_LARGE: X_LARGE_SIZE,
+        XX_LARGE: XX_LARGE_SIZE,
+    }
+
+    DEFAULT_FLAVOURS = (NORMAL, LARGE)
+
+    # Maximum number of thumbnail instances kept in memory
+    LRU_SIZE = 4096
 
     _logger = _module_logger.getChild('FreeDesktopThumbnailCache')
 
     ##############################################
 
+    @classmethod
+    def flavour_size(cls, flavour):
+        return cls.FLAVOURS[flavour]
+
+    @classmethod
+    def to_flavour(cls, is_normal):
+        return cls.NORMAL if is_normal else cls.LARGE
+
+    ##############################################
+
     def __init__(self):
 
-        self._path = Path.home().joinpath('.cache', 'thumbnails')
-        self._normal_path = self._path.joinpath('normal')
-        self._large_path = self._path.joinpath('large')
+        self._path = user_cache_path('thumbnails')
+        self._flavour_paths = {flavour:self._path.joinpath(flavour) for flavour in self.FLAVOURS}
+        self._normal_path = self._flavour_paths[self.NORMAL]
+        self._large_path = self._flavour_paths[self.LARGE]
 
-        for path in (self._path, self._normal_path, self._large_path):
+        for path in (self._normal_path, self._large_path):
             if not path.exists():
-                os.mkdir(path)
+                path.mkdir(parents=True, exist_ok=True)
+        self._created_flavours = set(self.DEFAULT_FLAVOURS)
+
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        file_watcher.add_rename_listener(self._on_rename)
+        file_watcher.add_delete_listener(self.invalidate)
 
     ##############################################
 
@@ -260,13 +346,17 @@ class FreeDesktopThumbnailCache(metaclass=SingletonMetaClass):
 
     ##############################################
 
-    def thumbnail_path(self, path, is_normal=True):
-        if is_normal:
-            cache_path = self._normal_path
-        else:
-            cache_path = self._large_path
+    def flavour_thumbnail_path(self, path, flavour):
+        cache_path = self._flavour_paths[flavour]
+        # extra flavours are optional, create the directory on demand
+        if flavour not in self._created_flavours:
+            cache_path.mkdir(parents=True, exist_ok=True)
+            self._created_flavours.add(flavour)
         return cache_path.joinpath(path)
 
+    def thumbnail_path(self, path, is_normal=True):
+        return self.flavour_thumbnail_path(path, self.to_flavour(is_normal))
+
     def normal_thumbnail_path(self, path):
         return self.thumbnail_path(path, True)
 
@@ -275,5 +365,43 @@ class FreeDesktopThumbnailCache(metaclass=SingletonMetaClass):
 
     ##############################################
 
+    def get(self, path, mtime=None):
+
+        """Return the :class:`FreeDesktopThumbnail` instance for the image *path*.
+
+        Instances are kept in a bounded LRU cache.  If *mtime* is given and differs from the one of
+        the cached instance, a new instance is made.  Entries are invalidated when the file watcher
+        reports a rename or a deletion.
+
+        """
+
+        key = str(path)
+        with self._lru_lock:
+            thumbnail = self._lru.get(key, None)
+            if thumbnail is not None and (mtime is None or thumbnail.mtime == int(mtime)):
+                self._lru.move_to_end(key)
+                return thumbnail
+
+        thumbnail = FreeDesktopThumbnail(self, path, mtime)
+
+        with self._lru_lock:
+            self._lru[key] = thumbnail
+            if len(self._lru) > self.LRU_SIZE:
+                self._lru.popitem(last=False)
+        return thumbnail
+
     def __getitem__(self, path):
-        return FreeDesktopThumbnail(self, path)
+        return self.get(path)
+
+    ##############################################
+
+    def invalidate(self, path):
+        with self._lru_lock:
+            thumbnail = self._lru.pop(str(path), None)
+        if thumbnail is not None:
+            # the instance can still be referenced by a caller
+            thumbnail.forget_flavours()
+
+    def _on_rename(self, old_path, new_path):
+        self.invalidate(old_path)
+        self.invalidate(new_path)
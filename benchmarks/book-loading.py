@@ -0,0 +1,141 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Benchmark the loading of a book.
+
+The file system calls done by Python are counted by wrapping the functions of the :mod:`os`
+module, a :class:`os.DirEntry` is wrapped to count its stat calls.
+
+Usage: python benchmarks/book-loading.py [--number-of-pages 1000] [--book-path PATH]
+
+"""
+
+####################################################################################################
+
+from pathlib import Path
+import argparse
+import collections
+import logging
+import os
+import tempfile
+import time
+
+####################################################################################################
+
+counters = collections.Counter()
+
+def _counted(name, function):
+    def wrapper(*args, **kwargs):
+        counters[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+class _DirEntry:
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def stat(self, *args, **kwargs):
+        # DirEntry.stat caches the result, only the first call is a system call on Unix
+        if not hasattr(self, '_stat'):
+            counters['DirEntry.stat'] += 1
+            self._stat = self._entry.stat(*args, **kwargs)
+        return self._stat
+
+class _ScandirIterator:
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+
+    def __iter__(self):
+        return (_DirEntry(entry) for entry in self._iterator)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._iterator.close()
+
+    def close(self):
+        self._iterator.close()
+
+def _scandir(*args, **kwargs):
+    counters['scandir'] += 1
+    return _ScandirIterator(_os_scandir(*args, **kwargs))
+
+_os_scandir = os.scandir
+
+def install_counters():
+    for name in ('stat', 'lstat', 'listdir'):
+        setattr(os, name, _counted(name, getattr(os, name)))
+    os.scandir = _scandir
+
+####################################################################################################
+
+def make_book(path, number_of_pages):
+    from PIL import Image
+    image = Image.new('L', (10, 10), 255)
+    image.save(str(path.joinpath('book.001.png')))
+    data = path.joinpath('book.001.png').read_bytes()
+    for i in range(2, number_of_pages + 1):
+        path.joinpath('book.{:04}.png'.format(i)).write_bytes(data)
+
+####################################################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the loading of a book')
+    parser.add_argument('--number-of-pages', type=int, default=1000)
+    parser.add_argument('--book-path', default=None, help='use an existing book')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+        if args.book_path:
+            book_path = Path(args.book_path)
+        else:
+            book_path = Path(tmp_directory)
+            make_book(book_path, args.number_of_pages)
+
+        from BookBrowser.Book import Book
+        # the metadata file is written by the first load
+        Book(book_path)
+
+        install_counters()
+        start_time = time.perf_counter()
+        book = Book(book_path)
+        elapsed_time = time.perf_counter() - start_time
+
+        print('Book with {} pages loaded in {:.1f} ms'.format(book.number_of_pages, elapsed_time * 1000))
+        for name, count in sorted(counters.items()):
+            print('  {:15} {:6}'.format(name, count))
+        print('  {:15} {:6}'.format('total', sum(counters.values())))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Benchmark the OCR time and accuracy of the preprocessing pipelines on the pages of a book.
+
+For each pipeline, the preprocessing time and the Tesseract time are measured separately, the page
+images are decoded before.  The accuracy is the similarity ratio of :class:`difflib.SequenceMatcher`
+to the reference texts if a directory of texts named as the page images with a *.txt* extension is
+given, else to the texts recognised on the raw images.
+
+Require tesserocr and OpenCV.
+
+Usage: python benchmarks/ocr-preprocessing.py BOOK_PATH [--number-of-pages 10] [--language French]
+       [--reference-path TEXT_DIRECTORY]
+
+"""
+
+####################################################################################################
+
+from pathlib import Path
+import argparse
+import difflib
+import logging
+import time
+
+####################################################################################################
+
+def make_pipelines(target_dpi):
+
+    from BookBrowser.OCR.Preprocessing import OcrPreprocessor
+
+    return (
+        ('raw', None),
+        ('gray', OcrPreprocessor(target_dpi=None, binarise=False, crop_margins=False)),
+        ('gray+dpi', OcrPreprocessor(target_dpi=target_dpi, binarise=False, crop_margins=False)),
+        ('gray+dpi+otsu', OcrPreprocessor(target_dpi=target_dpi, crop_margins=False)),
+        ('gray+dpi+otsu+crop', OcrPreprocessor(target_dpi=target_dpi)),
+        ('gray+dpi+otsu+close+crop', OcrPreprocessor(target_dpi=target_dpi, denoise_radius=1)),
+    )
+
+####################################################################################################
+
+def similarity(text, reference):
+    return difflib.SequenceMatcher(None, text, reference, autojunk=False).ratio()
+
+####################################################################################################
+
+def benchmark(book_path, number_of_pages, language, reference_path, target_dpi):
+
+    from BookBrowser.Book import Book
+    from BookBrowser.OCR import OcrEngine
+
+    engine = OcrEngine(number_of_apis=1)
+    book = Book(book_path)
+    pages = [page for page in book if not page.is_empty][:number_of_pages]
+    images = [(page, page.image, page.dpi) for page in pages]
+
+    # the first call loads the traineddata
+    engine.preprocessor = None
+    engine.image_to_text(images[0][1], language)
+
+    references = None
+    if reference_path is not None:
+        references = [Path(reference_path).joinpath(page.path.stem + '.txt').read_text() for page in pages]
+
+    print('{} pages of {} at {} dpi'.format(len(pages), book_path, images[0][2]))
+    print('{:26} {:>12} {:>12} {:>12} {:>10}'.format('pipeline', 'preprocess', 'tesseract', 'pixels', 'accuracy'))
+    for name, preprocessor in make_pipelines(target_dpi):
+        preprocess_time = 0
+        ocr_time = 0
+        number_of_pixels = 0
+        texts = []
+        for page, image, dpi in images:
+            start_time = time.perf_counter()
+            if preprocessor is not None:
+                image, dpi = preprocessor.process(image, dpi)
+            preprocess_time += time.perf_counter() - start_time
+            number_of_pixels += image.shape[0] * image.shape[1]
+            start_time = time.perf_counter()
+            texts.append(engine.image_to_text(image, language, dpi=dpi) or '')
+            ocr_time += time.perf_counter() - start_time
+        if references is None:
+            # the raw texts are the reference
+            references = texts
+        accuracy = sum(similarity(text, reference) for text, reference in zip(texts, references)) / len(texts)
+        number_of_pages = len(images)
+        print('{:26} {:9.0f} ms {:9.0f} ms {:9.2f} Mp {:9.1%}'.format(
+            name,
+            preprocess_time / number_of_pages * 1000,
+            ocr_time / number_of_pages * 1000,
+            number_of_pixels / number_of_pages / 1e6,
+            accuracy,
+        ))
+
+####################################################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the OCR preprocessing pipelines')
+    parser.add_argument('book_path')
+    parser.add_argument('--number-of-pages', type=int, default=10)
+    parser.add_argument('--language', default='French')
+    parser.add_argument('--reference-path', default=None)
+    parser.add_argument('--target-dpi', type=int, default=300)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    benchmark(args.book_path, args.number_of_pages, args.language, args.reference_path, args.target_dpi)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    main()
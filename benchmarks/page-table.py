@@ -0,0 +1,99 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""Benchmark the construction time and the memory of the page table of a large book.
+
+The pages are empty files, since only the directory and the file names are read to build a book.
+The memory is measured with :mod:`tracemalloc`.
+
+Usage: python benchmarks/page-table.py [--number-of-pages 20000 50000]
+
+"""
+
+####################################################################################################
+
+from pathlib import Path
+import argparse
+import gc
+import logging
+import tempfile
+import time
+import tracemalloc
+
+####################################################################################################
+
+def make_book(path, number_of_pages):
+    for i in range(1, number_of_pages + 1):
+        path.joinpath('book.{:06}.r.png'.format(i)).touch()
+
+####################################################################################################
+
+def benchmark(number_of_pages):
+
+    from BookBrowser.Book import Book
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+        book_path = Path(tmp_directory)
+        make_book(book_path, number_of_pages)
+        # the metadata file is written by the first load
+        Book(book_path)
+
+        gc.collect()
+        start_time = time.perf_counter()
+        book = Book(book_path)
+        elapsed_time = time.perf_counter() - start_time
+        del book
+
+        gc.collect()
+        tracemalloc.start()
+        book = Book(book_path)
+        memory_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # the usual access pattern of the tool, all the pages are visited
+        start_time = time.perf_counter()
+        for page in book:
+            page.filename, page.page_number, page.orientation, page.mtime
+        iteration_time = time.perf_counter() - start_time
+
+        print('{:6} pages: construction {:7.1f} ms, memory {:6.1f} MB ({:4.0f} bytes/page), iteration {:6.1f} ms'.format(
+            number_of_pages,
+            elapsed_time * 1000,
+            memory_size / 1024**2,
+            memory_size / number_of_pages,
+            iteration_time * 1000,
+        ))
+
+####################################################################################################
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the page table of a large book')
+    parser.add_argument('--number-of-pages', type=int, nargs='+', default=(20000, 50000))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for number_of_pages in args.number_of_pages:
+        benchmark(number_of_pages)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    main()
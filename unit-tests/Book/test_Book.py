@@ -0,0 +1,95 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+import json
+import tempfile
+import unittest
+
+from PIL import Image
+
+from BookBrowser.Book import Book
+
+####################################################################################################
+
+class TestBook(unittest.TestCase):
+
+    ##############################################
+
+    def test_rename_pages(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            path = Path(tmp_directory)
+            for i in range(1, 4):
+                Image.new('L', (10, 10), 255).save(str(path.joinpath('book.{}.png'.format(i))))
+
+            book = Book(tmp_directory)
+            book.rename_pages([(page, dict(orientation='r')) for page in book])
+            filenames = ['book.1.r.png', 'book.2.r.png', 'book.3.r.png']
+            self.assertEqual([page.filename for page in book], filenames)
+            self.assertFalse(book.rename_journal_path.exists())
+
+            # simulate an interrupted batch
+            path.joinpath('book.1.r.png').rename(path.joinpath('book.1.x.png'))
+            with open(str(book.rename_journal_path), 'w') as fh:
+                json.dump([('book.1.x.png', 'book.1.v.png'), ('book.2.x.png', 'book.2.v.png')], fh)
+            book = Book(tmp_directory)
+            self.assertEqual([page.filename for page in book], ['book.1.v.png'] + filenames[1:])
+            self.assertFalse(book.rename_journal_path.exists())
+
+    ##############################################
+
+    def test_rename_pages_overlap(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            path = Path(tmp_directory)
+            for i in range(1, 4):
+                Image.new('L', (10*i, 10), 255).save(str(path.joinpath('book.{}.r.png'.format(i))))
+
+            book = Book(tmp_directory)
+            page1, page2, page3 = book
+
+            # a target which is an existing page not renamed by the batch
+            with self.assertRaises(FileExistsError):
+                book.rename_pages([(page3, dict(file_index=1))])
+            # two pages with the same target
+            with self.assertRaises(FileExistsError):
+                book.rename_pages([(page1, dict(orientation='v')), (page2, dict(file_index=1, orientation='v'))])
+            # the pages are unchanged
+            self.assertEqual([(page.filename, page.orientation) for page in book],
+                             [('book.1.r.png', 'r'), ('book.2.r.png', 'r'), ('book.3.r.png', 'r')])
+
+            # swap two pages
+            book.rename_pages([(page1, dict(file_index=2)), (page2, dict(file_index=1, orientation='v'))])
+            self.assertEqual((page1.filename, page1.file_index), ('book.2.r.png', 2))
+            self.assertEqual((page2.filename, page2.orientation), ('book.1.v.png', 'v'))
+            self.assertEqual(sorted(path.glob('book.*')), [path.joinpath(filename) for filename in
+                                                           ('book.1.v.png', 'book.2.r.png', 'book.3.r.png')])
+            self.assertEqual(page1.size, (10, 10))
+            self.assertFalse(book.rename_journal_path.exists())
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
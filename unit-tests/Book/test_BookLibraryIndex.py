@@ -0,0 +1,104 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from BookBrowser.Book.BookLibrary import BookCover, BookLibrary
+from BookBrowser.Book.BookLibraryIndex import BookLibraryIndex
+from BookBrowser.Book.BookLibraryScanner import BookLibraryScanner
+from BookBrowser.Book.BookMetadata import BookMetadata
+
+####################################################################################################
+
+class TestBookLibraryIndex(unittest.TestCase):
+
+    ##############################################
+
+    def _make_book(self, library_path, name, title):
+        book_path = Path(library_path).joinpath(name)
+        book_path.mkdir()
+        metadata = BookMetadata(path=book_path, title=title)
+        metadata.save_json(BookMetadata.make_json_path(book_path))
+        return book_path
+
+    ##############################################
+
+    def test(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            book1_path = self._make_book(tmp_directory, 'book1', 'B title')
+            self._make_book(tmp_directory, 'book2', 'A title')
+
+            library = BookLibrary(tmp_directory)
+            library.scan()
+            self.assertEqual([book.title for book in library], ['A title', 'B title'])
+            self.assertIsNone(library._books[0]._metadata)
+            self.assertEqual(library._books[0].metadata.title, 'A title')
+
+            with BookLibraryIndex(tmp_directory) as index:
+                self.assertEqual(len(index), 2)
+
+            # a rescan must not duplicate the books
+            library.scan()
+            self.assertEqual(len(library), 2)
+
+            for path in book1_path.iterdir():
+                path.unlink()
+            book1_path.rmdir()
+            library.scan()
+            self.assertEqual(len(library), 1)
+            with BookLibraryIndex(tmp_directory) as index:
+                self.assertEqual(list(index.entries().keys()), [str(Path(tmp_directory).resolve().joinpath('book2'))])
+
+    ##############################################
+
+    def test_symlinks(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory, tempfile.TemporaryDirectory() as external_directory:
+
+            library_path = Path(tmp_directory).resolve()
+            shelf_path = library_path.joinpath('shelf')
+            shelf_path.mkdir()
+            self._make_book(shelf_path, 'book1', 'A title')
+            self._make_book(external_directory, 'book2', 'B title')
+            # a symlink to a book outside the library and a loop
+            library_path.joinpath('book2').symlink_to(Path(external_directory).joinpath('book2'))
+            shelf_path.joinpath('loop').symlink_to(library_path)
+
+            library = BookLibrary(library_path)
+            library.scan()
+            self.assertEqual([book.title for book in library], ['A title', 'B title'])
+
+            # the books which didn't change are not updated
+            with BookLibraryIndex(library_path) as index:
+                scanner = BookLibraryScanner(BookCover, library_path, index_entries=index.entries())
+                results = list(scanner)
+            self.assertEqual(len(results), 2)
+            self.assertFalse(any(result.is_updated for result in results))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
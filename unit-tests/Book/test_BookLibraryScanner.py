@@ -0,0 +1,99 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+import os
+import tempfile
+import unittest
+
+from BookBrowser.Book.BookLibrary import BookCover
+from BookBrowser.Book.BookLibraryIndex import BookLibraryIndexEntry
+from BookBrowser.Book.BookLibraryScanner import BookLibraryScanner
+from BookBrowser.Book.BookMetadata import BookMetadata
+
+####################################################################################################
+
+class TestBookLibraryScanner(unittest.TestCase):
+
+    ##############################################
+
+    def _make_book(self, library_path, name, filenames):
+        book_path = Path(library_path).joinpath(name)
+        book_path.mkdir()
+        metadata = BookMetadata(path=book_path, title=name)
+        metadata.save_json(BookMetadata.make_json_path(book_path))
+        for filename in filenames:
+            book_path.joinpath(filename).write_bytes(b'')
+        return book_path
+
+    ##############################################
+
+    def _scan(self, library_path, index_entries=None):
+        scanner = BookLibraryScanner(BookCover, library_path, index_entries=index_entries)
+        return {Path(result.path).name:result for result in scanner}
+
+    ##############################################
+
+    def test_cover(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            book_path = self._make_book(tmp_directory, 'book1', ('book.10.png', 'book.02.jpg', 'notes.txt', 'book.03.png'))
+            self._make_book(tmp_directory, 'book2', ('notes.txt',))
+
+            results = self._scan(tmp_directory)
+            self.assertEqual(sorted(results), ['book1', 'book2'])
+            # the cover is the first image in lexicographic order
+            cover_path = str(book_path.joinpath('book.02.jpg'))
+            self.assertEqual(results['book1'].book_cover.cover_path, cover_path)
+            self.assertEqual(BookCover.find_cover_path(book_path), cover_path)
+            self.assertIsNone(results['book2'].book_cover.cover_path)
+            self.assertEqual(BookCover.find_cover_path(results['book2'].path), '')
+
+    ##############################################
+
+    def test_rescan(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            book_path = self._make_book(tmp_directory, 'book', ('book.02.png', 'book.03.png'))
+            result = self._scan(tmp_directory)['book']
+            self.assertTrue(result.is_updated)
+            index_entries = {result.path: BookLibraryIndexEntry.from_book_cover(result.book_cover, True)}
+
+            # the cover of a book directory which didn't change comes from the index
+            result = self._scan(tmp_directory, index_entries)['book']
+            self.assertFalse(result.is_updated)
+            self.assertEqual(result.book_cover.cover_path, str(book_path.joinpath('book.02.png')))
+
+            # a new first image changes the directory mtime, thus the cover
+            book_path.joinpath('book.01.png').write_bytes(b'')
+            directory_mtime = index_entries[result.path].directory_mtime + 10
+            os.utime(str(book_path), (directory_mtime, directory_mtime))
+            result = self._scan(tmp_directory, index_entries)['book']
+            self.assertTrue(result.is_updated)
+            self.assertEqual(result.book_cover.cover_path, str(book_path.joinpath('book.01.png')))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
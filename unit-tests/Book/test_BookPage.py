@@ -0,0 +1,72 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from PIL import Image
+import numpy as np
+
+from BookBrowser.Book import Book
+from BookBrowser.Book.BookPage import BookPage
+
+####################################################################################################
+
+class TestBookPage(unittest.TestCase):
+
+    ##############################################
+
+    def test_load_regions(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            array = np.random.randint(0, 256, size=(300, 200, 3), dtype=np.uint8)
+            Image.fromarray(array).save(str(Path(tmp_directory).joinpath('book.001.png')))
+
+            book = Book(tmp_directory)
+            page = book.first_page
+            self.assertEqual(page.size, (200, 300))
+
+            # a region of the image
+            top = page.load_image((10, 5, 60, 25))
+            self.assertTrue(np.array_equal(top, array[5:25,10:60]))
+
+            top, bottom = page.load_regions(((0, 0, 400, 10), (0, 290, 400, 300)))
+            self.assertTrue(np.array_equal(top, array[:10]))
+            self.assertTrue(np.array_equal(bottom, array[-10:]))
+
+            self.assertEqual(page.load_image(scale=4).shape, (75, 50, 3))
+
+    ##############################################
+
+    def test_dual(self):
+
+        array = np.random.randint(0, 256, size=(30, 20), dtype=np.uint8)
+        dual_array = 255 - array
+        self.assertEqual(BookPage.dual_sum(array), int(np.sum(dual_array)))
+        self.assertTrue(np.array_equal(BookPage.dual_histogram(array), np.bincount(dual_array.ravel(), minlength=256)))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+####################################################################################################
+
+import unittest
+
+from BookBrowser.Book.BookPageTable import BookPageTable, parse_filename
+
+####################################################################################################
+
+class TestBookPageTable(unittest.TestCase):
+
+    ##############################################
+
+    def test_parse_filename(self):
+        self.assertEqual(parse_filename('book.012.png'), ('book', None, 12, 'x', 'png'))
+        self.assertEqual(parse_filename('book.p012.v.png'), ('book', 12, None, 'v', 'png'))
+
+    ##############################################
+
+    def test_table(self):
+
+        table = BookPageTable('/tmp')
+        row1 = table.add('book.002.r.png')
+        row2 = table.add('book.p001.v.png')
+        self.assertEqual(len(table), 2)
+        self.assertEqual(sorted((row1, row2), key=table.sort_key), [row2, row1])
+        self.assertEqual(table.title(row1), 'book')
+        self.assertEqual(table.file_index(row1), 2)
+        self.assertIsNone(table.page_number(row1))
+        self.assertEqual(table.orientation(row2), 'v')
+
+        table.set_orientation(row2, 'r')
+        table.set_page_number(row1, 3)
+        self.assertEqual(table.orientation(row2), 'r')
+        self.assertEqual(table.sort_key(row1), 3)
+        self.assertIsNone(table.image_size(row1))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+####################################################################################################
+
+from pathlib import Path
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from BookBrowser.Book import Book
+from BookBrowser.Book.BookSidecar import BookSidecar
+
+####################################################################################################
+
+class TestBookSidecar(unittest.TestCase):
+
+    ##############################################
+
+    def test_sidecar(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            path = Path(tmp_directory)
+            for i in range(1, 3):
+                Image.new('L', (10, 20), 255).save(str(path.joinpath('book.{}.png'.format(i))))
+
+            book = Book(tmp_directory)
+            page1, page2 = book
+            self.assertEqual(page1.size, (10, 20))
+            self.assertIsNone(book.sidecar.get(page2, 'value'))
+            # the sidecar is created on the first write
+            self.assertFalse(BookSidecar.make_sqlite_path(path).exists())
+            book.sidecar.set(page1, 'value', 1.5)
+            self.assertTrue(BookSidecar.make_sqlite_path(path).exists())
+            self.assertEqual(book.sidecar.get(page1, 'value'), 1.5)
+            self.assertIsNone(book.sidecar.get(page2, 'value'))
+
+            # the results follow a rename
+            book.rename_pages([(page1, dict(orientation='r'))])
+            self.assertEqual(book.sidecar.values(book, 'value'), {'book.1.r.png': 1.5})
+            book.close()
+
+            # and are dropped when the file changes
+            page_path = str(path.joinpath('book.1.r.png'))
+            mtime = os.stat(page_path).st_mtime
+            Image.new('L', (30, 20), 255).save(page_path)
+            os.utime(page_path, (mtime + 10, mtime + 10))
+            book = Book(tmp_directory)
+            page1 = book[1]
+            self.assertIsNone(book.sidecar.get(page1, 'value'))
+            self.assertEqual(page1.size, (30, 20))
+
+            # even within the same second
+            book.sidecar.set(page1, 'value', 2.5)
+            book.close()
+            stat_result = os.stat(page_path)
+            os.utime(page_path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1000))
+            book = Book(tmp_directory)
+            self.assertIsNone(book.sidecar.get(book[1], 'value'))
+            book.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+####################################################################################################
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from PIL import Image
+
+from BookBrowser.Book import Book, BookLibrary
+from BookBrowser.Common.FileTools import file_watcher
+
+####################################################################################################
+
+class TestBookTextIndex(unittest.TestCase):
+
+    ##############################################
+
+    def test_search(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            library_path = Path(tmp_directory)
+            BookLibrary.make_json_path(library_path).write_text('[]')
+            book_path = library_path.joinpath('book')
+            book_path.mkdir()
+            for i in range(1, 4):
+                Image.new('L', (10, 20), 255).save(str(book_path.joinpath('book.{}.png'.format(i))))
+
+            book = Book(book_path)
+            self.assertEqual(book.find_library_path(), library_path.resolve())
+            page1, page2, page3 = book
+            # the texts stored after the OCR are indexed
+            book.store_text(page1, 'French', 'test', 'Le théâtre de la ville')
+            book.store_text(page2, 'French', 'test', 'La ville et les champs')
+            book.store_text(page3, 'French', 'test', 'Les champs')
+
+            hits = book.text_index.search('ville')
+            self.assertEqual({hit.filename for hit in hits}, {'book.1.png', 'book.2.png'})
+            hits = book.text_index.search('theatre')
+            self.assertEqual([(hit.filename, hit.page_number) for hit in hits], [('book.1.png', 1)])
+            self.assertEqual(hits[0].snippet, 'Le [théâtre] de la ville')
+            with self.assertRaises(ValueError):
+                book.text_index.search('ville AND')
+
+            # a new text replaces the previous one
+            book.store_text(page1, 'French', 'test', 'Le port')
+            self.assertFalse(book.text_index.search('theatre'))
+            self.assertEqual(book.text_index.update_book(book, 'French', 'test'), 0)
+            book.close()
+
+            library = BookLibrary(library_path)
+            hits = library.search_texts('champs')
+            self.assertEqual({hit.filename for hit in hits}, {'book.2.png', 'book.3.png'})
+
+    ##############################################
+
+    def test_rename(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            library_path = Path(tmp_directory)
+            BookLibrary.make_json_path(library_path).write_text('[]')
+            book_path = library_path.joinpath('book')
+            book_path.mkdir()
+            for i in range(1, 3):
+                Image.new('L', (10, 20), 255).save(str(book_path.joinpath('book.{}.png'.format(i))))
+
+            book = Book(book_path)
+            page1, page2 = book
+            book.store_text(page1, 'French', 'test', 'Le port')
+            book.store_text(page2, 'French', 'test', 'La ville')
+
+            # the renames and the deletions are applied to the index
+            page1.rename(page_number=10)
+            hits = book.text_index.search('port')
+            self.assertEqual([(hit.filename, hit.page_number) for hit in hits], [('book.p10.x.png', 10)])
+            file_watcher.delete_file(str(page2.path))
+            self.assertFalse(book.text_index.search('ville'))
+            book.close()
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
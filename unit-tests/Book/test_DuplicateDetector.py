@@ -0,0 +1,68 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+from BookBrowser.Book.DuplicateDetector import (
+    candidate_pairs, hash_distance, histogram_distance, signatures,
+    HASH_SIZE, MAX_BUCKET_SIZE,
+)
+
+####################################################################################################
+
+class TestDuplicateDetector(unittest.TestCase):
+
+    ##############################################
+
+    def test_signatures(self):
+
+        thumbnails = np.zeros((2, HASH_SIZE, HASH_SIZE + 1), dtype=np.uint8)
+        # increasing rows set all the bits
+        thumbnails[1] = np.arange(HASH_SIZE + 1)
+        histograms = np.zeros((2, 256), dtype=np.int64)
+        histograms[0, 0] = histograms[1, 255] = 10
+
+        hashes, histograms = signatures(thumbnails, histograms)
+        self.assertEqual(list(hashes), [0, 2**64 - 1])
+        self.assertEqual(list(hash_distance(hashes[:1], hashes[1:])), [64])
+        self.assertEqual(list(histogram_distance(histograms[0], histograms[1:])), [1])
+
+    ##############################################
+
+    def test_candidate_pairs(self):
+
+        hashes = np.array([0x0123456789abcdef, 0x0123456789abcdee, 0xfedcba9876543210, 0xfedcba9876543210], dtype=np.uint64)
+        i, j = candidate_pairs(hashes)
+        self.assertEqual(list(zip(i, j)), [(0, 1), (2, 3)])
+
+        # the blank pages share all their bands
+        hashes = np.concatenate((hashes, np.zeros(MAX_BUCKET_SIZE + 1, dtype=np.uint64)))
+        i, j = candidate_pairs(hashes)
+        self.assertEqual(list(zip(i, j)), [(0, 1), (2, 3)])
+        i, j = candidate_pairs(hashes, max_bucket_size=len(hashes))
+        self.assertEqual(len(i), 2 + (MAX_BUCKET_SIZE + 1) * MAX_BUCKET_SIZE // 2)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
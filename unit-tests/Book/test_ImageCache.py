@@ -0,0 +1,63 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import unittest
+
+import numpy as np
+
+from BookBrowser.Book.ImageCache import ImageCache
+
+####################################################################################################
+
+class TestImageCache(unittest.TestCase):
+
+    ##############################################
+
+    def test(self):
+
+        cache = ImageCache(memory_budget=3000)
+        loader = lambda: np.zeros(1000, dtype=np.uint8)
+
+        image = cache.get('a', loader)
+        self.assertIs(cache.get('a', loader), image)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.get('b', loader)
+        cache.get('c', loader)
+        self.assertEqual(cache.memory_size, 3000)
+
+        # 'a' is the most recently used, thus 'b' is evicted
+        cache.get('a')
+        cache.get('d', loader)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get('b'))
+
+        cache.discard('a')
+        self.assertEqual(cache.memory_size, 2000)
+        cache.clear()
+        self.assertEqual((len(cache), cache.memory_size), (0, 0))
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from BookBrowser.Book import Book
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+if tesserocr is not None:
+    from BookBrowser.OCR.OcrCache import OcrCache
+
+####################################################################################################
+
+@unittest.skipUnless(tesserocr, 'tesserocr is not installed')
+class TestOcrCache(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+        self._tmp_directory = tempfile.TemporaryDirectory()
+        self._cache_patch = mock.patch.dict(os.environ, XDG_CACHE_HOME=self._tmp_directory.name)
+        self._cache_patch.start()
+        self._ocr_cache = OcrCache._instance
+        OcrCache._instance = None
+        self._cache = OcrCache()
+
+    def tearDown(self):
+        self._cache.close()
+        OcrCache._instance = self._ocr_cache
+        self._cache_patch.stop()
+        self._tmp_directory.cleanup()
+
+    ##############################################
+
+    def _make_book(self, name, colour='white'):
+        book_path = Path(self._tmp_directory.name).joinpath(name)
+        book_path.mkdir()
+        Image.new('L', (10, 20), colour).save(str(book_path.joinpath('book.1.png')))
+        return book_path
+
+    ##############################################
+
+    def test_keys(self):
+
+        cache = self._cache
+        book = Book(self._make_book('book'))
+        page = book.first_page
+
+        cache.set(page, 'fra', 'tesseract 4.1.1', 'Le port')
+        self.assertEqual(cache.get(page, 'fra', 'tesseract 4.1.1'), 'Le port')
+        self.assertIsNone(cache.get(page, 'eng', 'tesseract 4.1.1'))
+        # a new engine version invalidates the texts
+        self.assertIsNone(cache.get(page, 'fra', 'tesseract 5.0.0'))
+        self.assertIsNone(cache.get(page, 'fra', 'tesseract 4.1.1 otsu'))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        self.assertEqual(len(cache), 1)
+
+        # the text of a verso depends on the flip
+        book.rename_pages([(page, dict(orientation='v'))])
+        self.assertIsNone(cache.get(page, 'fra', 'tesseract 4.1.1'))
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        book.close()
+
+    ##############################################
+
+    def test_content(self):
+
+        cache = self._cache
+        book = Book(self._make_book('book'))
+        page = book.first_page
+        cache.set(page, 'fra', 'tesseract 4.1.1', 'Le port')
+
+        copy_book = Book(self._make_book('copy'))
+        copy_page = copy_book.first_page
+        self.assertIsNone(cache.get(copy_page, 'fra', 'tesseract 4.1.1', hash_content=False))
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        # the same content has the same text
+        self.assertEqual(cache.get(copy_page, 'fra', 'tesseract 4.1.1'), 'Le port')
+        self.assertEqual(cache.get(copy_page, 'fra', 'tesseract 4.1.1', hash_content=False), 'Le port')
+
+        other_book = Book(self._make_book('other', colour='black'))
+        self.assertIsNone(cache.get(other_book.first_page, 'fra', 'tesseract 4.1.1'))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    ##############################################
+
+    def test_eviction(self):
+
+        cache = self._cache
+        self.assertEqual(cache.path, Path(self._tmp_directory.name).joinpath('book-browser', 'ocr-cache.sqlite'))
+        pages = [Book(self._make_book('book{}'.format(i), colour=i)).first_page for i in range(4)]
+        for page in pages[:3]:
+            cache.set(page, 'fra', 'tesseract 4.1.1', 'x' * 100)
+        self.assertEqual(cache.text_size, 300)
+        # the first text is used again
+        self.assertIsNotNone(cache.get(pages[0], 'fra', 'tesseract 4.1.1'))
+
+        cache._size_budget = 350
+        cache.set(pages[3], 'fra', 'tesseract 4.1.1', 'x' * 100)
+        # the least recently used texts are evicted until the size is lower than 90% of the budget
+        self.assertEqual(cache.text_size, 300)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(pages[1], 'fra', 'tesseract 4.1.1'))
+        self.assertIsNotNone(cache.get(pages[0], 'fra', 'tesseract 4.1.1'))
+
+        # the size is reloaded
+        cache.close()
+        OcrCache._instance = None
+        self._cache = OcrCache()
+        self.assertEqual(self._cache.text_size, 300)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from unittest import mock
+import threading
+import unittest
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+if tesserocr is not None:
+    from BookBrowser.OCR import TesseractApiPool
+
+####################################################################################################
+
+class FakeApi:
+
+    """Stand-in for :class:`tesserocr.PyTessBaseAPI` which doesn't load a traineddata"""
+
+    def __init__(self, lang=None, path=None):
+        if lang == 'bad':
+            raise RuntimeError('Failed to init API')
+        self.language = lang
+        self.number_of_clears = 0
+        self.is_ended = False
+
+    def Clear(self):
+        self.number_of_clears += 1
+
+    def End(self):
+        self.is_ended = True
+
+####################################################################################################
+
+@unittest.skipUnless(tesserocr, 'tesserocr is not installed')
+class TestTesseractApiPool(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+        self._api_patch = mock.patch.object(tesserocr, 'PyTessBaseAPI', FakeApi)
+        self._api_patch.start()
+
+    def tearDown(self):
+        self._api_patch.stop()
+
+    ##############################################
+
+    def test_reuse(self):
+
+        pool = TesseractApiPool(max_size=2)
+        api = pool.checkout('fra')
+        self.assertEqual(api.language, 'fra')
+        pool.checkin(api, 'fra')
+        self.assertEqual(api.number_of_clears, 1)
+
+        # an idle API is reused for the same language
+        with pool.api('fra') as other_api:
+            self.assertIs(other_api, api)
+            with pool.api('fra') as second_api:
+                self.assertIsNot(second_api, api)
+            with pool.api('eng') as english_api:
+                self.assertEqual(english_api.language, 'eng')
+        self.assertEqual(len(pool), 3)
+
+        pool.close()
+        self.assertTrue(api.is_ended)
+        self.assertEqual(len(pool), 0)
+
+    ##############################################
+
+    def test_blocking(self):
+
+        pool = TesseractApiPool(max_size=1)
+        api = pool.checkout('fra')
+
+        # a thread waits until the API is returned
+        checked_out = threading.Event()
+        apis = []
+        def job():
+            apis.append(pool.checkout('fra'))
+            checked_out.set()
+        thread = threading.Thread(target=job)
+        thread.start()
+        self.assertFalse(checked_out.wait(.1))
+        pool.checkin(api, 'fra')
+        self.assertTrue(checked_out.wait(5))
+        thread.join()
+        self.assertEqual(apis, [api])
+        self.assertEqual(len(pool), 1)
+
+    ##############################################
+
+    def test_failure(self):
+
+        # the slot of an API which fails to initialise is released
+        pool = TesseractApiPool(max_size=1)
+        for i in range(2):
+            with self.assertRaises(RuntimeError):
+                pool.checkout('bad')
+        self.assertEqual(len(pool), 0)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
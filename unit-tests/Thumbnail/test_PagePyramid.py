@@ -0,0 +1,151 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+import numpy as np
+
+from BookBrowser.Thumbnail.PagePyramid import PagePyramid, PagePyramidCache
+
+####################################################################################################
+
+class TestPagePyramid(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+        # the pyramids are stored in a temporary cache directory
+        self._cache_directory = tempfile.TemporaryDirectory()
+        self._cache_patch = mock.patch.dict(os.environ, XDG_CACHE_HOME=self._cache_directory.name)
+        self._cache_patch.start()
+        self._pyramid_cache = PagePyramidCache._instance
+        PagePyramidCache._instance = None
+
+    def tearDown(self):
+        PagePyramidCache._instance = self._pyramid_cache
+        self._cache_patch.stop()
+        self._cache_directory.cleanup()
+
+    ##############################################
+
+    def _make_page(self, path, width, height):
+        array = np.random.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+        Image.fromarray(array).save(str(path))
+        return array
+
+    ##############################################
+
+    def test_levels(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            path = Path(tmp_directory).joinpath('book.1.png')
+            array = self._make_page(path, 1200, 700)
+            pyramid = PagePyramidCache().get(path, os.stat(str(path)).st_mtime)
+            self.assertFalse(pyramid.is_built)
+            self.assertEqual(pyramid.size, (1200, 700))
+
+            # 1200 -> 600 -> 300, the last level fits in a tile
+            self.assertEqual(pyramid.number_of_levels, 3)
+            self.assertEqual([pyramid.level_size(level) for level in range(3)], [(1200, 700), (600, 350), (300, 175)])
+            self.assertEqual([pyramid.level_grid(level) for level in range(3)], [(2, 3), (1, 2), (1, 1)])
+            self.assertEqual(pyramid.level_for_size(1200, 0), 0)
+            self.assertEqual(pyramid.level_for_size(500, 0), 1)
+            self.assertEqual(pyramid.level_for_size(0, 100), 2)
+            self.assertEqual(pyramid.tile_box(0, 1, 2), (1024, 512, 1200, 700))
+
+            pyramid.build()
+            self.assertTrue(pyramid.is_built)
+            tile = np.asarray(Image.open(str(pyramid.tile_path(0, 1, 2))))
+            self.assertTrue(np.array_equal(tile, array[512:700,1024:1200]))
+            for level in range(3):
+                number_of_rows, number_of_columns = pyramid.level_grid(level)
+                for row in range(number_of_rows):
+                    for column in range(number_of_columns):
+                        x_min, y_min, x_max, y_max = pyramid.tile_box(level, row, column)
+                        with Image.open(str(pyramid.tile_path(level, row, column))) as tile:
+                            self.assertEqual(tile.size, (x_max - x_min, y_max - y_min))
+
+            # the metadata are reloaded by a new instance, a new mtime requires a new build
+            pyramid = PagePyramid(PagePyramidCache(), path, pyramid.mtime)
+            self.assertTrue(pyramid.is_built)
+            self.assertEqual(pyramid.size, (1200, 700))
+            self.assertFalse(PagePyramid(PagePyramidCache(), path, pyramid.mtime + 1).is_built)
+
+    ##############################################
+
+    def test_eviction(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            paths = [Path(tmp_directory).joinpath('book.{}.png'.format(i)) for i in range(3)]
+            for path in paths:
+                self._make_page(path, 600, 600)
+
+            cache = PagePyramidCache()
+            pyramids = []
+            for path in paths[:2]:
+                pyramid = cache.get(path, os.stat(str(path)).st_mtime)
+                pyramid.build()
+                pyramids.append(pyramid)
+            # the size of the tiles is recorded at build time
+            size = cache._directory_size(pyramids[0].path)
+            self.assertAlmostEqual(cache.disk_size, 2 * size, delta=1024)
+            # the first pyramid is used again
+            pyramids[0].touch()
+
+            cache._disk_budget = int(2.5 * size)
+            pyramid = cache.get(paths[2], os.stat(str(paths[2])).st_mtime)
+            pyramid.build()
+            # the least recently used pyramid is evicted
+            self.assertTrue(pyramids[0].is_built)
+            self.assertFalse(pyramids[1].is_built)
+            self.assertFalse(pyramids[1].path.exists())
+            self.assertTrue(pyramid.path.exists())
+            disk_size = cache.disk_size
+            self.assertEqual(cache.evict(), 0)
+
+            # a pyramid is not evicted while its tiles are read
+            cache._disk_budget = 1
+            with pyramids[0].read_tiles() as is_built:
+                self.assertTrue(is_built)
+                self.assertEqual(cache.evict(keep=pyramid.key), 0)
+                self.assertTrue(pyramids[0].tile_path(0, 0, 0).exists())
+            self.assertEqual(cache.evict(keep=pyramid.key), 1)
+            self.assertLess(cache.disk_size, disk_size)
+            self.assertFalse(pyramids[0].is_built)
+            with pyramids[0].read_tiles() as is_built:
+                self.assertFalse(is_built)
+
+            # the sizes are loaded from the metadata by a new cache
+            PagePyramidCache._instance = None
+            self.assertEqual(PagePyramidCache().disk_size, cache.disk_size)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+####################################################################################################
+#
+# BookBrowser - A Digitised Book Solution
+# Copyright (C) 2019 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from pathlib import Path
+from unittest import mock
+import os
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+from BookBrowser.Book import Book
+from BookBrowser.Thumbnail import FreeDesktopThumbnailCache
+from BookBrowser.Thumbnail.ThumbnailPack import ThumbnailPack
+
+####################################################################################################
+
+class TestThumbnailPack(unittest.TestCase):
+
+    ##############################################
+
+    def setUp(self):
+        # the thumbnail cache is made in a temporary cache directory
+        self._cache_directory = tempfile.TemporaryDirectory()
+        self._cache_patch = mock.patch.dict(os.environ, XDG_CACHE_HOME=self._cache_directory.name)
+        self._cache_patch.start()
+        self._thumbnail_cache = FreeDesktopThumbnailCache._instance
+        FreeDesktopThumbnailCache._instance = None
+
+    def tearDown(self):
+        FreeDesktopThumbnailCache._instance = self._thumbnail_cache
+        self._cache_patch.stop()
+        self._cache_directory.cleanup()
+
+    ##############################################
+
+    def _make_page(self, path, colour, mtime):
+        Image.new('RGB', (300, 400), colour).save(str(path))
+        os.utime(str(path), (mtime, mtime))
+
+    ##############################################
+
+    def test_build(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            book_path = Path(tmp_directory)
+            mtime = int(time.time()) - 100
+            for i, colour in enumerate(('red', 'green', 'blue')):
+                self._make_page(book_path.joinpath('book.{}.png'.format(i + 1)), colour, mtime)
+
+            book = Book(book_path)
+            self.assertEqual(ThumbnailPack.build(book), 3)
+            pack = ThumbnailPack(book_path)
+            self.assertEqual(len(pack), 3)
+            for page in book:
+                self.assertTrue(pack.has_page(page))
+                data = pack.get(page.filename, page.mtime)
+                self.assertTrue(data.startswith(b'\x89PNG'))
+                self.assertEqual(pack.page_data(int(page)), data)
+            self.assertIsNone(pack.get('book.1.png', 1))
+            self.assertIsNone(pack.get('book.4.png'))
+            self.assertIsNone(pack.page_data(4))
+
+            # the pack is replaced, the mapping of the previous pack stays valid
+            old_data = pack.get('book.2.png')
+            page2_path = book_path.joinpath('book.2.png')
+            # the thumbnail cache compares the mtime of the page and of its thumbnail
+            self._make_page(page2_path, 'white', mtime + 200)
+            # the up to date entries are reused from the previous pack
+            thumbnail_cache = FreeDesktopThumbnailCache()
+            page1_path = book_path.joinpath('book.1.png')
+            thumbnail_path = thumbnail_cache.get(page1_path).flavour_path(FreeDesktopThumbnailCache.LARGE)
+            thumbnail_path.unlink()
+            book = Book(book_path)
+            self.assertEqual(ThumbnailPack.build(book), 3)
+            self.assertFalse(thumbnail_path.exists())
+            self.assertEqual(pack.get('book.2.png'), old_data)
+            self.assertEqual(os.listdir(tmp_directory).count(ThumbnailPack.PACK_FILENAME + '.tmp'), 0)
+
+            pack.close()
+            with ThumbnailPack(book_path) as pack:
+                self.assertTrue(pack.has_page(book[2]))
+                self.assertNotEqual(pack.get('book.2.png'), old_data)
+
+    ##############################################
+
+    def test_invalid_pack(self):
+
+        with tempfile.TemporaryDirectory() as tmp_directory:
+
+            with ThumbnailPack(tmp_directory) as pack:
+                self.assertFalse(pack)
+            ThumbnailPack.make_pack_path(tmp_directory).write_bytes(b'BBTP garbage')
+            with ThumbnailPack(tmp_directory) as pack:
+                self.assertFalse(pack)
+                self.assertEqual(len(pack), 0)
+
+####################################################################################################
+
+if __name__ == '__main__':
+    unittest.main()